@@ -0,0 +1,55 @@
+#!/usr/bin/env python2
+"""Benchmark of import (i.e., cold start) times
+
+Every module is imported in a fresh interpreter, several times, and the
+best time is reported along with which heavy dependencies got imported.
+
+    python bench_import.py [repeat]
+"""
+import sys
+import json
+import subprocess
+
+
+MODULES = [
+    "timetabler",
+    "timetabler.scheduler",
+    "timetabler.results",
+    "timetabler.rank",
+    "timetabler.index",
+    "timetabler.ssc.ssc_conn",
+]
+HEAVY = ["requests", "bs4", "shelve", "prettytable", "urllib2",
+         "cookielib", "multiprocessing", "uuid"]
+SCRIPT = """
+import sys, json, time
+start = time.time()
+import {module}
+took = time.time() - start
+print(json.dumps([took, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def time_import(module):
+    """Time to import ``module`` in a fresh interpreter
+
+    :rtype: tuple
+    :returns: (seconds, heavy modules that were imported)
+    """
+    out = subprocess.check_output([
+        sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY)
+    ])
+    return tuple(json.loads(out))
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for module in MODULES:
+        results = [time_import(module) for _ in xrange(repeat)]
+        took, heavy = min(results)
+        print("{:<26} {:7.1f} ms  {}".format(
+            module, took * 1000, ", ".join(heavy) or "-"))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,19 @@
 from time import time
 import sys
 import logging
-from itertools import combinations
 import json
 import shlex
 import os
 from getpass import getpass
 
 from timetabler.scheduler import Scheduler
-from timetabler.ssc.course import Lecture, Discussion, Lab
-from timetabler import sort, util
+from timetabler.results import ScheduleSet, load_or_generate
+from timetabler.combcache import CombinationCache
+from timetabler.ssc.course import Lecture, Discussion
+from timetabler import util
+from timetabler.rank import Ranker
+from timetabler.index import ScheduleIndex
+from timetabler.diversity import diverse_positions
 from timetabler.sort import earliest_start  # Helper function (should probably be in util)
 from timetabler.ssc.ssc_conn import SSCConnection
 
@@ -29,6 +33,28 @@ NO_CACHE = False
 #  in the set of many. This is useful to set to True closer to course
 #  registration when you are actually building worklists.
 ALLOW_SAME_SLOT_SECTIONS = False
+# Generated schedules are saved here, and reloaded on the next run if
+#  nothing that affects them has changed
+RESULTS_FILE = "schedules.bin"
+# Valid section combinations of courses are cached here, so that only
+#  courses that have changed are worked out again on the next run
+COMBINATIONS_FILE = "combinations.cache"
+# The SSC session is saved here (readable only by you), so that logging in
+#  again is only needed once it has expired
+COOKIES_FILE = "cookies.txt"
+# If this is set (to a number of bytes), schedules are ranked on disk
+#  once they take up this much memory, rather than being kept in memory
+#  and saved to RESULTS_FILE; for runs with more schedules than fit in
+#  memory. They can then only be paged through in order.
+MAX_MEMORY = None
+# Metrics in order from top-to-bottom from most-to-least important
+RANKING = [
+    "even_courses_per_term",
+    "even_time_per_day",
+    "latest_daily_morning",
+    "time_at_school",
+    "days_at_school",
+]
 
 
 def inline_write(s):
@@ -66,37 +92,80 @@ def get_schedules(ssc_conn):
         ("CPEN 411", "Computer Architecture"),
     ]
     num_required_from_opt = 2
-    combs = list(combinations(opt, r=num_required_from_opt))
-
-    schedules = []
-    num_combs = len(combs)
-    inline_write("Processing {} combinations".format(num_combs))
-    for i, courses in enumerate([required + comb for comb in combs]):
-        s = Scheduler(courses, session=SESSION, terms=TERMS, refresh=NO_CACHE,
-                      duplicates=ALLOW_SAME_SLOT_SECTIONS, ssc_conn=ssc_conn)
-        # I don't want any classes that start before 9:00AM
-        s.add_constraint(lambda sched: earliest_start(sched.activities) >= 9)
-        # Add GEOG122 constraints if we need to
-        if "GEOG 122" in courses:
-            # STTs are for Vantage College students
-            s.courses["GEOG 122"].add_constraint(
-                lambda acts: all(a.status not in [u"STT"] for a in acts)
-            )
-            # Default sections contained a Tutorial but that is for Vantage
-            # students, so removing that and only setting Lecture and Discussion
-            s.courses["GEOG 122"].num_section_constraints = [
-                (Lecture, 1), (Discussion, 1)
-            ]
-
-        # Add statuses for courses that shouldn't be considered
-        bad_statuses = (
-            "Full",
-            # "Blocked",
+
+    # Add statuses for courses that shouldn't be considered
+    bad_statuses = (
+        "Full",
+        # "Blocked",
+    )
+
+    # All choices of electives are searched by the one Scheduler
+    s = Scheduler(required, session=SESSION, terms=TERMS, refresh=NO_CACHE,
+                  duplicates=ALLOW_SAME_SLOT_SECTIONS, ssc_conn=ssc_conn,
+                  electives=[(num_required_from_opt, opt)],
+                  combination_cache=CombinationCache(path=COMBINATIONS_FILE))
+    # I don't want any classes that start before 9:00AM
+    s.add_constraint(lambda sched: earliest_start(sched.activities) >= 9)
+    # Add GEOG122 constraints if we need to
+    if "GEOG 122" in s.courses:
+        # STTs are for Vantage College students
+        s.courses["GEOG 122"].add_constraint(
+            lambda acts: all(a.status not in [u"STT"] for a in acts)
         )
-        schedules.extend(s.generate_schedules(bad_statuses=bad_statuses))
-        inline_write(".")
-    sys.stdout.write("\n")
-    return schedules
+        # Default sections contained a Tutorial but that is for Vantage
+        # students, so removing that and only setting Lecture and Discussion
+        s.courses["GEOG 122"].num_section_constraints = [
+            (Lecture, 1), (Discussion, 1)
+        ]
+
+    if MAX_MEMORY is not None:
+        ranker = Ranker(commute_hrs=COMMUTE_HOURS)
+        inline_write("Generating and ranking schedules...")
+        schedules = s.generate_sorted(ranker.lexicographic_key(RANKING),
+                                      max_memory=MAX_MEMORY,
+                                      bad_statuses=bad_statuses)
+        sys.stdout.write("\n")
+        return schedules
+
+    # Position of every schedule in the ranking (by key); saved as a score
+    #  so that reloaded schedules are paged through without ranking again
+    ranks = {}
+
+    def generate():
+        inline_write("Generating schedules...")
+        # Schedules are compacted into the set as they are found, rather
+        #  than all being made (and kept by the Scheduler) first
+        schedules = ScheduleSet(s.iter_schedules(bad_statuses=bad_statuses))
+        sys.stdout.write("\n")
+        inline_write("Ranking schedules...")
+        ranker = Ranker(commute_hrs=COMMUTE_HOURS)
+        ranks.update((sched.key, i) for i, sched in
+                     enumerate(ranker.lexicographic(schedules, RANKING)))
+        sys.stdout.write("\n")
+        return schedules
+
+    # Schedules are only regenerated (and ranked) if course data,
+    #  constraints, the ranking etc. have changed since they were last saved
+    fingerprint = "{}:{}".format(s.fingerprint(bad_statuses),
+                                 json.dumps([RANKING, COMMUTE_HOURS]))
+    schedules = load_or_generate(
+        RESULTS_FILE, fingerprint, generate,
+        scores=dict(rank=lambda sched: ranks[sched.key])
+    )
+    return schedules.sorted_by_score("rank")
+
+
+def page_through(schedules):
+    """Show ``schedules`` (ranked on disk) one at a time, in order"""
+    try:
+        for i, sched in enumerate(schedules):
+            print("Schedule {} of {}".format(i + 1, len(schedules)))
+            sched.draw(terms=TERMS, draw_location="terminal",
+                       title_format="code")
+            if raw_input("n - Next, q - Quit > ").strip() == "q":
+                break
+    finally:
+        schedules.close()
 
 
 def repl(schedules, ssc):
@@ -111,6 +180,13 @@ def repl(schedules, ssc):
 
     HELP = """
     n - Next
+    j <number> - Jump to schedule with number
+    f [section=<section>] [course=<course>] [free=<day>,...] [term=<term>]
+      [after=<time>] [before=<time>] [-section=<section>] [-course=<course>]
+      - Filter schedules (no arguments to clear filter; -section and
+      -course exclude), e.g., f "section=CPSC 304 T2A" free=Fri term=2
+    d <k> [<distance>] - Only show k schedules that differ from each other
+      in class times (by at least distance time slots if given)
     cw <name> - Create Worklist with name
     as <worklist> - Add Sections to worklist
     pw <session=2015W> - Print Worklists for session
@@ -120,49 +196,108 @@ def repl(schedules, ssc):
     """
     print(HELP)
 
-    for i, sched in enumerate(schedules):
+    index = ScheduleIndex(schedules)
+    # Positions (in ``schedules``) of the schedules being paged through;
+    #  these are narrowed down by filtering
+    current = range(len(schedules))
+    i = 0
+    while i < len(current):
+        sched = schedules[current[i]]
+        print("Schedule {} of {}".format(i + 1, len(current)))
         sched.draw(terms=TERMS, draw_location="terminal", title_format="code")
-        if i < len(schedules) - 1:
-            while True:
-                try:
-                    cmd = raw_input("> ")
-                    cmd = shlex.split(cmd)
-                    if not cmd:
-                        continue
-                    if cmd[0] == "n":
+        while True:
+            try:
+                cmd = raw_input("> ")
+                cmd = shlex.split(cmd)
+                if not cmd:
+                    continue
+                if cmd[0] == "n":
+                    i += 1
+                    break
+                elif cmd[0] == "j":
+                    j = int(cmd[1]) - 1
+                    assert 0 <= j < len(current), "No such schedule"
+                    i = j
+                    break
+                elif cmd[0] == "f":
+                    matches = index.positions(
+                        index.query(**parse_filter(cmd[1:]))
+                    )
+                    print("{} schedules found.".format(len(matches)))
+                    if matches:
+                        current, i = matches, 0
                         break
-                    elif cmd[0] == "cw":
-                        name = cmd[1]
-                        ssc.create_worklist(name, session=SESSION)
-                        print("Created worklist '{}'".format(name))
-                    elif cmd[0] == "as":
-                        worklist = cmd[1]
-                        worklists = ssc.cache_worklists(SESSION)
-                        assert worklist in worklists
-                        for act in sched.activities:
-                            print("Registering {}...".format(act.section))
-                            ssc.add_course_to_worklist(
-                                act.section,
-                                SESSION,
-                                worklist
-                            )
-                    elif cmd[0] == "pw":
-                            session = cmd[1] if len(cmd) > 1 else SESSION
-                            print(json.dumps(ssc.cache_worklists(session),
-                                             indent=4))
-                    elif cmd[0] == "dw":
-                        worklist = cmd[1]
-                        ssc.delete_worklist(name=worklist, session=SESSION)
-                        print("Deleted worklist '{}'".format(worklist))
-                    elif cmd[0] == "q":
-                        sys.exit(0)
-                    elif cmd[0] == "help":
-                        print(HELP)
-                    else:
-                        print(HELP)
-                except Exception as err:
-                    logging.exception(err)
+                elif cmd[0] == "d":
+                    k = int(cmd[1])
+                    min_distance = int(cmd[2]) if len(cmd) > 2 else None
+                    picked = diverse_positions(
+                        [schedules[p] for p in current], k,
+                        min_distance=min_distance, features="times"
+                    )
+                    print("{} schedules picked.".format(len(picked)))
+                    current, i = [current[p] for p in picked], 0
+                    break
+                elif cmd[0] == "cw":
+                    name = cmd[1]
+                    ssc.create_worklist(name, session=SESSION)
+                    print("Created worklist '{}'".format(name))
+                elif cmd[0] == "as":
+                    worklist = cmd[1]
+                    worklists = ssc.cache_worklists(SESSION)
+                    assert worklist in worklists
+                    for act in sched.activities:
+                        print("Registering {}...".format(act.section))
+                        ssc.add_course_to_worklist(
+                            act.section,
+                            SESSION,
+                            worklist
+                        )
+                elif cmd[0] == "pw":
+                        session = cmd[1] if len(cmd) > 1 else SESSION
+                        print(json.dumps(ssc.cache_worklists(session),
+                                         indent=4))
+                elif cmd[0] == "dw":
+                    worklist = cmd[1]
+                    ssc.delete_worklist(name=worklist, session=SESSION)
+                    print("Deleted worklist '{}'".format(worklist))
+                elif cmd[0] == "q":
+                    sys.exit(0)
+                elif cmd[0] == "help":
+                    print(HELP)
+                else:
                     print(HELP)
+            except Exception as err:
+                logging.exception(err)
+                print(HELP)
+
+
+def parse_filter(args):
+    """Parse arguments of the filter command into kwargs for
+    ``ScheduleIndex.query``
+    """
+    kwargs = dict(sections=[], courses=[], free_days=[],
+                  exclude_sections=[], exclude_courses=[])
+    for arg in args:
+        key, value = arg.split("=", 1)
+        if key == "section":
+            kwargs["sections"].append(value)
+        elif key == "course":
+            kwargs["courses"].append(value)
+        elif key == "-section":
+            kwargs["exclude_sections"].append(value)
+        elif key == "-course":
+            kwargs["exclude_courses"].append(value)
+        elif key == "free":
+            kwargs["free_days"].extend(value.split(","))
+        elif key == "term":
+            kwargs["term"] = int(value)
+        elif key == "after":
+            kwargs["start_after"] = value
+        elif key == "before":
+            kwargs["end_before"] = value
+        else:
+            raise ValueError("Unknown filter {}".format(key))
+    return kwargs
 
 
 def main():
@@ -182,9 +317,10 @@ def main():
     else:
         credentials = json.load(open("credentials.json"))
 
-    # Create SSC connection and log in
+    # Create SSC connection and log in (or reuse the session from the
+    #  last run if it hasn't expired)
     ssc = SSCConnection()
-    ssc.authorize(**credentials)
+    ssc.authorize(cookie_file=COOKIES_FILE, **credentials)
 
     # Setup logging
     util.setup_root_logger('WARNING')
@@ -196,15 +332,10 @@ def main():
     print("This took {:.2f} seconds to calculate.".format(
         time() - start_time
     ))
-    # Sort
-    # Statements in order from top-to-bottom from least-to-most important
-    # i.e., put the most important at the bottom
-    scheds = sort.free_days(scheds)
-    scheds = sort.least_time_at_school(scheds, commute_hrs=COMMUTE_HOURS)
-    scheds = sort.sum_latest_daily_morning(scheds)
-    scheds = sort.even_time_per_day(scheds, commute_hrs=COMMUTE_HOURS)
-    scheds = sort.even_courses_per_term(scheds)
-
+    # Schedules come back ranked
+    if MAX_MEMORY is not None:
+        page_through(scheds)
+        return
     repl(scheds, ssc)
 
 
@@ -0,0 +1,98 @@
+"""Local HTTP stand-in for the SSC's course pages"""
+import hashlib
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+def render(rows):
+    """Course page (as ``SSCConnection._parse_activities`` reads it) for
+    ``rows`` of (status, section, activity, term, days, start, end,
+    comments)
+    """
+    cells = []
+    for status, section, activity, term, days, start, end, comments in rows:
+        cells.extend([status or u"&nbsp;", u"x", u"x", u"x", section, u"x",
+                      u"x", activity, term, u"x", u"x", days, start, end,
+                      comments])
+    return (u"<html><body><pre>Status\nSection\n" + u"\n".join(cells) +
+            u"\nBrowse    Standard Timetables\n</pre></body></html>")
+
+
+class FakeSSC(HTTPServer):
+    """Serves course pages from ``pages`` on a free local port
+
+    :type  pages: dict
+    :param pages: {(dept, course number): rows as for ``render``}
+    :type  charset: str
+    :param charset: Encoding pages are sent in
+    """
+
+    def __init__(self, pages, charset="utf-8"):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), _Handler)
+        self.pages = pages
+        self.charset = charset
+        self.statuses = {}  # section -> status, overriding ``pages``
+        # (dept, course number) of course pages to answer with an error
+        self.failing = set()
+        # {name: link} of worklists on pages other than course pages;
+        #  None for pages as they are to a user who isn't logged in
+        self.worklists = None
+        self.hits = 0
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def page(self, dept, course_num):
+        """Course page as it is sent (bytes)"""
+        rows = [(self.statuses.get(row[1], row[0]),) + tuple(row[1:])
+                for row in self.pages.get((dept, course_num), [])]
+        return render(rows).encode(self.charset)
+
+    def main_page(self):
+        """Page other than a course page (bytes)"""
+        items = u"".join(
+            u'<li><a title="{0}" href="{1}">{0}</a></li>'.format(name, link)
+            for name, link in sorted((self.worklists or {}).iteritems()))
+        sidebar = (u'<div class="worklist-sidebar docs-sidebar"><ul>{}</ul>'
+                   u'</div>'.format(items)
+                   if self.worklists is not None else u"")
+        return (u"<html><body>{}</body></html>".format(sidebar)
+                .encode(self.charset))
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.hits += 1
+        query = dict(urlparse.parse_qsl(urlparse.urlparse(self.path).query))
+        if (query.get("dept"), query.get("course")) in self.server.failing:
+            self.send_response(500)
+            self.end_headers()
+            return
+        if "dept" in query:
+            page = self.server.page(query["dept"], query.get("course"))
+        else:
+            page = self.server.main_page()
+        etag = '"{}"'.format(hashlib.md5(page).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type",
+                         "text/html; charset={}".format(self.server.charset))
+        self.end_headers()
+        self.wfile.write(page)
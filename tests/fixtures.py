@@ -0,0 +1,78 @@
+"""Courses and a stand-in for SSCConnection for tests"""
+import copy
+
+from timetabler.ssc.course import Course, Lecture, Lab, Tutorial
+
+CLASSES = {"Lecture": Lecture, "Lab": Lab, "Tutorial": Tutorial}
+
+
+def make_course(name, activities):
+    """Course ``name`` (e.g., "CPSC 304") from ``activities``
+
+    :type  activities: list
+    :param activities: (class name, section suffix, term, days, start, end,
+        status), e.g., ("Lecture", "101", 1, "Mon Wed", "9:00", "10:00", "")
+    """
+    dept, number = name.split()
+    by_class = {cls: [] for cls in CLASSES}
+    for cls, suffix, term, days, start, end, status in activities:
+        by_class[cls].append(CLASSES[cls](
+            status=status, section="{} {}".format(name, suffix), term=term,
+            days=days, start_time=start, end_time=end, comments="",
+            is_multi_term=False
+        ))
+    return Course(dept, number, name, lectures=by_class["Lecture"],
+                  labs=by_class["Lab"], tutorials=by_class["Tutorial"])
+
+
+class FakeConnection(object):
+    """``get_course(s)`` from a dict of courses (a copy each time, as
+    from the SSC)
+    """
+
+    def __init__(self, courses):
+        self.courses = courses
+
+    def get_course(self, course, session="2014W", refresh=False,
+                   duplicates=True):
+        return copy.deepcopy(self.courses[course])
+
+    def get_courses(self, courses, session="2014W", refresh=False,
+                    duplicates=True):
+        return [self.get_course(course, session, refresh, duplicates)
+                for course in courses]
+
+
+def sample_courses():
+    """Two small courses that can be taken together in a few ways"""
+    return {
+        "CPSC 304": make_course("CPSC 304", [
+            ("Lecture", "101", 1, "Mon Wed", "9:00", "10:00", ""),
+            ("Lecture", "102", 1, "Tue Thu", "9:00", "10:00", ""),
+            ("Tutorial", "T1A", 1, "Fri", "9:00", "10:00", ""),
+            ("Tutorial", "T1B", 1, "Fri", "13:00", "14:00", "STT"),
+        ]),
+        "CPSC 310": make_course("CPSC 310", [
+            ("Lecture", "101", 1, "Mon Wed", "9:00", "10:00", ""),
+            ("Lecture", "102", 1, "Mon Wed", "11:00", "12:00", ""),
+            ("Lab", "L1A", 1, "Tue", "13:00", "15:00", ""),
+        ]),
+    }
+
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+
+
+def many_courses(names=("CPSC 110", "CPSC 121", "MATH 100"), terms=(1,)):
+    """Courses with a lecture at every few hours of every day (so that
+    they can be taken together in hundreds of ways)
+    """
+    courses = {}
+    for n, name in enumerate(names):
+        courses[name] = make_course(name, [
+            ("Lecture", "{}{}{}".format(term, day, hour), term, DAYS[day],
+             "{}:00".format(hour), "{}:00".format(hour + 1), "")
+            for term in terms for day in xrange(len(DAYS))
+            for hour in xrange(8 + n, 16, 3)
+        ])
+    return courses
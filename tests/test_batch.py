@@ -0,0 +1,81 @@
+import sys
+import unittest
+import subprocess
+
+from timetabler.batch import BatchPlanner
+from timetabler.catalog import Catalog, plan
+
+from tests.fixtures import FakeConnection, make_course, sample_courses
+
+
+class SessionConnection(FakeConnection):
+    """``get_course`` from {session: {name: Course}}"""
+
+    def get_course(self, course, session="2014W", refresh=False,
+                   duplicates=True):
+        return FakeConnection(self.courses[session]).get_course(course)
+
+
+def describe(schedules):
+    return sorted((a.section, a.start_time) for s in schedules
+                  for a in s.activities)
+
+
+class BatchPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = Catalog(FakeConnection(sample_courses()))
+
+    def test_missing_course_only_fails_its_students(self):
+        requests = [dict(id="ok", courses=["CPSC 304", "CPSC 310"]),
+                    dict(id="bad", courses=["CPSC 304", "CPSC 999"])]
+        results = {request_id: (schedules, error) for request_id, schedules, error
+                   in BatchPlanner(self.catalog, processes=1).run(requests)}
+        self.assertIsNone(results["bad"][0])
+        self.assertIn("CPSC 999", results["bad"][1])
+        schedules, error = results["ok"]
+        self.assertIsNone(error)
+        self.assertEqual([s.key for s in schedules],
+                         [s.key for s in plan(requests[0], self.catalog)])
+
+    def test_sections_are_kept_apart_by_session(self):
+        catalog = Catalog(SessionConnection({
+            session: {"CPSC 304": make_course("CPSC 304", [
+                ("Lecture", "101", 1, "Mon", start, end, "")])}
+            for session, start, end in [("2014W", "9:00", "10:00"),
+                                        ("2015W", "13:00", "14:00")]
+        }))
+        requests = [dict(id=session, courses=["CPSC 304"], session=session)
+                    for session in ("2014W", "2015W")]
+        results = {request_id: schedules for request_id, schedules, _
+                   in BatchPlanner(catalog, processes=1).run(requests)}
+        self.assertEqual(describe(results["2014W"]),
+                         [("CPSC 304 101", "09:00")])
+        self.assertEqual(describe(results["2015W"]),
+                         [("CPSC 304 101", "13:00")])
+
+    def test_parallel_gives_the_same_schedules(self):
+        requests = [dict(id=i, courses=["CPSC 304", "CPSC 310"],
+                         terms=[1, 2] if i % 2 else [1])
+                    for i in xrange(4)]
+        serial = {request_id: describe(schedules) for request_id, schedules, _
+                  in BatchPlanner(self.catalog, processes=1).run(requests)}
+        parallel = {request_id: describe(schedules)
+                    for request_id, schedules, _ in BatchPlanner(
+                        self.catalog, processes=2, min_parallel=1
+                    ).run(requests)}
+        self.assertEqual(parallel, serial)
+        self.assertTrue(all(serial.values()))
+
+    def test_server_is_not_imported(self):
+        script = ("import sys\n"
+                  "import timetabler.batch\n"
+                  "print(sorted(set(sys.modules) & {'timetabler.server', "
+                  "'BaseHTTPServer', 'multiprocessing'}))\n")
+        self.assertEqual(
+            subprocess.check_output([sys.executable, "-c", script]).strip(),
+            "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
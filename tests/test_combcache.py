@@ -0,0 +1,82 @@
+import sys
+import unittest
+import subprocess
+
+from timetabler.combcache import CombinationCache
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, sample_courses
+
+
+def no_stt(acts):
+    return all(a.status != "STT" for a in acts)
+
+
+class CombinationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection(sample_courses())
+        self.cache = CombinationCache()
+
+    def scheduler(self):
+        return Scheduler(["CPSC 304"], ssc_conn=self.conn,
+                         combination_cache=self.cache)
+
+    def test_hit_after_miss(self):
+        first = self.scheduler()
+        combs = first._course_combinations(first.courses["CPSC 304"])
+        self.assertEqual(self.cache.stats["misses"], 1)
+        second = self.scheduler()
+        again = second._course_combinations(second.courses["CPSC 304"])
+        self.assertEqual(self.cache.stats["hits"], 1)
+        self.assertEqual([[a.section for a in c] for c in combs],
+                         [[a.section for a in c] for c in again])
+
+    def test_status_changes_hit_but_reach_constraints(self):
+        s = self.scheduler()
+        course = s.courses["CPSC 304"]
+        course.add_constraint(no_stt)
+        sections = lambda: sorted(tuple(a.section for a in c)
+                                  for c in s._course_combinations(course))
+        self.assertTrue(all("CPSC 304 T1B" not in c for c in sections()))
+        for a in course.activities:
+            if a.section == "CPSC 304 T1B":
+                a.status = ""
+        self.assertTrue(any("CPSC 304 T1B" in c for c in sections()))
+        self.assertEqual(self.cache.stats["misses"], 1)
+
+    def test_changed_activities_miss(self):
+        s = self.scheduler()
+        s._course_combinations(s.courses["CPSC 304"])
+        course = s.courses["CPSC 304"]
+        course.lectures[0].start_time = "08:00"
+        s._course_combinations(course)
+        self.assertEqual(self.cache.stats["misses"], 2)
+
+    def test_disk_tier(self):
+        import os
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "combinations.cache")
+            for expected in ("misses", "disk_hits"):
+                self.cache = CombinationCache(path=path)
+                s = self.scheduler()
+                s._course_combinations(s.courses["CPSC 304"])
+                self.assertEqual(self.cache.stats[expected], 1)
+                self.cache.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_shelve_is_only_imported_for_a_disk_tier(self):
+        script = ("import sys\n"
+                  "import timetabler.scheduler\n"
+                  "print('shelve' in sys.modules)\n")
+        self.assertEqual(
+            subprocess.check_output([sys.executable, "-c", script]).strip(),
+            "False")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import time
+import unittest
+
+from timetabler import constraints
+from timetabler.constraints import ConstraintEvaluator
+
+
+class CountingClock(object):
+    """Stand-in for the ``time`` module that counts calls to ``time``"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def time(self):
+        self.calls += 1
+        return time.time()
+
+
+def slow(n):
+    """Accepts everything, expensively"""
+    sum(xrange(2000))
+    return True
+
+
+def odd(n):
+    return n % 2 == 1
+
+
+class ConstraintEvaluatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = constraints.time = CountingClock()
+
+    def tearDown(self):
+        constraints.time = time
+
+    def test_cheap_selective_constraints_go_first(self):
+        evaluator = ConstraintEvaluator([slow, odd], reorder_every=16)
+        results = [evaluator(n) for n in xrange(100)]
+        self.assertEqual(results, [n % 2 == 1 for n in xrange(100)])
+        stats = {s["constraint"]: s for s in evaluator.stats()}
+        self.assertEqual(stats[odd]["position"], 0)
+        self.assertEqual(stats[odd]["rejections"], 50)
+        self.assertLess(stats[slow]["calls"], 100)
+
+    def test_only_first_calls_are_timed(self):
+        evaluator = ConstraintEvaluator([odd], timed_calls=10)
+        for n in xrange(1000):
+            evaluator(n)
+        self.assertEqual(self.clock.calls, 2 * 10)
+        stats, = evaluator.stats()
+        self.assertEqual(stats["calls"], 1000)
+        self.assertEqual(stats["rejections"], 500)
+        self.assertIsNotNone(stats["avg_cost"])
+        evaluator.reset_stats()
+        evaluator(1)
+        self.assertEqual(self.clock.calls, 2 * 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
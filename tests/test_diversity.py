@@ -0,0 +1,99 @@
+import unittest
+
+from timetabler.diversity import diverse, diverse_positions
+from timetabler.results import ScheduleSet
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses
+
+
+FEATURES = {
+    "sections": lambda a: (a.section, a.term),
+    "times": lambda a: (a.term, frozenset(a.days), a.start_time, a.end_time),
+}
+
+
+def distance(a, b, features):
+    """Number of features in one of ``a`` and ``b`` but not the other"""
+    feature = FEATURES[features]
+    return len({feature(x) for x in a.activities} ^
+               {feature(x) for x in b.activities})
+
+
+def farthest_first(schedules, k, features):
+    """``diverse_positions`` without ``min_distance``, by brute force"""
+    picked = [0] if schedules and k > 0 else []
+    while 0 < len(picked) < k:
+        nearest = [min(distance(s, schedules[j], features) for j in picked)
+                   for s in schedules]
+        best = max(nearest)
+        if best == 0:
+            break
+        picked.append(nearest.index(best))
+    return sorted(picked)
+
+
+def first_fit(schedules, k, min_distance, features):
+    """``diverse_positions`` with ``min_distance``, by brute force"""
+    picked = []
+    for i, s in enumerate(schedules):
+        if len(picked) == k:
+            break
+        if all(distance(s, schedules[j], features) >= min_distance
+               for j in picked):
+            picked.append(i)
+    return picked
+
+
+class DiverseTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        cls.schedules = s.generate_schedules()[::50]
+
+    def check_distinct(self, positions, min_distance, features):
+        self.assertEqual(len(set(positions)), len(positions))
+        for n, i in enumerate(positions):
+            for j in positions[:n]:
+                self.assertGreaterEqual(
+                    distance(self.schedules[i], self.schedules[j], features),
+                    min_distance)
+
+    def test_farthest_first(self):
+        for features in FEATURES:
+            for k in (0, 1, 2, 5, 20):
+                positions = diverse_positions(self.schedules, k,
+                                              features=features)
+                self.assertEqual(
+                    positions, farthest_first(self.schedules, k, features))
+                self.assertLessEqual(len(positions), k)
+                self.check_distinct(positions, 1, features)
+
+    def test_min_distance(self):
+        for features in FEATURES:
+            for min_distance in (1, 4, 6, 8):
+                for k in (1, 5, 1000):
+                    positions = diverse_positions(
+                        self.schedules, k, min_distance, features)
+                    self.assertEqual(positions, first_fit(
+                        self.schedules, k, min_distance, features))
+                    self.check_distinct(positions, min_distance, features)
+
+    def test_copies_are_not_picked(self):
+        schedules = [self.schedules[0]] * 3
+        self.assertEqual(diverse_positions(schedules, 3), [0])
+        self.assertEqual(diverse_positions([], 3), [])
+
+    def test_schedule_sets(self):
+        schedule_set = ScheduleSet(self.schedules)
+        expected = diverse(self.schedules, 5, features="times")
+        self.assertEqual(
+            [sorted(a.section for a in s.activities)
+             for s in diverse(schedule_set, 5, features="times")],
+            [sorted(a.section for a in s.activities) for s in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
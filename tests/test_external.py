@@ -0,0 +1,75 @@
+import os
+import gc
+import shutil
+import tempfile
+import unittest
+
+from timetabler.external import ExternalSort
+from timetabler.rank import Ranker
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses
+
+PRIORITY = ["days_at_school", "time_at_school", "latest_daily_morning"]
+
+
+class ExternalSortTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scheduler = Scheduler(
+            ["CPSC 110", "CPSC 121", "MATH 100"],
+            ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        self.ranker = Ranker(commute_hrs=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sorted_schedules(self, **kwargs):
+        return self.scheduler.generate_sorted(
+            self.ranker.lexicographic_key(PRIORITY), directory=self.directory,
+            **kwargs)
+
+    def test_order_matches_ranking_in_memory(self):
+        expected = [s.key for s in self.ranker.lexicographic(
+            self.scheduler.generate_schedules(), PRIORITY)]
+        with self.sorted_schedules(max_memory=20000) as ranked:
+            self.assertGreater(ranked.runs, 1)
+            self.assertEqual(len(ranked), len(expected))
+            self.assertEqual([s.key for s in ranked], expected)
+            self.assertEqual([s.key for s in ranked.page(2, 5)],
+                             expected[10:15])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_runs_deleted_when_abandoned(self):
+        ranked = self.sorted_schedules(max_memory=20000)
+        iterator = iter(ranked)
+        next(iterator)
+        self.assertTrue(os.listdir(self.directory))
+        del ranked, iterator
+        gc.collect()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_runs_deleted_when_interrupted(self):
+        def interrupt(schedule, seen=[]):
+            seen.append(schedule)
+            if len(seen) > 200:
+                raise KeyboardInterrupt
+            return len(seen)
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.scheduler.generate_sorted(interrupt, max_memory=2000,
+                                           directory=self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_equal_keys_keep_their_order(self):
+        schedules = list(self.scheduler.iter_schedules())
+        ranked = ExternalSort(lambda s: 0, max_memory=1000,
+                              directory=self.directory)
+        ranked.extend(schedules)
+        self.assertEqual([s.key for s in ranked], [s.key for s in schedules])
+        ranked.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
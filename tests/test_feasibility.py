@@ -0,0 +1,96 @@
+import unittest
+from itertools import product
+
+from timetabler.feasibility import find_core, option_mask
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import (FakeConnection, make_course, many_courses,
+                            sample_courses)
+
+
+def lectures(name, *slots):
+    """Course ``name`` with a lecture in each (days, start, end) of
+    ``slots``
+    """
+    return make_course(name, [
+        ("Lecture", "1{:02d}".format(i), 1, days, start, end, "")
+        for i, (days, start, end) in enumerate(slots)])
+
+
+def courses(**slots):
+    return {name.replace("_", " "): lectures(name.replace("_", " "), *s)
+            for name, s in slots.items()}
+
+
+X = ("Mon", "9:00", "10:00")
+Y = ("Mon", "09:30", "11:00")
+Z = ("Tue", "9:00", "10:00")
+W = ("Mon", "10:00", "11:00")  # Right after X
+
+
+class FindCoreTest(unittest.TestCase):
+
+    def options(self, s):
+        combs = s._combinations_by_course(("Full", "Blocked"))
+        return [combs[name] for name in s.required]
+
+    def test_masks_agree_with_check_conflict(self):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        options = self.options(s)
+        for a, b in product(options[0], options[1]):
+            self.assertEqual(
+                bool(option_mask(a) & option_mask(b)),
+                s._check_schedule_conflicts([a, b]), (a, b))
+
+    def test_feasible(self):
+        for names, conn in [
+                (["CPSC 304", "CPSC 310"], sample_courses()),
+                (["CPSC 110", "CPSC 121", "MATH 100"], many_courses())]:
+            s = Scheduler(names, ssc_conn=FakeConnection(conn))
+            self.assertIsNone(find_core(self.options(s)))
+            self.assertIsNone(s.check_feasibility())
+            self.assertTrue(s.generate_schedules())
+
+    def test_course_without_options(self):
+        self.assertEqual(find_core([[()], []]), [1])
+
+    def test_conflicting_pair(self):
+        s = Scheduler(["CPSC 100", "CPSC 200", "CPSC 300"],
+                      ssc_conn=FakeConnection(courses(
+                          CPSC_100=[Z], CPSC_200=[X], CPSC_300=[Y])))
+        self.assertEqual(find_core(self.options(s)), [1, 2])
+        infeasibility = s.check_feasibility()
+        self.assertEqual(infeasibility.courses, ["CPSC 200", "CPSC 300"])
+        self.assertEqual(s.generate_schedules(), [])
+        self.assertEqual(s.infeasibility.courses, infeasibility.courses)
+
+    def test_core_found_by_arc_consistency(self):
+        # Every pair fits, but once CPSC 300 takes X, CPSC 100 and 200
+        #  can't both have W
+        s = Scheduler(["CPSC 100", "CPSC 200", "CPSC 300", "CPSC 400"],
+                      ssc_conn=FakeConnection(courses(
+                          CPSC_100=[X, W], CPSC_200=[X, W], CPSC_300=[X],
+                          CPSC_400=[Z])))
+        options = self.options(s)
+        for i, j in [(0, 1), (0, 2), (1, 2)]:
+            self.assertIsNone(find_core([options[i], options[j]]))
+        self.assertEqual(find_core(options), [0, 1, 2])
+        self.assertEqual(s.check_feasibility().courses,
+                         ["CPSC 100", "CPSC 200", "CPSC 300"])
+        self.assertEqual(s.generate_schedules(), [])
+
+    def test_sections_without_times(self):
+        # e.g., an online section, with no days or times
+        conn = sample_courses()
+        conn["CPSC 310"] = make_course("CPSC 310", [
+            ("Lecture", "99A", 1, "", "", "", "")])
+        s = Scheduler(["CPSC 304", "CPSC 310"], ssc_conn=FakeConnection(conn))
+        online = conn["CPSC 310"].activities[0]
+        self.assertEqual(option_mask((online,)), 0)
+        self.assertIsNone(s.check_feasibility())
+        self.assertTrue(s.generate_schedules())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from timetabler.index import ScheduleIndex
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses
+
+
+def matches(schedule, sections=(), courses=(), free_days=(), term=None,
+            start_after=None, end_before=None, exclude_sections=(),
+            exclude_courses=()):
+    """What ``ScheduleIndex.query`` answers, by looking at ``schedule``"""
+    acts = schedule.activities
+    in_schedule = {a.section for a in acts}
+    in_schedule |= {" ".join(a.section.split()[:2]) for a in acts}
+    term_acts = [a for a in acts if term is None or a.term == term]
+    return (all(x in in_schedule for x in list(sections) + list(courses)) and
+            not any(x in in_schedule for x in
+                    list(exclude_sections) + list(exclude_courses)) and
+            not any(day in a.days for day in free_days for a in term_acts) and
+            (start_after is None or
+             all(a.start_time >= start_after.zfill(5) for a in term_acts)) and
+            (end_before is None or
+             all(a.end_time <= end_before.zfill(5) for a in term_acts)))
+
+
+class ScheduleIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        cls.schedules = s.generate_schedules()[::7]
+        cls.index = ScheduleIndex(cls.schedules)
+
+    def check(self, **query):
+        expected = [i for i, schedule in enumerate(self.schedules)
+                    if matches(schedule, **query)]
+        self.assertEqual(self.index.positions(self.index.query(**query)),
+                         expected, query)
+        return expected
+
+    def test_sections_and_courses(self):
+        self.assertTrue(self.check(sections=["CPSC 110 108"]))
+        self.assertTrue(self.check(sections=["CPSC 110 108",
+                                             "CPSC 121 1012"]))
+        self.assertEqual(self.check(sections=["CPSC 110 108",
+                                              "CPSC 110 111"]), [])
+        self.assertEqual(self.check(sections=["CPSC 999 101"]), [])
+        self.assertEqual(len(self.check(courses=["MATH 100"])),
+                         len(self.schedules))
+
+    def test_excluded_sections_and_courses(self):
+        self.assertTrue(self.check(exclude_sections=["CPSC 110 108"]))
+        self.assertTrue(self.check(sections=["CPSC 121 1012"],
+                                   exclude_sections=["CPSC 110 108",
+                                                     "MATH 100 2010"]))
+        self.assertEqual(self.check(exclude_courses=["MATH 100"]), [])
+        self.assertEqual(len(self.check(exclude_sections=["CPSC 999 101"])),
+                         len(self.schedules))
+
+    def test_free_days(self):
+        for term in (None, 1, 2):
+            self.assertTrue(self.check(free_days=["Fri"], term=term))
+            self.check(free_days=["Mon", "Fri"], term=term)
+            self.check(free_days=["Mon", "Wed"], term=term,
+                       exclude_courses=["CPSC 121"])
+
+    def test_time_windows(self):
+        for term in (None, 1, 2):
+            self.assertTrue(self.check(start_after="9:00", term=term))
+            self.assertTrue(self.check(end_before="15:00", term=term))
+            self.check(start_after="10:00", end_before="16:00", term=term,
+                       free_days=["Tue"], sections=["CPSC 110 211"])
+
+
+if __name__ == '__main__':
+    unittest.main()
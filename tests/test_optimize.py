@@ -0,0 +1,61 @@
+import unittest
+from functools import partial
+
+from timetabler import sort
+from timetabler.optimize import Objective
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses, sample_courses
+
+
+class OptimizeTest(unittest.TestCase):
+
+    def check(self, s, objective, k):
+        """``Scheduler.optimize`` gives the same scores as sorting all of
+        ``generate_schedules``, for valid and distinct schedules (tied
+        schedules may differ, so only scores are compared)
+        """
+        everything = s.generate_schedules()
+        valid = {x.key for x in everything}
+        expected = sorted(objective(x.activities) for x in everything)[:k]
+        best = s.optimize(objective, k=k)
+        self.assertEqual([objective(x.activities) for x in best], expected)
+        self.assertTrue({x.key for x in best} <= valid)
+        self.assertEqual(len({x.key for x in best}), len(best))
+
+    def test_scores_match_brute_force(self):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        objective = Objective([
+            (partial(sort.time_at_school, commute_hrs=1), 1),
+            (sort.days_at_school, 2)])
+        for k in (1, 7, 50):
+            self.check(s, objective, k)
+
+    def test_ties(self):
+        # Every schedule of these courses is on 1 to 3 days, so most
+        #  scores are tied
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses()))
+        objective = Objective([(sort.days_at_school, 1)])
+        for k in (1, 5, 40):
+            self.check(s, objective, k)
+
+    def test_k_larger_than_the_number_of_schedules(self):
+        s = Scheduler(["CPSC 304", "CPSC 310"],
+                      ssc_conn=FakeConnection(sample_courses()))
+        count = len(s.generate_schedules())
+        objective = Objective([(sort.time_at_school, 1)])
+        self.check(s, objective, count + 10)
+        self.assertEqual(len(s.optimize(objective, k=count + 10)), count)
+        self.assertEqual(s.optimize(objective, k=0), [])
+
+    def test_constraints(self):
+        s = Scheduler(["CPSC 110", "CPSC 121"],
+                      ssc_conn=FakeConnection(many_courses()))
+        s.add_constraint(lambda x: sort.earliest_start(x.activities) >= 11)
+        self.check(s, Objective([(sort.time_at_school, 1)]), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
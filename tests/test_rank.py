@@ -0,0 +1,74 @@
+import unittest
+
+from timetabler import sort
+from timetabler.rank import Ranker
+from timetabler.results import ScheduleSet
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import (FakeConnection, make_course, many_courses,
+                            sample_courses)
+
+COMMUTE = 1.75
+
+
+class RankerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses()))
+        cls.schedules = s.generate_schedules()[:300]
+
+    def test_lexicographic_matches_chained_sorts(self):
+        chained = sort.free_days(self.schedules)
+        chained = sort.least_time_at_school(chained, commute_hrs=COMMUTE)
+        chained = sort.sum_latest_daily_morning(chained)
+        ranker = Ranker(commute_hrs=COMMUTE)
+        priority = ["latest_daily_morning", "time_at_school", "days_at_school"]
+        self.assertEqual(
+            [s.key for s in ranker.lexicographic(self.schedules, priority)],
+            [s.key for s in chained])
+        self.assertEqual(
+            [s.key for s in ranker.lexicographic(ScheduleSet(self.schedules),
+                                                 priority)],
+            [s.key for s in chained])
+
+    def test_sections_without_times(self):
+        courses = sample_courses()
+        courses["CPSC 100"] = make_course("CPSC 100", [
+            ("Lecture", "99A", 1, "", "", "", "")])
+        schedules = Scheduler(["CPSC 100", "CPSC 304", "CPSC 310"],
+                              ssc_conn=FakeConnection(courses)) \
+            .generate_schedules()
+        chained = sort.least_time_at_school(schedules, commute_hrs=COMMUTE)
+        chained = sort.sum_latest_daily_morning(chained)
+        priority = ["latest_daily_morning", "time_at_school"]
+        self.assertEqual(
+            [s.key for s in Ranker(commute_hrs=COMMUTE).lexicographic(
+                schedules, priority)],
+            [s.key for s in chained])
+
+    def test_pareto(self):
+        ranker = Ranker(commute_hrs=COMMUTE)
+        metrics = ["time_at_school", "days_at_school", "latest_daily_morning"]
+        key = ranker.lexicographic_key(metrics)
+        vectors = [key(s) for s in self.schedules]
+        expected = {s.key for s, v in zip(self.schedules, vectors)
+                    if not any(o != v and all(a <= b for a, b in zip(o, v))
+                               for o in vectors)}
+        frontier = ranker.pareto(self.schedules, metrics)
+        self.assertEqual({s.key for s in frontier}, expected)
+        self.assertEqual([s.key for s in frontier],
+                         [s.key for s in ranker.lexicographic(frontier, metrics)])
+
+    def test_keeps_nothing_between_rankings(self):
+        ranker = Ranker(commute_hrs=COMMUTE)
+        state = dict(vars(ranker))
+        ranker.weighted(self.schedules, {"time_at_school": 1,
+                                         "days_at_school": 2})
+        ranker.pareto(self.schedules)
+        self.assertEqual(vars(ranker), state)
+
+
+if __name__ == '__main__':
+    unittest.main()
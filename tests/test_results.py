@@ -0,0 +1,129 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from timetabler import sort
+from timetabler.results import ScheduleSet, load_or_generate
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses
+
+
+def describe(schedule):
+    return [(a.section, a.term, a.status, sorted(a.days), a.start_time,
+             a.end_time, a.course.dept, a.course.number)
+            for a in sorted(schedule.activities, key=lambda a: a.section)]
+
+
+class ScheduleSetTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        cls.schedules = s.generate_schedules()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "schedules.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unique(self):
+        ss = ScheduleSet(self.schedules, unique=True)
+        self.assertEqual(len(ss), len(self.schedules))
+        self.assertEqual(ss.extend(reversed(self.schedules)), 0)
+        self.assertFalse(ss.add(self.schedules[0]))
+        self.assertEqual([s.key for s in ss], [s.key for s in self.schedules])
+        self.assertEqual(len(ScheduleSet(self.schedules * 2)),
+                         2 * len(self.schedules))
+
+    def test_seen_are_excluded(self):
+        seen = [s.key for s in self.schedules[::2]]
+        ss = ScheduleSet(self.schedules, seen=seen)
+        self.assertEqual([s.key for s in ss],
+                         [s.key for s in self.schedules[1::2]])
+        self.assertFalse(ss.add(self.schedules[0]))
+        unique = ScheduleSet(self.schedules * 2, unique=True, seen=seen)
+        self.assertEqual([s.key for s in unique],
+                         [s.key for s in self.schedules[1::2]])
+
+    def test_save_and_load(self):
+        ss = ScheduleSet(self.schedules)
+        score = lambda s: sort.earliest_start(s.activities)
+        ss.save(self.path, "abc", scores=dict(time=score))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        loaded = ScheduleSet.load(self.path)
+        self.assertEqual(loaded.fingerprint, "abc")
+        self.assertEqual(len(loaded), len(ss))
+        self.assertEqual([describe(s) for s in loaded],
+                         [describe(s) for s in ss])
+        self.assertEqual([loaded.score("time", i)
+                          for i in xrange(len(loaded))],
+                         [score(s) for s in ss])
+        ranked = loaded.sorted_by_score("time")
+        self.assertEqual([s.key for s in ranked],
+                         [s.key for s in ss.sorted(score)])
+        self.assertEqual(ranked[-1].key, ranked[len(ranked) - 1].key)
+        with self.assertRaises(AssertionError):
+            loaded.add(self.schedules[0])
+
+    def test_load_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b"not a schedule set")
+        with self.assertRaises(ValueError):
+            ScheduleSet.load(self.path)
+
+    def test_load_rejects_truncated_files(self):
+        ss = ScheduleSet(self.schedules)
+        ss.save(self.path, "abc", scores=dict(days=lambda s: len(s.key)))
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        start = len(ScheduleSet._magic) + 8
+        header_end = start + struct.unpack("<Q", data[start - 8:start])[0]
+        for length in (8, 12, 20, header_end - 1, header_end + 16,
+                       len(data) - 1):
+            with open(self.path, 'wb') as f:
+                f.write(data[:length])
+            with self.assertRaises(ValueError):
+                ScheduleSet.load(self.path)
+
+    def test_load_or_generate_replaces_truncated_files(self):
+        generate = lambda: ScheduleSet(self.schedules)
+        load_or_generate(self.path, "v1", generate)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertEqual(len(load_or_generate(self.path, "v1", generate)),
+                         len(self.schedules))
+
+    def test_load_or_generate(self):
+        calls = []
+
+        def generate():
+            calls.append(1)
+            return ScheduleSet(self.schedules)
+
+        first = load_or_generate(self.path, "v1", generate)
+        again = load_or_generate(self.path, "v1", generate)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([s.key for s in again], [s.key for s in first])
+        load_or_generate(self.path, "v2", generate)
+        self.assertEqual(len(calls), 2)
+
+    def test_close_unmaps(self):
+        ScheduleSet(self.schedules).save(self.path, "abc")
+        loaded = ScheduleSet.load(self.path)
+        loaded.close()
+        with self.assertRaises(ValueError):
+            loaded[0]
+        ScheduleSet(self.schedules[:1]).save(self.path, "def")
+        self.assertEqual(len(ScheduleSet.load(self.path)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
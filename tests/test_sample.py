@@ -0,0 +1,108 @@
+import random
+import unittest
+from collections import Counter
+
+from timetabler.scheduler import Scheduler, SamplingError
+from timetabler.search import UniformSampler, decomposed_search
+
+from tests.fixtures import FakeConnection, many_courses, sample_courses
+
+
+def _scheduler(names=("CPSC 110", "CPSC 121"), **kwargs):
+    return Scheduler(list(names), ssc_conn=FakeConnection(
+        many_courses(terms=(1, 2))), **kwargs)
+
+
+class UniformSamplerTest(unittest.TestCase):
+
+    def test_count_is_the_number_of_schedules(self):
+        for s in (_scheduler(), Scheduler(["CPSC 304", "CPSC 310"],
+                  ssc_conn=FakeConnection(sample_courses()))):
+            combs = s._combinations_by_course(("Full", "Blocked"))
+            lists = [combs[name] for name in s.required]
+            self.assertEqual(
+                UniformSampler(lists, s._check_conflicts).count,
+                sum(1 for _ in decomposed_search(lists, s._check_conflicts)))
+
+    def test_draws_are_uniform(self):
+        s = _scheduler()
+        combs = s._combinations_by_course(("Full", "Blocked"))
+        lists = [combs[name] for name in s.required]
+        sampler = UniformSampler(lists, s._check_conflicts)
+        schedules = set(decomposed_search(lists, s._check_conflicts))
+        rng = random.Random(0)
+        per_schedule = 20
+        counts = Counter(sampler.draw(rng)
+                         for _ in xrange(per_schedule * sampler.count))
+        self.assertTrue(set(counts) <= schedules)
+        # Chi-squared statistic; its mean is the number of degrees of
+        #  freedom, and its standard deviation is about sqrt(2 * that)
+        chi2 = sum((counts[s] - per_schedule) ** 2 / float(per_schedule)
+                   for s in schedules)
+        df = len(schedules) - 1
+        self.assertLess(abs(chi2 - df), 5 * (2 * df) ** 0.5)
+
+    def test_counting_stops_after_max_kept(self):
+        s = _scheduler()
+        combs = s._combinations_by_course(("Full", "Blocked"))
+        lists = [combs[name] for name in s.required]
+        self.assertIsNone(
+            UniformSampler(lists, s._check_conflicts, max_kept=10).count)
+        self.assertTrue(
+            UniformSampler(lists, s._check_conflicts, max_kept=1000).count)
+
+
+class SampleTest(unittest.TestCase):
+
+    def test_samples_are_valid_and_repeatable(self):
+        s = _scheduler(electives=[(1, ["MATH 100"])])
+        valid = {x.key for x in s.generate_schedules()}
+        samples = s.sample(20, seed=1)
+        self.assertEqual(len({x.key for x in samples}), 20)
+        self.assertTrue({x.key for x in samples} <= valid)
+        self.assertEqual([x.key for x in s.sample(20, seed=1)],
+                         [x.key for x in samples])
+
+    def test_all_schedules_if_there_are_fewer_than_n(self):
+        s = Scheduler(["CPSC 304", "CPSC 310"],
+                      ssc_conn=FakeConnection(sample_courses()))
+        valid = sorted(x.key for x in s.generate_schedules())
+        self.assertEqual(sorted(x.key for x in s.sample(100, seed=0)), valid)
+
+    def test_selective_constraints(self):
+        s = _scheduler()
+        # Only 3 of the 900 conflict-free schedules are valid
+        s.add_constraint(lambda schedule: all(
+            a.section == "CPSC 110 118" or a.section.startswith("CPSC 121 10")
+            for a in schedule.activities))
+        valid = {x.key for x in s.generate_schedules()}
+        self.assertEqual(len(valid), 3)
+        samples = s.sample(2, seed=0, max_tries=20)
+        self.assertEqual(len({x.key for x in samples}), 2)
+        self.assertTrue({x.key for x in samples} <= valid)
+        self.assertEqual({x.key for x in s.sample(5, seed=0, max_tries=20)},
+                         valid)
+
+    def test_search_when_too_many_to_count(self):
+        s = _scheduler(names=("CPSC 110", "CPSC 121", "MATH 100"))
+        valid = {x.key for x in s.generate_schedules()}
+        enumerated = s.stats["nodes"]
+        samples = s.sample(5, seed=0, max_counted=10)
+        self.assertEqual(len({x.key for x in samples}), 5)
+        self.assertTrue({x.key for x in samples} <= valid)
+        self.assertLess(s.stats["nodes"], enumerated / 10)
+        self.assertEqual([x.key for x in s.sample(5, seed=0, max_counted=10)],
+                         [x.key for x in samples])
+
+    def test_gives_up_after_max_tries(self):
+        s = _scheduler()
+        s.add_constraint(lambda schedule: False)
+        self.assertEqual(s.sample(5, seed=0, max_tries=50), [])
+        with self.assertRaises(SamplingError):
+            s.sample(5, seed=0, max_tries=50, max_enumerated=100)
+        with self.assertRaises(SamplingError):
+            s.sample(5, seed=0, max_tries=50, max_counted=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
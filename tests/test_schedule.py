@@ -0,0 +1,35 @@
+import unittest
+
+from timetabler.schedule import Schedule
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, sample_courses
+
+
+class ScheduleKeyTest(unittest.TestCase):
+
+    def test_same_timetable_same_key(self):
+        first = Scheduler(["CPSC 304", "CPSC 310"],
+                          ssc_conn=FakeConnection(sample_courses()))
+        second = Scheduler(["CPSC 310", "CPSC 304"],
+                           ssc_conn=FakeConnection(sample_courses()))
+        schedules = first.generate_schedules()
+        self.assertEqual(len({s.key for s in schedules}), len(schedules))
+        self.assertEqual({s.key for s in schedules},
+                         {s.key for s in second.generate_schedules()})
+        # Schedules from different runs (with their own copies of
+        #  activities) are equal if their keys are
+        self.assertEqual(set(schedules), set(second.schedules))
+
+    def test_key_ignores_course_order(self):
+        s = Scheduler(["CPSC 304", "CPSC 310"],
+                      ssc_conn=FakeConnection(sample_courses()))
+        schedule = s.generate_schedules()[0]
+        flipped = Schedule(tuple(reversed(schedule._sched)))
+        self.assertEqual(flipped.key, schedule.key)
+        self.assertEqual(flipped, schedule)
+        self.assertEqual(hash(flipped), hash(schedule))
+
+
+if __name__ == '__main__':
+    unittest.main()
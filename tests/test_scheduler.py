@@ -0,0 +1,109 @@
+import random
+import unittest
+from itertools import combinations, product
+
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import (FakeConnection, make_course, many_courses,
+                            sample_courses)
+
+
+def keys(schedules):
+    return sorted(sorted((a.section, a.term) for a in s.activities)
+                  for s in schedules)
+
+
+class UpdateStatusesTest(unittest.TestCase):
+
+    def scheduler(self, constrained=False):
+        s = Scheduler(["CPSC 304", "CPSC 310"],
+                      ssc_conn=FakeConnection(sample_courses()))
+        if constrained:
+            # Depends on statuses that aren't bad statuses
+            s.courses["CPSC 304"].add_constraint(
+                lambda acts: all(a.status != "STT" for a in acts))
+        return s
+
+    def regenerated(self, s):
+        fresh = Scheduler.__new__(Scheduler)
+        fresh.__dict__.update(s.__dict__)
+        return keys(fresh.generate_schedules())
+
+    def test_constraint_on_status(self):
+        s = self.scheduler(constrained=True)
+        s.generate_schedules()
+        self.assertNotIn("CPSC 304 T1B",
+                         {a.section for x in s.schedules for a in x.activities})
+        added, removed = s.update_statuses({"CPSC 304 T1B": ""})
+        self.assertTrue(added)
+        self.assertEqual(keys(s.schedules), self.regenerated(s))
+        added, removed = s.update_statuses({"CPSC 304 T1A": "STT",
+                                            "CPSC 304 T1B": "STT"})
+        self.assertEqual(s.schedules, [])
+        self.assertEqual(keys(s.schedules), self.regenerated(s))
+
+    def check_against_regenerating(self, s):
+        s.generate_schedules()
+        sections = sorted({a.section for c in s.courses.values()
+                           for a in c.activities})
+        rng = random.Random(0)
+        for _ in xrange(30):
+            s.update_statuses({section: rng.choice(["", "Full", "STT"])
+                               for section in rng.sample(sections, 2)})
+            self.assertEqual(keys(s.schedules), self.regenerated(s))
+
+    def test_matches_regenerating(self):
+        self.check_against_regenerating(self.scheduler())
+
+    def test_matches_regenerating_with_constraints(self):
+        self.check_against_regenerating(self.scheduler(constrained=True))
+
+
+class ElectivesTest(unittest.TestCase):
+
+    def courses(self):
+        courses = many_courses(names=("CPSC 110", "CPSC 121", "MATH 100",
+                                      "PHYS 101"), terms=(1, 2))
+        # Only fits with CPSC 110 sections that aren't on Monday at 8
+        courses["STAT 200"] = make_course("STAT 200", [
+            ("Lecture", "101", 1, "Mon", "8:00", "9:00", "")])
+        # Never fits with STAT 200
+        courses["STAT 201"] = make_course("STAT 201", [
+            ("Lecture", "101", 1, "Mon", "8:30", "9:30", "")])
+        return courses
+
+    def check(self, required, electives):
+        courses = self.courses()
+        s = Scheduler(required, electives=electives,
+                      ssc_conn=FakeConnection(courses))
+        # One run without electives for every choice of them
+        expected = set()
+        group_choices = [combinations(group, k) for k, group in electives]
+        for choice in product(*group_choices):
+            names = list(required) + [n for names in choice for n in names]
+            expected.update(x.key for x in Scheduler(
+                names, ssc_conn=FakeConnection(courses)).generate_schedules())
+        self.assertTrue(expected)
+        schedules = s.generate_schedules()
+        self.assertEqual(len(schedules), len(expected))
+        self.assertEqual(set(x.key for x in schedules), expected)
+
+    def test_union_of_runs_for_every_choice(self):
+        self.check(["CPSC 110"], [(1, ["CPSC 121", "MATH 100"])])
+        self.check(["CPSC 110"], [(2, ["CPSC 121", "MATH 100", "PHYS 101"])])
+
+    def test_several_groups(self):
+        self.check(["CPSC 110"], [(1, ["CPSC 121", "STAT 200"]),
+                                  (1, ["MATH 100", "PHYS 101"])])
+
+    def test_electives_that_never_fit(self):
+        self.check(["STAT 200"], [(1, ["STAT 201", "CPSC 121"])])
+        self.check(["STAT 200", "MATH 100"],
+                   [(1, ["STAT 201", "CPSC 121"]), (1, ["PHYS 101"])])
+
+    def test_no_required_courses(self):
+        self.check([], [(2, ["CPSC 121", "MATH 100", "STAT 200"])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from collections import Counter
+from itertools import product
+
+from timetabler.scheduler import Scheduler
+from timetabler.search import backtrack, decomposed_search
+
+from tests.fixtures import FakeConnection, make_course, many_courses
+
+
+def brute_force(lists):
+    """Conflict-free schedules from ``lists``, by checking every product"""
+    return sorted(sched for sched in product(*lists)
+                  if not Scheduler._check_schedule_conflicts(sched))
+
+
+def crowded_courses():
+    """CPSC 100 has 100 combinations, but only 4 of them fit with the one
+    combination of CPSC 200
+    """
+    return {
+        "CPSC 100": make_course("CPSC 100", [
+            (cls, "{}{}".format(prefix, hour), 1, day, "{}:00".format(hour),
+             "{}:00".format(hour + 1), "")
+            for cls, prefix, day in [("Lecture", "1", "Mon"),
+                                     ("Tutorial", "T", "Tue")]
+            for hour in xrange(8, 18)
+        ]),
+        "CPSC 200": make_course("CPSC 200", [
+            ("Lecture", "101", 1, "Mon", "9:00", "17:00", ""),
+            ("Tutorial", "T1A", 1, "Tue", "9:00", "17:00", ""),
+        ]),
+    }
+
+
+def _lists(s):
+    """Section combinations of every course of ``s``"""
+    return [s._course_combinations(s.courses[name])
+            for name in sorted(s.courses)]
+
+
+def problems():
+    """Lists of section combinations of a few sets of courses"""
+    courses = many_courses(terms=(1, 2))
+    lectures = courses["MATH 100"].activities
+    # A year-long course, with a lecture in each term at the same time
+    year_long = [(a, b) for a, b in product(lectures, lectures)
+                 if (a.term, b.term) == (1, 2) and a.days == b.days and
+                 a.start_time == b.start_time]
+    return [
+        _lists(Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                         ssc_conn=FakeConnection(courses))),
+        _lists(Scheduler(["CPSC 110", "CPSC 121"],
+                         ssc_conn=FakeConnection(courses))) + [year_long],
+        _lists(Scheduler(["CPSC 100", "CPSC 200"],
+                         ssc_conn=FakeConnection(crowded_courses()))),
+    ]
+
+
+class DecomposedSearchTest(unittest.TestCase):
+
+    def test_max_kept_gives_the_same_schedules_in_order(self):
+        s = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        lists = _lists(s)
+        expected = list(decomposed_search(lists, s._check_conflicts))
+        self.assertTrue(expected)
+        for max_kept in (0, 1, 10, None):
+            self.assertEqual(
+                list(decomposed_search(lists, s._check_conflicts,
+                                       max_kept=max_kept)),
+                expected)
+
+    def test_iter_schedules_with_electives(self):
+        s = Scheduler(["CPSC 110"], electives=[(1, ["CPSC 121", "MATH 100"])],
+                      ssc_conn=FakeConnection(many_courses(terms=(1, 2))))
+        expected = sorted(x.key for x in s.generate_schedules())
+        for max_kept in (1, 100000):
+            self.assertEqual(sorted(x.key for x in
+                                    s.iter_schedules(max_kept=max_kept)),
+                             expected)
+
+    def test_same_schedules_as_brute_force(self):
+        for lists in problems():
+            expected = brute_force(lists)
+            self.assertTrue(expected)
+            self.assertEqual(
+                sorted(decomposed_search(lists, Scheduler._check_conflicts)),
+                expected)
+
+
+class BacktrackTest(unittest.TestCase):
+
+    def test_heuristics_give_the_same_schedules(self):
+        for lists in problems():
+            for heuristics in (True, False):
+                self.assertEqual(
+                    sorted(decomposed_search(lists,
+                                             Scheduler._check_conflicts,
+                                             heuristics=heuristics)),
+                    brute_force(lists))
+
+    def test_heuristics_visit_fewer_nodes(self):
+        s = Scheduler(["CPSC 100", "CPSC 200"],
+                      ssc_conn=FakeConnection(crowded_courses()))
+        lists = _lists(s)
+        stats = {}
+        for heuristics in (True, False):
+            stats[heuristics] = Counter()
+            self.assertEqual(
+                sorted(backtrack(lists, s._check_conflicts,
+                                 heuristics=heuristics,
+                                 stats=stats[heuristics])),
+                brute_force(lists))
+        # CPSC 200 (one option) is placed first and leaves 4 options for
+        #  CPSC 100, instead of trying all 100 of them
+        self.assertEqual(stats[True]["nodes"], 1 + 4)
+        self.assertEqual(stats[False]["nodes"], 100 + 100)
+        self.assertEqual(stats[False]["dead_ends"], 100 - 4)
+
+    def test_prune(self):
+        s = Scheduler(["CPSC 110", "CPSC 121"],
+                      ssc_conn=FakeConnection(many_courses()))
+        lists = _lists(s)
+        on_monday = lambda acts: any("Mon" in a.days for a in acts)
+        expected = [sched for sched in brute_force(lists)
+                    if not on_monday([a for comb in sched for a in comb])]
+        for heuristics in (True, False):
+            stats = Counter()
+            self.assertEqual(
+                sorted(backtrack(lists, s._check_conflicts,
+                                 heuristics=heuristics, stats=stats,
+                                 prune=on_monday)),
+                expected)
+            self.assertGreater(stats["pruned"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import unittest
+import threading
+import urllib2
+
+from timetabler import server
+from timetabler.catalog import Catalog, plan, plan_best
+from timetabler.server import SchedulingServer
+
+from tests.fixtures import FakeConnection, many_courses, sample_courses
+
+
+class SchedulingServerTest(unittest.TestCase):
+
+    def setUp(self):
+        courses = sample_courses()
+        courses.update(many_courses())
+        self.conn = FakeConnection(courses)
+        self.server = SchedulingServer(("127.0.0.1", 0),
+                                       catalog=Catalog(self.conn), workers=2)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, request):
+        response = urllib2.urlopen(urllib2.Request(
+            self.url + "/schedules", json.dumps(request),
+            {"Content-Type": "application/json"}))
+        return [json.loads(line) for line in response]
+
+    def test_concurrent_requests(self):
+        request = dict(courses=["CPSC 304", "CPSC 310"],
+                       rank=["time_at_school"], limit=2)
+        expected = plan(request, Catalog(self.conn))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.post(request))) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 4)
+        for lines in results:
+            self.assertEqual(lines[0], dict(count=len(expected)))
+            self.assertEqual([line["sections"] for line in lines[1:]],
+                             [sorted({a.section for a in s.activities})
+                              for s in expected[:2]])
+
+    def test_status(self):
+        self.post(dict(courses=["CPSC 304"]))
+        status = json.load(urllib2.urlopen(self.url + "/status"))
+        self.assertTrue(status["workers"])
+
+    def test_bad_request(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self.post(dict(courses=["CPSC 304"], constraints={"bogus": 1}))
+        self.assertEqual(cm.exception.code, 400)
+
+    def test_limit_too_large(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            self.post(dict(courses=["CPSC 304"],
+                           limit=server.MAX_LIMIT + 1))
+        self.assertEqual(cm.exception.code, 400)
+
+    def test_limit_not_a_number(self):
+        for limit in (True, "10", 1.5):
+            with self.assertRaises(urllib2.HTTPError) as cm:
+                self.post(dict(courses=["CPSC 304"], limit=limit))
+            self.assertEqual(cm.exception.code, 400)
+
+    def test_default_limit(self):
+        request = dict(courses=["CPSC 110", "CPSC 121", "MATH 100"])
+        count = len(plan(request, Catalog(self.conn)))
+        self.assertGreater(count, server.DEFAULT_LIMIT)
+        lines = self.post(request)
+        self.assertEqual(lines[0], dict(count=count))
+        self.assertEqual(len(lines), 1 + server.DEFAULT_LIMIT)
+
+
+class PlanBestTest(unittest.TestCase):
+
+    def test_same_as_the_start_of_plan(self):
+        catalog = Catalog(FakeConnection(many_courses()))
+        for request in [
+                dict(courses=["CPSC 110", "CPSC 121", "MATH 100"],
+                     rank=["days_at_school", "time_at_school"]),
+                dict(courses=["CPSC 110"], electives=[[1, ["CPSC 121",
+                                                          "MATH 100"]]],
+                     rank={"weights": {"time_at_school": 1}},
+                     constraints={"earliest_start": 10})]:
+            expected = plan(request, catalog)
+            for limit in (0, 5, len(expected) + 1):
+                count, best = plan_best(request, catalog, limit)
+                self.assertEqual(count, len(expected))
+                self.assertEqual([s.key for s in best],
+                                 [s.key for s in expected[:limit]])
+
+
+if __name__ == '__main__':
+    unittest.main()
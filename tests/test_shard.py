@@ -0,0 +1,74 @@
+import json
+import subprocess
+import sys
+import unittest
+from functools import partial
+
+from timetabler import shard, sort
+from timetabler.optimize import Objective
+from timetabler.scheduler import Scheduler
+
+from tests.fixtures import FakeConnection, many_courses
+
+OBJECTIVE = Objective([(sort.days_at_school, 1),
+                       (partial(sort.time_at_school, commute_hrs=1), 1)])
+
+
+def keys(schedules):
+    return sorted(s.key for s in schedules)
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler(["CPSC 110", "CPSC 121", "MATH 100"],
+                                   ssc_conn=FakeConnection(many_courses()))
+        # Rejects most of the best schedules
+        self.scheduler.add_constraint(
+            lambda s: not any("Mon" in a.days for a in s.activities))
+
+    def test_merged_shards_match_a_single_run(self):
+        expected = keys(self.scheduler.generate_schedules())
+        for n in (1, 3, 7):
+            results = [shard.run_shard(d) for d in self.scheduler.shards(n)]
+            self.assertEqual(keys(self.scheduler.merge_shards(results)),
+                             expected)
+
+    def test_best_with_constraints_in_parent(self):
+        expected = self.scheduler.optimize(OBJECTIVE, k=5)
+        results = [shard.run_shard(d, objective=OBJECTIVE, k=5)
+                   for d in self.scheduler.shards(3)]
+        self.assertTrue(self.scheduler.short_shards(results, 5))
+        with self.assertRaises(ValueError):
+            self.scheduler.merge_shards(results, k=5)
+        best = self.scheduler.generate_sharded(3, processes=2,
+                                               objective=OBJECTIVE, k=5)
+        self.assertEqual([OBJECTIVE(s.activities) for s in best],
+                         [OBJECTIVE(s.activities) for s in expected])
+        self.assertTrue(all(self.scheduler._constraints(s) for s in best))
+
+    def test_best_with_default_k(self):
+        expected = self.scheduler.optimize(OBJECTIVE)
+        self.assertEqual(len(expected), 10)
+        best = self.scheduler.generate_sharded(3, processes=2,
+                                               objective=OBJECTIVE)
+        self.assertEqual([OBJECTIVE(s.activities) for s in best],
+                         [OBJECTIVE(s.activities) for s in expected])
+        with self.assertRaises(ValueError):
+            shard.run_shard(self.scheduler.shards(1)[0], objective=OBJECTIVE)
+
+    def test_shard_runs_in_a_fresh_process(self):
+        description = self.scheduler.shards(2)[1]
+        process = subprocess.Popen(
+            [sys.executable, "-c",
+             "import sys, json; from timetabler.shard import run_shard; "
+             "print(json.dumps(run_shard(sys.stdin.read())))"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        out, _ = process.communicate(description)
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(json.loads(out),
+                         json.loads(json.dumps(shard.run_shard(description))))
+
+
+if __name__ == '__main__':
+    unittest.main()
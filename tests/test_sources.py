@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from timetabler.ssc.ssc_conn import SSCConnection
+from timetabler.ssc.sources import (DirectorySource, SQLiteSource,
+                                    RecordReplaySource, LiveSource,
+                                    PageNotFoundError, read_page, write_page)
+
+from tests.fakessc import FakeSSC
+
+PAGES = {("CPSC", "304"): [
+    (u"Restricted", u"CPSC 304 201", u"Lecture", u"2", u"Tue Thu", u"11:00",
+     u"12:30", u"Café"),
+    (u"", u"CPSC 304 T2A", u"Tutorial", u"2", u"Fri", u"14:00", u"15:00",
+     u""),
+]}
+
+
+def describe(course):
+    return [(a.section, a.status, a.term, sorted(a.days), a.comments)
+            for a in course.activities]
+
+
+class RecordReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        # Not UTF-8, so that decoding with the wrong encoding would show
+        self.ssc = FakeSSC(PAGES, charset="iso-8859-1")
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.ssc.close()
+        shutil.rmtree(self.directory)
+
+    def connection(self, **kwargs):
+        kwargs.setdefault("base_url", self.ssc.url)
+        conn = SSCConnection(**kwargs)
+        conn.cache_path = os.path.join(self.directory, "cache")
+        return conn
+
+    def check_store(self, store):
+        live = self.connection()
+        expected = describe(live.get_course("CPSC 304"))
+        self.assertIn("Caf\xc3\xa9", [c for _, _, _, _, c in expected])
+
+        recorder = self.connection()
+        recorder.source = RecordReplaySource(store, LiveSource(recorder))
+        self.assertEqual(describe(recorder.get_course("CPSC 304")), expected)
+        content, encoding = store.raw_course_page("CPSC", "304", "2014", "W")
+        self.assertEqual(content, self.ssc.page("CPSC", "304"))
+        self.assertEqual(encoding, "iso-8859-1")
+
+        hits = self.ssc.hits
+        replay = self.connection(base_url="http://127.0.0.1:1",
+                                 source=RecordReplaySource(store))
+        self.assertEqual(describe(replay.get_course("CPSC 304")), expected)
+        self.assertEqual(self.ssc.hits, hits)
+        with self.assertRaises(PageNotFoundError):
+            replay.get_course("MATH 100")
+
+    def test_directory(self):
+        self.check_store(DirectorySource(os.path.join(self.directory, "pages")))
+
+    def test_sqlite(self):
+        store = SQLiteSource(os.path.join(self.directory, "pages.db"))
+        try:
+            self.check_store(store)
+        finally:
+            store.close()
+
+    def test_page_cache_as_directory(self):
+        live = self.connection()
+        expected = describe(live.get_course("CPSC 304"))
+        conn = self.connection(source=DirectorySource(live.cache_path))
+        self.assertEqual(describe(conn.get_course("CPSC 304")), expected)
+
+
+class PageFileTest(unittest.TestCase):
+
+    def test_rewritten(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "page")
+            write_page(filename, b"caf\xe9", "iso-8859-1")
+            write_page(filename, b"caf\xc3\xa9", "utf-8")
+            self.assertEqual(read_page(filename), (b"caf\xc3\xa9", "utf-8"))
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ["page", "page.encoding"])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
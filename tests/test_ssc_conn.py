@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+from timetabler.ssc import ssc_conn
+from timetabler.ssc.ssc_conn import SSCConnection, NotLoggedInError
+from timetabler.ssc.sources import DirectorySource, page_name
+from timetabler.ssc.traffic import RequestScheduler
+
+from tests.fakessc import FakeSSC, render
+
+
+def rows(dept, course_num, count):
+    return [(u"Full" if i % 2 else u"Restricted",
+             u"{} {} {:03d}".format(dept, course_num, 101 + i), u"Lecture",
+             u"1", u"Mon Wed", u"{}:00".format(8 + i), u"{}:00".format(9 + i),
+             u"") for i in xrange(count)]
+
+
+def describe(activities):
+    return [(a.section, a.status, a.term, sorted(a.days), a.start_time)
+            for a in activities]
+
+
+def store_pages(args):
+    """Store parsed pages of ``courses`` one at a time in the shelve at
+    ``path`` (in a worker process)
+    """
+    path, courses = args
+    parsed_pages = ssc_conn._ParsedPages(path)
+    for dept, course_num in courses:
+        page = render(rows(dept, course_num, 2))
+        parsed_pages.store([(page, SSCConnection._parse_activities(page))])
+
+
+class ParsedPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = SSCConnection._activities_from_page
+        SSCConnection._activities_from_page = self.parsed_pages()
+
+    def tearDown(self):
+        SSCConnection._activities_from_page = self.saved
+        shutil.rmtree(self.directory)
+
+    def parsed_pages(self):
+        return ssc_conn._ParsedPages(os.path.join(self.directory, "parsed"))
+
+    def test_kept_by_page(self):
+        page = render(rows("CPSC", "304", 3))
+        parsed = SSCConnection._activities_from_page
+        self.assertEqual(parsed.lookup([page]), [None])
+        activities = parsed(page)
+        self.assertEqual(describe(activities),
+                         describe(SSCConnection._parse_activities(page)))
+        self.assertEqual(parsed.lookup([page + u" "]), [None])
+        self.assertEqual(describe(self.parsed_pages().lookup([page])[0]),
+                         describe(activities))
+
+    def test_least_recently_stored_are_dropped(self):
+        parsed = ssc_conn._ParsedPages(
+            os.path.join(self.directory, "capped"), max_entries=3)
+        for page in "abcd":
+            parsed.store([(page, [page])])
+        parsed.store([("b", ["b"]), ("e", ["e"])])
+        self.assertEqual(parsed.lookup(list("abcde")),
+                         [None, ["b"], None, ["d"], ["e"]])
+
+    def test_stores_from_many_processes_are_kept(self):
+        path = os.path.join(self.directory, "parsed")
+        work = [(path, [("D{}".format(i), str(100 + j)) for j in xrange(10)])
+                for i in xrange(4)]
+        pool = multiprocessing.Pool(4)
+        try:
+            pool.map(store_pages, work, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        pages = [render(rows(dept, course_num, 2))
+                 for _, courses in work for dept, course_num in courses]
+        self.assertEqual(
+            [describe(activities) for activities
+             in self.parsed_pages().lookup(pages)],
+            [describe(SSCConnection._parse_activities(page))
+             for page in pages])
+
+    def test_pages_parsed_in_parallel_are_kept(self):
+        source = DirectorySource(os.path.join(self.directory, "pages"))
+        names = []
+        for i in xrange(4):
+            dept, course_num = "D{}".format(i), str(100 + i)
+            source.store(page_name(dept, course_num, "2014", "W"),
+                         render(rows(dept, course_num, i + 1)).encode("utf-8"),
+                         "utf-8")
+            names.append("{} {}".format(dept, course_num))
+        conn = SSCConnection(source=source)
+        courses = conn.get_courses(names, processes=2, min_parallel=1)
+        for name, course in zip(names, courses):
+            dept, course_num = name.split()
+            page = source.course_page(dept, course_num, "2014", "W")
+            self.assertEqual(describe(course.activities),
+                             describe(SSCConnection._parse_activities(page)))
+            self.assertEqual(
+                describe(SSCConnection._activities_from_page.lookup(
+                    [page])[0]),
+                describe(course.activities))
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ssc = FakeSSC({})
+        self.conn = SSCConnection(
+            base_url=self.ssc.url,
+            request_scheduler=RequestScheduler(rate=1000, burst=100))
+        self.conn.cookies = {"JSESSIONID": "1234"}
+
+    def tearDown(self):
+        self.ssc.close()
+
+    def test_logged_in(self):
+        self.ssc.worklists = {u"Plan A": u"/cs/main?attrSelectedWorklist=1"}
+        self.assertTrue(self.conn._session_valid())
+        self.assertEqual(self.conn.get_worklists("2015W"), {
+            u"Plan A": self.ssc.url + u"/cs/main?attrSelectedWorklist=1"})
+
+    def test_not_logged_in(self):
+        # The SSC answers with a page without worklists rather than an
+        #  error when the session has expired
+        self.assertFalse(self.conn._session_valid())
+        with self.assertRaises(NotLoggedInError):
+            self.conn.get_worklists("2015W")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import time
+import threading
+import unittest
+
+from timetabler.ssc.traffic import RequestScheduler, WORKLIST, CATALOG
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.005)
+
+
+def in_thread(func, *args, **kwargs):
+    """Thread (started) that calls ``func``; its result is kept in
+    ``thread.results``
+    """
+    thread = threading.Thread(
+        target=lambda: thread.results.append(func(*args, **kwargs)))
+    thread.results = []
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def test_rate_limit(self):
+        scheduler = RequestScheduler(rate=50, burst=2)
+        start = time.time()
+        for i in xrange(7):
+            scheduler.request(lambda: None)
+        # The first two requests use up the bucket; the other five wait
+        #  for a token each
+        self.assertGreaterEqual(time.time() - start, 5 / 50. * 0.9)
+        self.assertGreater(scheduler.stats["throttled"], 0)
+        self.assertEqual(scheduler.metrics()["catalog"]["requests"], 7)
+
+    def test_higher_priority_goes_first(self):
+        scheduler = RequestScheduler(rate=5, burst=1)
+        scheduler.request(lambda: None)  # Empties the bucket
+        order = []
+        catalog = in_thread(scheduler.request, order.append, "catalog",
+                            priority=CATALOG)
+        wait_until(lambda: len(scheduler._queue) == 1)
+        worklist = in_thread(scheduler.request, order.append, "worklist",
+                             priority=WORKLIST)
+        wait_until(lambda: len(scheduler._queue) == 2)
+        catalog.join(5)
+        worklist.join(5)
+        self.assertEqual(order, ["worklist", "catalog"])
+        self.assertEqual(scheduler.metrics()["max_queued"], 2)
+
+    def test_identical_requests_are_coalesced(self):
+        scheduler = RequestScheduler(rate=1000, burst=10)
+        release = threading.Event()
+        calls = []
+
+        def fetch(url, params=None, cookies=None):
+            calls.append(url)
+            release.wait(5)
+            return object()
+
+        client = object()
+        leader = in_thread(scheduler.request, fetch, "a", params=dict(x=1),
+                           cookies={}, coalesce=True, client=client)
+        wait_until(lambda: calls)
+        followers = [
+            in_thread(scheduler.request, fetch, "a", params=dict(x=1),
+                      cookies={}, coalesce=True, client=client),
+            # Different requests
+            in_thread(scheduler.request, fetch, "a", params=dict(x=2),
+                      cookies={}, coalesce=True, client=client),
+            in_thread(scheduler.request, fetch, "a", params=dict(x=1),
+                      cookies={}, coalesce=True, client=object()),
+        ]
+        wait_until(lambda: len(calls) == 3 and
+                   scheduler.stats["coalesced"] == 1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertIs(followers[0].results[0], leader.results[0])
+        self.assertIsNot(followers[1].results[0], leader.results[0])
+        self.assertIsNot(followers[2].results[0], leader.results[0])
+        self.assertEqual(scheduler.metrics()["catalog"]["coalesced"], 1)
+        self.assertFalse(scheduler._in_flight)
+
+    def test_errors_are_given_to_coalesced_requests(self):
+        scheduler = RequestScheduler(rate=1000, burst=10)
+        release = threading.Event()
+        errors = []
+
+        def fetch():
+            release.wait(5)
+            raise IOError("down")
+
+        def request():
+            try:
+                scheduler.request(fetch, coalesce=True)
+            except IOError as err:
+                errors.append(err)
+
+        threads = [in_thread(request)]
+        wait_until(lambda: scheduler._in_flight)
+        threads.append(in_thread(request))
+        wait_until(lambda: scheduler.stats["coalesced"] == 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+    def test_interrupted_requests_are_finished(self):
+        scheduler = RequestScheduler(rate=1000, burst=10)
+        release = threading.Event()
+        errors = []
+
+        class Interrupt(BaseException):
+            pass
+
+        def fetch():
+            release.wait(5)
+            raise Interrupt()
+
+        def request():
+            try:
+                scheduler.request(fetch, coalesce=True)
+            except Interrupt as err:
+                errors.append(err)
+
+        threads = [in_thread(request)]
+        wait_until(lambda: scheduler._in_flight)
+        threads.append(in_thread(request))
+        wait_until(lambda: scheduler.stats["coalesced"] == 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 2)
+        self.assertFalse(scheduler._in_flight)
+
+    def test_cookies_need_a_client(self):
+        scheduler = RequestScheduler()
+        with self.assertRaises(ValueError):
+            scheduler.request(lambda cookies: None, cookies={}, coalesce=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
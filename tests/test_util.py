@@ -0,0 +1,110 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from timetabler.util import LazyModule, callable_fingerprint, replace_file
+
+
+EARLIEST = "09:00"
+
+
+def _make(threshold):
+    return lambda acts: all(a.start_time >= threshold for a in acts)
+
+
+def _earliest(acts):
+    return all(a.start_time >= EARLIEST for a in acts)
+
+
+class CallableFingerprintTest(unittest.TestCase):
+
+    def test_same_definition_same_fingerprint(self):
+        self.assertEqual(callable_fingerprint(_make(9)),
+                         callable_fingerprint(_make(9)))
+
+    def test_closed_over_values_count(self):
+        self.assertNotEqual(callable_fingerprint(_make(9)),
+                            callable_fingerprint(_make(10)))
+
+    def test_default_arguments_count(self):
+        first = lambda s, v=9: v
+        second = lambda s, v=10: v
+        self.assertNotEqual(callable_fingerprint(first),
+                            callable_fingerprint(second))
+
+    def test_globals_read_count(self):
+        global EARLIEST
+        before = callable_fingerprint(_earliest)
+        self.assertEqual(callable_fingerprint(_earliest), before)
+        try:
+            EARLIEST = "10:00"
+            self.assertNotEqual(callable_fingerprint(_earliest), before)
+        finally:
+            EARLIEST = "09:00"
+
+    def test_stable_across_processes(self):
+        # Nested code objects (the generator expression) have memory
+        #  addresses in their repr
+        script = ("from timetabler.util import callable_fingerprint\n"
+                  "f = lambda acts: all(a.status not in [u'STT'] "
+                  "for a in acts)\n"
+                  "print(callable_fingerprint(f))\n")
+        runs = [subprocess.check_output([sys.executable, "-c", script])
+                for _ in xrange(2)]
+        self.assertEqual(runs[0], runs[1])
+
+
+class LazyModuleTest(unittest.TestCase):
+
+    def test_imported_on_first_use(self):
+        script = ("import sys\n"
+                  "from timetabler.util import LazyModule\n"
+                  "colorsys = LazyModule('colorsys')\n"
+                  "print('colorsys' in sys.modules)\n"
+                  "colorsys.rgb_to_hsv\n"
+                  "print('colorsys' in sys.modules)\n")
+        self.assertEqual(
+            subprocess.check_output([sys.executable, "-c", script]).split(),
+            ["False", "True"])
+        self.assertEqual(LazyModule("colorsys").hsv_to_rgb(0, 0, 1),
+                         (1, 1, 1))
+
+    def test_heavy_modules_are_not_imported(self):
+        script = ("import sys\n"
+                  "import timetabler.scheduler, timetabler.rank\n"
+                  "import timetabler.ssc.ssc_conn\n"
+                  "print(sorted(set(sys.modules) & {'requests', 'bs4', "
+                  "'filecache', 'prettytable'}))\n")
+        self.assertEqual(
+            subprocess.check_output([sys.executable, "-c", script]).strip(),
+            "[]")
+
+
+class ReplaceFileTest(unittest.TestCase):
+
+    def test_replaces_existing_file(self):
+        directory = tempfile.mkdtemp()
+        saved_name = os.name
+        try:
+            dst = os.path.join(directory, "dst")
+            for name, content in [("posix", "first"), ("nt", "second")]:
+                src = os.path.join(directory, "src")
+                with open(src, "w") as f:
+                    f.write(content)
+                # Renaming onto an existing file fails on Windows
+                os.name = name
+                replace_file(src, dst)
+                os.name = saved_name
+                self.assertFalse(os.path.exists(src))
+                with open(dst) as f:
+                    self.assertEqual(f.read(), content)
+        finally:
+            os.name = saved_name
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from timetabler.ssc import ssc_conn
+from timetabler.ssc.ssc_conn import SSCConnection
+from timetabler.ssc.traffic import RequestScheduler
+from timetabler.ssc.watcher import SectionWatcher
+
+from tests.fakessc import FakeSSC
+
+
+PAGES = {
+    ("CPSC", "304"): [
+        (u"Restricted", u"CPSC 304 101", u"Lecture", u"1", u"Mon Wed",
+         u"9:00", u"10:00", u""),
+        (u"Full", u"CPSC 304 T1A", u"Tutorial", u"1", u"Fri", u"9:00",
+         u"10:00", u""),
+    ],
+    ("CPSC", "310"): [
+        (u"Restricted", u"CPSC 310 101", u"Lecture", u"1", u"Tue Thu",
+         u"9:00", u"10:00", u""),
+    ],
+}
+
+
+class SectionWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = SSCConnection._activities_from_page
+        SSCConnection._activities_from_page = ssc_conn._ParsedPages(
+            os.path.join(self.directory, "parsed"))
+        self.ssc = FakeSSC(PAGES)
+        self.conn = SSCConnection(
+            base_url=self.ssc.url,
+            request_scheduler=RequestScheduler(rate=1000, burst=100))
+        self.conn.cache_path = os.path.join(self.directory, "pages")
+        self.changes = []
+        self.watcher = SectionWatcher(
+            self.conn, ["CPSC 304 101", "CPSC 304 T1A", "CPSC 310 101"],
+            lambda *change: self.changes.append(change), interval=60,
+            min_interval=15, max_interval=600, backoff=2)
+
+    def tearDown(self):
+        self.ssc.close()
+        SSCConnection._activities_from_page = self.saved
+        shutil.rmtree(self.directory)
+
+    def test_first_poll_reads_statuses(self):
+        self.assertEqual(self.watcher.poll(now=0), [])
+        self.assertEqual(self.watcher.statuses, {
+            "CPSC 304 101": "Restricted", "CPSC 304 T1A": "Full",
+            "CPSC 310 101": "Restricted"})
+        # One request per course
+        self.assertEqual(self.ssc.hits, 2)
+        self.assertEqual(self.watcher.num_parses, 2)
+        # The page cache is kept warm
+        self.assertEqual(len(os.listdir(self.conn.cache_path)), 4)
+
+    def test_changes_are_reported(self):
+        self.watcher.poll(now=0)
+        self.ssc.statuses["CPSC 304 101"] = u"Full"
+        self.ssc.statuses["CPSC 304 T1A"] = u"Restricted"
+        changes = self.watcher.poll(now=1000)
+        self.assertEqual(changes, [("CPSC 304 101", "Restricted", "Full"),
+                                   ("CPSC 304 T1A", "Full", "Restricted")])
+        self.assertEqual(self.changes, changes)
+        self.assertEqual(self.watcher.statuses["CPSC 304 101"], "Full")
+
+    def test_unchanged_pages_are_not_parsed(self):
+        self.watcher.poll(now=0)
+        self.assertEqual(self.watcher.poll(now=1000), [])
+        self.assertEqual(self.ssc.hits, 4)
+        self.assertEqual(self.watcher.num_parses, 2)
+
+    def test_intervals_back_off(self):
+        self.watcher.poll(now=0)
+        # Not due yet
+        self.assertEqual(self.watcher.poll(now=1), [])
+        self.assertEqual(self.ssc.hits, 2)
+        self.assertEqual(self.watcher.next_poll(), 120)
+        self.watcher.poll(now=120)
+        self.assertEqual(self.watcher.next_poll(), 120 + 240)
+        self.ssc.statuses["CPSC 310 101"] = u"Full"
+        self.watcher.poll(now=360)
+        # The course that changed is polled more often again
+        self.assertEqual(self.watcher.next_poll(), 360 + 120)
+        self.assertEqual(self.watcher._courses[("CPSC", "304")]["interval"],
+                         480)
+
+    def test_errors_are_retried_with_backoff(self):
+        self.ssc.failing.add(("CPSC", "304"))
+        self.assertEqual(self.watcher.poll(now=0), [])
+        self.assertEqual(self.watcher.num_errors, 1)
+        # The other course is still watched
+        self.assertEqual(self.watcher.statuses["CPSC 310 101"], "Restricted")
+        state = self.watcher._courses[("CPSC", "304")]
+        self.assertEqual(state["next_poll"], 120)
+        self.watcher.poll(now=120)
+        self.assertEqual(state["next_poll"], 120 + 240)
+        self.ssc.failing.clear()
+        self.ssc.statuses["CPSC 304 101"] = u"Full"
+        self.watcher.poll(now=360)
+        self.assertEqual(state["failures"], 0)
+        self.assertEqual(self.watcher.statuses["CPSC 304 101"], "Full")
+
+    def test_run_survives_the_ssc_going_away(self):
+        self.ssc.close()
+        sleeps = []
+        self.watcher.run(max_polls=3, sleep=sleeps.append)
+        self.assertEqual(self.watcher.num_errors, 2)
+        self.assertEqual(len(sleeps), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
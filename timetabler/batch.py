@@ -0,0 +1,199 @@
+"""Planning schedules for many students at once
+
+Course lists of students overlap heavily, so rather than having one
+Scheduler per student fetch and parse its own courses, every distinct
+course is fetched once into a shared ``catalog.Catalog``, and valid section
+combinations are worked out once per distinct course and terms (in
+``combcache.default_cache``) before any student is planned. The students
+are then planned in a pool of processes, which are given the warm catalog
+when they start (and inherit the warm cache where processes are forked),
+and results are given back as each student finishes.
+"""
+import logging
+from collections import defaultdict
+
+from timetabler.scheduler import Scheduler
+from timetabler.schedule import Schedule
+from timetabler.catalog import Catalog, plan
+from timetabler.util import LazyModule
+
+# Small batches are planned without a pool of processes
+multiprocessing = LazyModule("multiprocessing")
+
+
+class BatchPlanner(object):
+    """Plans schedules for many students
+
+    :type  catalog: Catalog|None
+    :param catalog: Catalog to get courses from (a new one by default)
+    :type  processes: int|None
+    :param processes: Number of processes to plan students in (the
+        number of CPUs by default)
+    :type  min_parallel: int
+    :param min_parallel: Batches with fewer students than this are planned
+        in this process (starting a pool would take longer)
+    """
+
+    def __init__(self, catalog=None, processes=None, min_parallel=4):
+        self.catalog = Catalog() if catalog is None else catalog
+        self.processes = processes
+        self.min_parallel = min_parallel
+
+    def run(self, requests):
+        """Plan schedules for every request in ``requests``
+
+        :type  requests: list
+        :param requests: Requests as for ``catalog.plan`` (a dict of
+            courses, electives, session, terms etc.), each with an ``"id"``
+            for the student
+        :rtype: iterator
+        :returns: Iterator over (id, schedules, error) as students are
+            finished (not necessarily in order); ``schedules`` are ranked,
+            and ``error`` is a message if planning failed (and schedules
+            is None)
+        """
+        requests = list(requests)
+        activities, failed = self._warm(requests)
+        # Students with courses that couldn't be fetched aren't planned
+        planned = []
+        for request in requests:
+            errors = [failed[key] for key in _course_keys(request)
+                      if key in failed]
+            if errors:
+                yield request.get("id"), None, errors[0]
+            else:
+                planned.append(request)
+        if len(planned) < self.min_parallel or self.processes == 1:
+            results = ((i, _plan_one(self.catalog, request))
+                       for i, request in enumerate(planned))
+        else:
+            results = self._run_parallel(planned)
+        for i, (request_id, keys, error) in results:
+            if error is not None:
+                yield request_id, None, error
+                continue
+            group_activities = activities.get(_group(planned[i]), {})
+            try:
+                schedules = [
+                    Schedule((tuple(group_activities[tuple(k)]
+                                    for k in sched),))
+                    for sched in keys
+                ]
+            except KeyError as err:
+                yield request_id, None, "Activity {} was not warmed".format(
+                    err)
+            else:
+                yield request_id, schedules, None
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _warm(self, requests):
+        """Fetch every distinct course and work out its combinations once
+
+        :rtype: tuple
+        :returns: ({(session, terms, duplicates): {(section, term):
+            Activity}} for all fetched courses, {(session, terms,
+            duplicates, course): error message} for courses that couldn't
+            be fetched)
+        """
+        groups = defaultdict(set)
+        for request in requests:
+            for key in _course_keys(request):
+                groups[key[:-1]].add(key[-1])
+        activities = defaultdict(dict)
+        failed = {}
+        for group, courses in groups.iteritems():
+            try:
+                self._warm_courses(group, sorted(courses),
+                                   activities[group])
+            except Exception:
+                # Find out which courses failed, so that only the students
+                #  that need them fail
+                for course in courses:
+                    try:
+                        self._warm_courses(group, [course],
+                                           activities[group])
+                    except Exception as err:
+                        logging.warning("Could not warm {}: {}".format(
+                            course, err))
+                        failed[group + (course,)] = "{}: {}".format(
+                            err.__class__.__name__, err)
+        logging.info("Warmed {} courses for {} students.".format(
+            len(self.catalog), len(requests)))
+        return activities, failed
+
+    def _warm_courses(self, group, courses, activities):
+        """Fetch ``courses`` and work out their combinations, adding their
+        activities to ``activities``
+        """
+        session, terms, duplicates = group
+        s = Scheduler(courses, session=session, terms=terms,
+                      duplicates=duplicates, ssc_conn=self.catalog)
+        s.warm_combinations()
+        for course in s.courses.itervalues():
+            for a in course.activities:
+                activities[(a.section, a.term)] = a
+
+    def _run_parallel(self, requests):
+        """(index into ``requests``, result of ``_plan_one``) for every
+        request, as they are planned in a pool of processes
+        """
+        pool = multiprocessing.Pool(self.processes, _init_worker,
+                                    (self.catalog, requests))
+        try:
+            for result in pool.imap_unordered(_plan_nth,
+                                              xrange(len(requests))):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _group(request):
+    """(session, terms, duplicates) of ``request``; courses are only
+    shared between requests with the same group
+    """
+    return (str(request.get("session", "2014W")),
+            tuple(request.get("terms", (1, 2))),
+            request.get("duplicates", True))
+
+
+def _course_keys(request):
+    """(session, terms, duplicates, course) for every course in
+    ``request`` (including electives)
+    """
+    group = _group(request)
+    courses = [str(c) for c in request["courses"]]
+    for _, electives in request.get("electives", []):
+        courses.extend(str(c) for c in electives)
+    return [group + (course,) for course in courses]
+
+
+def _plan_one(catalog, request):
+    """Plan ``request``, with the result in a form that can be sent back
+    from a worker (i.e., (section, term) of every activity of every
+    schedule)
+    """
+    request_id = request.get("id")
+    try:
+        schedules = plan(request, catalog)
+    except Exception as err:
+        return request_id, None, "{}: {}".format(err.__class__.__name__, err)
+    return request_id, [[(a.section, a.term) for a in s.activities]
+                        for s in schedules], None
+
+
+# (catalog, requests) of a worker process (set by ``_init_worker``)
+_batch = None
+
+
+def _init_worker(catalog, requests):
+    global _batch
+    _batch = (catalog, requests)
+
+
+def _plan_nth(i):
+    catalog, requests = _batch
+    return i, _plan_one(catalog, requests[i])
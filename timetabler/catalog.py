@@ -0,0 +1,172 @@
+"""Parsed courses kept in memory, and planning requests against them
+
+These are shared by ``timetabler.server`` and ``timetabler.batch``; they
+live here so that batch planning doesn't import the HTTP server.
+"""
+import copy
+import heapq
+import threading
+
+from timetabler.scheduler import Scheduler
+from timetabler.rank import Ranker
+from timetabler.sort import earliest_start, latest_end
+from timetabler.ssc.ssc_conn import SSCConnection
+
+
+class Catalog(object):
+    """In-memory catalog of parsed courses
+
+    This can be used as the ``ssc_conn`` of a Scheduler. Every Scheduler
+    gets its own copy of a course, since Schedulers change courses (e.g.,
+    by adding constraints or updating statuses).
+
+    :type ssc_conn: SSCConnection
+    """
+
+    def __init__(self, ssc_conn=None):
+        self.ssc_conn = SSCConnection() if ssc_conn is None else ssc_conn
+        self._courses = {}
+        self._lock = threading.Lock()
+
+    def get_course(self, course, session="2014W", refresh=False,
+                   duplicates=True):
+        """Same as ``SSCConnection.get_course``, but courses are only
+        fetched and parsed the first time (or with ``refresh``)
+        """
+        key = (course, session, duplicates)
+        with self._lock:
+            if refresh or key not in self._courses:
+                self._courses[key] = self.ssc_conn.get_course(
+                    course, session, refresh=refresh, duplicates=duplicates)
+            return copy.deepcopy(self._courses[key])
+
+    def get_courses(self, courses, session="2014W", refresh=False,
+                    duplicates=True):
+        """Same as ``SSCConnection.get_courses``, but only courses that
+        haven't been fetched before (or all of them, with ``refresh``) are
+        fetched and parsed
+        """
+        keys = [(course, session, duplicates) for course in courses]
+        with self._lock:
+            missing = [course for course, _, _ in keys
+                       if refresh or (course, session, duplicates)
+                       not in self._courses]
+            if missing:
+                fetched = self.ssc_conn.get_courses(
+                    missing, session, refresh=refresh, duplicates=duplicates)
+                for course, parsed in zip(missing, fetched):
+                    self._courses[(course, session, duplicates)] = parsed
+            return [copy.deepcopy(self._courses[key]) for key in keys]
+
+    def __len__(self):
+        return len(self._courses)
+
+    def __getstate__(self):
+        # Locks can't be pickled (for workers that aren't forked)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def plan(request, catalog):
+    """Generate and rank schedules for ``request``
+
+    :type  request: dict
+    :param request: See ``timetabler.server``
+    :type  catalog: Catalog
+    :rtype: list
+    :returns: Ranked schedules
+    """
+    s = _scheduler(request, catalog)
+    schedules = s.generate_schedules(bad_statuses=_bad_statuses(request))
+    return sorted(schedules, key=_rank_key(request))
+
+
+def plan_best(request, catalog, limit):
+    """Find the best ``limit`` schedules for ``request``
+
+    Schedules are ranked as they are generated, keeping only the best
+    ``limit`` so far, so memory use doesn't grow with the number of
+    schedules. The result is the same as the first ``limit`` of ``plan``.
+
+    :type  request: dict
+    :type  catalog: Catalog
+    :type  limit: int
+    :rtype: tuple
+    :returns: (number of valid schedules, [Schedule, ...] best first)
+    """
+    s = _scheduler(request, catalog)
+    counted = [0]
+
+    def counting(schedules):
+        for schedule in schedules:
+            counted[0] += 1
+            yield schedule
+
+    schedules = counting(s.iter_schedules(bad_statuses=_bad_statuses(request)))
+    best = heapq.nsmallest(limit, schedules, key=_rank_key(request))
+    # Nothing is taken from ``schedules`` for a limit of 0, but they are
+    #  still counted
+    for _ in schedules:
+        pass
+    return counted[0], best
+
+
+def _scheduler(request, catalog):
+    """Scheduler (with constraints) for ``request``"""
+    names = lambda courses: [str(c) for c in courses]
+    s = Scheduler(
+        names(request["courses"]),
+        session=str(request.get("session", "2014W")),
+        terms=tuple(request.get("terms", (1, 2))),
+        duplicates=request.get("duplicates", True),
+        ssc_conn=catalog,
+        electives=[(k, names(group))
+                   for k, group in request.get("electives", [])]
+    )
+    for constraint in _constraints(request.get("constraints", {})):
+        s.add_constraint(constraint)
+    return s
+
+
+def _bad_statuses(request):
+    return tuple(request.get("bad_statuses", ("Full", "Blocked")))
+
+
+def _rank_key(request):
+    """Key function that ranks schedules as ``request`` asks"""
+    ranker = Ranker(commute_hrs=request.get("commute_hrs", 0))
+    rank = request.get("rank", ranker.metric_names)
+    if isinstance(rank, dict):
+        return ranker.weighted_key(rank["weights"])
+    return ranker.lexicographic_key(rank)
+
+
+def _constraints(spec):
+    """Schedule constraints (for ``Scheduler.add_constraint``) from
+    ``spec``; constraints can't be sent as code, so only these are
+    supported:
+
+    * ``earliest_start``: No classes before this hour
+    * ``latest_end``: No classes after this hour
+    * ``free_days``: No classes on these days
+    """
+    constraints = []
+    for name, value in spec.iteritems():
+        if name == "earliest_start":
+            constraints.append(
+                lambda s, v=value: earliest_start(s.activities) >= v)
+        elif name == "latest_end":
+            constraints.append(
+                lambda s, v=value: latest_end(s.activities) <= v)
+        elif name == "free_days":
+            constraints.append(
+                lambda s, v=set(value): not any(a.days & v
+                                                for a in s.activities))
+        else:
+            raise ValueError("Unknown constraint {}".format(name))
+    return constraints
@@ -0,0 +1,137 @@
+"""Cache of valid section combinations for courses
+
+Working out the valid section combinations of a course (enumerating
+combinations of its activities and filtering them by section counts and
+terms) only depends on the course's activities and section counts and on
+the terms being scheduled for, so the result can be shared between
+Schedulers (i.e., between runs with different sets of courses) and, with
+a disk tier, between runs of the program.
+
+Course constraints are not part of what is cached: they may look at
+section statuses, which change far more often than anything else about a
+course, so they are checked after lookup (as statuses are).
+
+Combinations are stored as tuples of positions in ``course.activities``
+rather than as Activity objects, so cached results are independent of
+section statuses and can be pickled.
+
+A cache can be shared between threads; combinations are computed outside
+its lock, so a course may be worked out twice if two threads miss on it
+at once.
+"""
+import logging
+import threading
+from hashlib import md5
+from collections import Counter, OrderedDict
+
+from timetabler.util import LazyModule
+
+# Only needed for caches with a disk tier
+shelve = LazyModule("shelve")
+
+
+class CombinationCache(object):
+    """Bounded LRU cache of section combinations with an optional disk
+    tier
+
+    :type  maxsize: int
+    :param maxsize: Maximum number of courses kept in memory
+    :type  path: str|None
+    :param path: If this is set, combinations are also stored in a shelve
+        at ``path`` and are looked up there on a miss in memory
+    """
+
+    def __init__(self, maxsize=256, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._shelf = None
+        self._lock = threading.RLock()
+
+    def get(self, course, terms, compute):
+        """Valid section combinations of ``course`` for ``terms``
+
+        :type  course: Course
+        :type  terms: tuple|list
+        :type  compute: callable
+        :param compute: Called with ``course`` on a miss; returns the list
+            of valid combinations (tuples of Activity)
+        :rtype: [tuple, ...]
+        """
+        acts = course.activities
+        key = self.key(course, terms)
+        with self._lock:
+            positions = self._entries.pop(key, None)
+            if positions is not None:
+                self.stats["hits"] += 1
+            else:
+                shelf = self._open()
+                if shelf is not None and key in shelf:
+                    self.stats["disk_hits"] += 1
+                    positions = shelf[key]
+                else:
+                    self.stats["misses"] += 1
+        if positions is None:
+            index = {id(a): i for i, a in enumerate(acts)}
+            positions = [tuple(index[id(a)] for a in comb)
+                         for comb in compute(course)]
+            with self._lock:
+                shelf = self._open()
+                if shelf is not None:
+                    shelf[key] = positions
+                    shelf.sync()
+        with self._lock:
+            self._entries[key] = positions
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return [tuple(acts[i] for i in comb) for comb in positions]
+
+    @staticmethod
+    def key(course, terms):
+        """Key of ``course`` for ``terms``, covering everything that
+        determines its valid combinations except section statuses and
+        course constraints (which are checked after lookup)
+
+        :rtype: str
+        """
+        h = md5()
+        h.update(repr(tuple(terms)))
+        for act in course.activities:
+            h.update(repr((
+                act.__class__.__name__, act.section, act.term,
+                sorted(act.days), act.start_time, act.end_time,
+                act.is_multi_term
+            )))
+        h.update(repr([(cls.__name__, n) for cls, n
+                       in course.num_section_constraints]))
+        return h.hexdigest()
+
+    def clear(self):
+        """Clear the in-memory tier (the disk tier is kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        with self._lock:
+            if self._shelf is not None:
+                self._shelf.close()
+                self._shelf = None
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _open(self):
+        if self.path is not None and self._shelf is None:
+            try:
+                self._shelf = shelve.open(self.path)
+            except Exception as err:
+                logging.warning("Could not open combination cache {}: {}"
+                                .format(self.path, err))
+                self.path = None
+        return self._shelf
+
+
+# Shared by all Schedulers that aren't given a cache of their own
+default_cache = CombinationCache()
@@ -0,0 +1,151 @@
+"""Evaluation of schedule constraints
+
+A schedule is rejected as soon as one constraint fails, so the order in
+which constraints are checked matters: checking cheap constraints that
+reject many schedules first avoids running expensive ones at all. As the
+cost and rejection rate of user constraints aren't known up front, they
+are measured while schedules are checked, and the constraints are
+periodically reordered by expected cost per rejection (average cost
+divided by rejection rate).
+
+Rejection rates are measured for the schedules a constraint actually
+gets to see (i.e., those that passed the constraints before it), which is
+what matters for the order it is in.
+
+Timing a call costs about as much as a cheap constraint itself, so only
+the first ``timed_calls`` calls of each constraint are timed; after that,
+calls and rejections are still counted, which is much cheaper.
+"""
+from __future__ import division
+import os
+import time
+
+
+class ConstraintEvaluator(object):
+    """Checks schedules against constraints, cheapest and most selective
+    first
+
+    :type  constraints: iterable
+    :param constraints: Callables that take a Schedule and return True
+        if it meets the constraint
+    :type  reorder_every: int
+    :param reorder_every: Number of checks between reorderings
+    :type  timed_calls: int
+    :param timed_calls: Number of calls of each constraint that are timed
+        to measure its cost
+    """
+
+    def __init__(self, constraints=(), reorder_every=256, timed_calls=1024):
+        self.reorder_every = reorder_every
+        self.timed_calls = timed_calls
+        self._constraints = []
+        self._order = []
+        self._stats = []
+        self._checks = 0
+        for constraint in constraints:
+            self.add(constraint)
+
+    def add(self, constraint):
+        """Add ``constraint`` (checked last until it has been measured)"""
+        self._order.append(len(self._constraints))
+        self._constraints.append(constraint)
+        # [calls, rejections, timed calls, total seconds of timed calls]
+        self._stats.append([0, 0, 0, 0.0])
+
+    def __call__(self, schedule):
+        """Whether ``schedule`` meets all constraints
+
+        :rtype: bool
+        """
+        self._checks += 1
+        if self._checks % self.reorder_every == 0:
+            self._reorder()
+        for i in self._order:
+            stats = self._stats[i]
+            stats[0] += 1
+            if stats[2] < self.timed_calls:
+                start = time.time()
+                ok = self._constraints[i](schedule)
+                stats[3] += time.time() - start
+                stats[2] += 1
+            else:
+                ok = self._constraints[i](schedule)
+            if not ok:
+                stats[1] += 1
+                return False
+        return True
+
+    def __iter__(self):
+        """Constraints in the order they were added"""
+        return iter(self._constraints)
+
+    def __len__(self):
+        return len(self._constraints)
+
+    def stats(self):
+        """Measured numbers for every constraint (in the order they were
+        added)
+
+        :rtype: [dict, ...]
+        :returns: Dicts with the ``constraint``, its number of ``calls``
+            and ``rejections``, its ``rejection_rate``, its average cost
+            in seconds over the calls that were timed (``avg_cost``) and
+            its ``position`` in the current order
+        """
+        order = {i: pos for pos, i in enumerate(self._order)}
+        return [dict(
+            constraint=constraint,
+            calls=calls,
+            rejections=rejections,
+            rejection_rate=rejections / calls if calls else None,
+            avg_cost=seconds / timed if timed else None,
+            position=order[i]
+        ) for i, (constraint, (calls, rejections, timed, seconds))
+            in enumerate(zip(self._constraints, self._stats))]
+
+    def report(self):
+        """Human-readable table of ``stats``
+
+        :rtype: str
+        """
+        lines = ["{:<4} {:<32} {:>9} {:>9} {:>11}".format(
+            "pos", "constraint", "calls", "rejected", "avg cost")]
+        for s in sorted(self.stats(), key=lambda s: s["position"]):
+            lines.append("{:<4} {:<32} {:>9} {:>8.1f}% {:>9.2f}us".format(
+                s["position"], _name(s["constraint"])[:32], s["calls"],
+                100 * (s["rejection_rate"] or 0), 1e6 * (s["avg_cost"] or 0)
+            ))
+        return "\n".join(lines)
+
+    def reset_stats(self):
+        self._stats = [[0, 0, 0, 0.0] for _ in self._constraints]
+        self._checks = 0
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _reorder(self):
+        self._order.sort(key=self._expected_cost)
+
+    def _expected_cost(self, i):
+        """Expected cost per rejection of constraint ``i``; constraints
+        that haven't been measured (or never reject) go last, in the order
+        they were added
+        """
+        calls, rejections, timed, seconds = self._stats[i]
+        if not timed or not rejections:
+            return (1, i)
+        return (0, (seconds / timed) / (rejections / calls))
+
+
+def _name(constraint):
+    """e.g., "no_fridays" or "<lambda> example.py:90" """
+    name = getattr(constraint, "__name__", None)
+    code = getattr(constraint, "__code__", None)
+    if name is None:
+        return repr(constraint)
+    if name == "<lambda>" and code is not None:
+        return "<lambda> {}:{}".format(os.path.basename(code.co_filename),
+                                       code.co_firstlineno)
+    return name
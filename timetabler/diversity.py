@@ -0,0 +1,108 @@
+"""Selection of schedules that are meaningfully different from each other
+
+The best-ranked schedules often only differ by one interchangeable
+section (e.g., a lab at the same time in a different room). Every
+schedule is reduced to a cheap feature (a bitmask), and the distance
+between two schedules is the number of bits their features differ in:
+
+* ``"sections"``: one bit per section, so the distance is the number of
+  sections that are in one schedule but not the other
+* ``"times"``: one bit per time slot (term, days, start and end time),
+  so the distance is the number of time slots with classes in one
+  schedule but not the other; schedules that only differ in sections at
+  the same times are at distance 0
+
+Selecting ``k`` schedules takes one pass over the schedules per selected
+schedule, i.e., O(n * k).
+"""
+from timetabler.results import ScheduleSet
+
+
+def diverse(schedules, k, min_distance=None, features="sections"):
+    """Pick ``k`` schedules that are different from each other
+
+    Without ``min_distance``, the best schedule (the first one) is picked,
+    and then the schedule furthest from all schedules picked so far is
+    picked until there are ``k`` (ties go to the better schedule). With
+    ``min_distance``, schedules are instead gone through in order and
+    every schedule that is at least ``min_distance`` away from all
+    schedules picked so far is picked.
+
+    :type  schedules: list|ScheduleSet
+    :param schedules: Schedules, best first (i.e., already ranked)
+    :type  k: int
+    :type  min_distance: int|None
+    :type  features: str
+    :param features: "sections" or "times" (see module docstring)
+    :returns: The picked schedules (in their order in ``schedules``)
+    """
+    picked = set(diverse_positions(schedules, k, min_distance, features))
+    if isinstance(schedules, ScheduleSet):
+        positions = iter(xrange(len(schedules)))
+        return schedules.filter(lambda s: next(positions) in picked)
+    return [s for i, s in enumerate(schedules) if i in picked]
+
+
+def diverse_positions(schedules, k, min_distance=None, features="sections"):
+    """Like ``diverse`` but returns positions in ``schedules``
+
+    :rtype: [int, ...]
+    """
+    feature = _FEATURES[features]()
+    masks = [feature(s) for s in schedules]
+    if not masks or k < 1:
+        return []
+    if min_distance is not None:
+        picked = []
+        for i, mask in enumerate(masks):
+            if all(_distance(mask, masks[j]) >= min_distance for j in picked):
+                picked.append(i)
+                if len(picked) == k:
+                    break
+        return picked
+    picked = [0]
+    # Distance from every schedule to its nearest picked schedule
+    nearest = [_distance(m, masks[0]) for m in masks]
+    while len(picked) < k:
+        # max() returns the first (i.e., best) of equally distant schedules
+        i = max(xrange(len(masks)), key=nearest.__getitem__)
+        if nearest[i] == 0:
+            # Everything left is the same as something already picked
+            break
+        picked.append(i)
+        for j, m in enumerate(masks):
+            nearest[j] = min(nearest[j], _distance(m, masks[i]))
+    return sorted(picked)
+
+
+def _interned_features(attrs):
+    """Feature with one bit for every distinct value of ``attrs`` of
+    activities
+    """
+    bits = {}
+
+    def feature(schedule):
+        mask = 0
+        for a in schedule.activities:
+            mask |= 1 << bits.setdefault(attrs(a), len(bits))
+        return mask
+    return feature
+
+
+def _section_features():
+    return _interned_features(lambda a: (a.section, a.term))
+
+
+def _time_features():
+    return _interned_features(lambda a: (a.term, frozenset(a.days),
+                                         a.start_time, a.end_time))
+
+
+_FEATURES = {
+    "sections": _section_features,
+    "times": _time_features,
+}
+
+
+def _distance(a, b):
+    return bin(a ^ b).count("1")
@@ -0,0 +1,203 @@
+"""Sorting more schedules than fit in memory
+
+Schedules are buffered compactly (as their sort key and a row of indices
+into a table of activities, as in ``results.ScheduleSet``). Whenever the
+buffer grows past a memory ceiling, it is sorted and written to a
+temporary file as a run, and emptied. Iterating does a k-way merge of the
+runs and whatever is still buffered, so only a chunk of each run is in
+memory at a time, and ``Schedule`` objects are only created for the
+schedules that are actually looked at.
+
+Runs are written to a temporary directory of their own, which is deleted
+by ``close``, when the ``ExternalSort`` is garbage collected, or at the
+latest when the interpreter exits.
+"""
+import os
+import sys
+import heapq
+import atexit
+import shutil
+import logging
+import tempfile
+import weakref
+import cPickle as pickle
+from array import array
+from itertools import islice
+
+from timetabler.schedule import Schedule
+from timetabler.util import chunks
+
+
+class ExternalSort(object):
+    """Schedules sorted by ``key``, with a bound on memory use
+
+    Schedules with equal keys stay in the order they were added (as with
+    ``sorted``).
+
+    :type  key: callable
+    :param key: Key function that takes a Schedule; keys are written to
+        disk, so they must be picklable (e.g., tuples of numbers, as from
+        ``Ranker.lexicographic_key``)
+    :type  max_memory: int
+    :param max_memory: Approximate number of bytes that buffered schedules
+        may take up before they are written to disk
+    :type  directory: str|None
+    :param directory: Where the temporary directory for runs is created
+        (the system's temporary directory by default)
+    """
+
+    typecode = 'I'
+    # Records per pickle in a run; a run is read back this many at a time
+    chunk_size = 1024
+
+    def __init__(self, key, max_memory=64 * 2 ** 20, directory=None):
+        self.key = key
+        self.max_memory = max_memory
+        self.directory = directory
+        self._activities = []  # Activity table
+        self._activity_index = {}  # (section, term) -> index in table
+        # (key, sequence number, row) records that haven't been spilled
+        self._buffer = []
+        self._buffer_size = 0
+        self._runs = []  # Paths of runs
+        self._run_directory = None  # Created on the first spill
+        self._count = 0
+        _open_sorts.add(self)
+
+    def add(self, schedule):
+        """Add ``schedule``, spilling buffered schedules to disk if the
+        memory ceiling has been reached
+
+        :type  schedule: Schedule
+        """
+        row = array(self.typecode, sorted(
+            {self._intern(a) for a in schedule.activities})).tostring()
+        record = (self.key(schedule), self._count, row)
+        self._buffer.append(record)
+        self._buffer_size += _size(record)
+        self._count += 1
+        if self._buffer_size >= self.max_memory:
+            self._spill()
+
+    def extend(self, schedules):
+        """Add all ``schedules``
+
+        :rtype: int
+        :returns: Number of schedules added
+        """
+        count = self._count
+        for schedule in schedules:
+            self.add(schedule)
+        return self._count - count
+
+    @property
+    def runs(self):
+        """Number of runs that have been written to disk"""
+        return len(self._runs)
+
+    def page(self, number, size):
+        """Schedules on page ``number`` (counting from 0), with ``size``
+        schedules per page
+
+        :rtype: [Schedule, ...]
+        """
+        start = number * size
+        return list(islice(self, start, start + size))
+
+    def close(self):
+        """Delete the runs written to disk (along with the schedules in
+        them)
+        """
+        if self._run_directory is not None:
+            shutil.rmtree(self._run_directory, ignore_errors=True)
+            self._run_directory = None
+        self._runs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def __iter__(self):
+        """Schedules in order of ``key``"""
+        self._buffer.sort()
+        streams = [self._read_run(path) for path in self._runs]
+        streams.append(iter(self._buffer))
+        for _, _, row in heapq.merge(*streams):
+            yield self._schedule(row)
+
+    def __len__(self):
+        return self._count
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _intern(self, activity):
+        """Get index of ``activity`` in the activity table, adding it if
+        necessary
+        """
+        act_key = (activity.section, activity.term)
+        try:
+            return self._activity_index[act_key]
+        except KeyError:
+            self._activities.append(activity)
+            index = self._activity_index[act_key] = len(self._activities) - 1
+            return index
+
+    def _schedule(self, row):
+        return Schedule((tuple(self._activities[i]
+                               for i in array(self.typecode, row)),))
+
+    def _spill(self):
+        """Write the buffer to disk as a sorted run"""
+        self._buffer.sort()
+        if self._run_directory is None:
+            self._run_directory = tempfile.mkdtemp(prefix="timetabler-",
+                                                   dir=self.directory)
+        fd, path = tempfile.mkstemp(suffix=".run", dir=self._run_directory)
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks(self._buffer, self.chunk_size):
+                pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+        logging.info("Spilled {} schedules to {}.".format(
+            len(self._buffer), path))
+        self._runs.append(path)
+        self._buffer = []
+        self._buffer_size = 0
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                for record in chunk:
+                    yield record
+
+
+# Sorts whose runs may still be on disk
+_open_sorts = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for ranked in list(_open_sorts):
+        ranked.close()
+
+
+def _size(record):
+    """Approximate number of bytes taken up by ``record`` (and its slot in
+    the buffer)
+    """
+    key, seq, row = record
+    size = (sys.getsizeof(record) + sys.getsizeof(key) + sys.getsizeof(seq) +
+            sys.getsizeof(row) + 8)
+    if isinstance(key, tuple):
+        size += sum(sys.getsizeof(k) for k in key)
+    return size
@@ -0,0 +1,161 @@
+"""Quick infeasibility checks for sets of courses
+
+Before searching, section combinations are turned into bitmasks of the
+minutes (per term and day) they take up, so that two combinations
+conflict exactly when their masks intersect. This is the same as
+``Scheduler._check_conflict``, which compares times as strings; that
+works because Activity zero-pads them (e.g., "09:00"), and masks are
+built from the hours and minutes, so they don't depend on the padding.
+Activities that don't take up any time (end at or before they start, or
+have no days or times, as for TBA or online sections) never conflict
+here, so those conflicts are left to the search.
+
+Masks make it cheap to check every pair of courses for a compatible pair
+of combinations and to run arc consistency (AC-3) over all courses: a
+combination is dropped if some other course has no combination it fits
+with, and if any course runs out of combinations, the courses can't be
+taken together.
+
+When that happens, courses are dropped one at a time for as long as the
+rest are still found to be infeasible, which leaves a small set of
+courses (a core) that explains the problem.
+
+Arc consistency can miss some infeasible problems (these are then found
+by the search as usual), but every problem it finds is a real one.
+"""
+from itertools import combinations
+
+
+class Infeasibility(object):
+    """Explanation of why a set of courses can't be taken together
+
+    :type  courses: list
+    :param courses: Names of the courses in the core
+    :type  reasons: list
+    :param reasons: Human-readable reasons (one per line of the report)
+    """
+
+    def __init__(self, courses, reasons):
+        self.courses = courses
+        self.reasons = reasons
+
+    def __str__(self):
+        return "No valid schedules for {}:\n{}".format(
+            ", ".join(self.courses),
+            "\n".join("* {}".format(r) for r in self.reasons)
+        )
+
+    def __repr__(self):
+        return "Infeasibility<{}>".format(", ".join(self.courses))
+
+
+def find_core(options):
+    """Find a small set of courses that can't be taken together
+
+    :type  options: list
+    :param options: List (one item per course) of lists of section
+        combinations (tuples of Activity)
+    :rtype: list|None
+    :returns: Indices of courses in the core, or None if no infeasibility
+        was found
+    """
+    masks = [list({m for m in map(option_mask, opts) if m is not None})
+             for opts in options]
+    num_courses = len(masks)
+    for i in xrange(num_courses):
+        if not masks[i]:
+            return [i]
+    for i, j in combinations(xrange(num_courses), 2):
+        if not any(_compatible(a, masks[j]) for a in masks[i]):
+            return [i, j]
+    core = range(num_courses)
+    if arc_consistent([masks[i] for i in core]):
+        return None
+    for i in list(core):
+        rest = [k for k in core if k != i]
+        if not arc_consistent([masks[k] for k in rest]):
+            core = rest
+    return core
+
+
+def arc_consistent(domains):
+    """Run AC-3 over ``domains``
+
+    :type  domains: list
+    :param domains: List (one item per course) of lists of masks
+    :rtype: bool
+    :returns: False if any course runs out of options
+    """
+    domains = [list(d) for d in domains]
+    num_courses = len(domains)
+    queue = [(i, j) for i in xrange(num_courses)
+             for j in xrange(num_courses) if i != j]
+    queued = set(queue)
+    while queue:
+        i, j = queue.pop()
+        queued.discard((i, j))
+        revised = [a for a in domains[i] if _compatible(a, domains[j])]
+        if len(revised) == len(domains[i]):
+            continue
+        if not revised:
+            return False
+        domains[i] = revised
+        for k in xrange(num_courses):
+            if k != i and k != j and (k, i) not in queued:
+                queue.append((k, i))
+                queued.add((k, i))
+    return True
+
+
+def option_mask(option):
+    """Bitmask of minutes (per term and day) taken up by ``option``
+
+    :type  option: tuple
+    :param option: Tuple of Activity
+    :rtype: int|None
+    :returns: The mask, or None if activities in ``option`` conflict with
+        each other
+    """
+    mask = 0
+    for act in option:
+        m = _activity_mask(act)
+        if mask & m:
+            return None
+        mask |= m
+    return mask
+
+
+_slots = {}
+_activity_masks = {}
+
+
+def _activity_mask(act):
+    key = (act.term, frozenset(act.days), act.start_time, act.end_time)
+    try:
+        return _activity_masks[key]
+    except KeyError:
+        start, end = _minutes(act.start_time), _minutes(act.end_time)
+        mask = 0
+        if start is not None and end is not None and end > start:
+            for day in act.days:
+                # Each (term, day) gets its own 24 hours worth of bits
+                slot = _slots.setdefault((act.term, day), len(_slots))
+                mask |= ((1 << (end - start)) - 1) << (slot * 24 * 60 + start)
+        _activity_masks[key] = mask
+        return mask
+
+
+def _minutes(s):
+    """e.g., 570 for "09:30" (``util.strtime2num`` only handles half
+    hours), or None if ``s`` isn't a time (e.g., "00000" for a section
+    with no meeting time)
+    """
+    try:
+        hours, minutes = s.split(":")
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def _compatible(mask, masks):
+    return any(not mask & m for m in masks)
@@ -0,0 +1,155 @@
+"""Inverted index over generated schedules for fast querying
+
+Every indexed property (a section, a course, a free day, a start/end
+time) maps to a bitset (a Python ``int``) of the positions of the
+schedules that have it, so queries are answered by intersecting bitsets
+rather than scanning all schedules.
+"""
+from collections import defaultdict
+from binascii import hexlify
+
+from timetabler.util import DAY_LIST
+
+
+class ScheduleIndex(object):
+    """Index over ``schedules``
+
+    :type  schedules: list|ScheduleSet
+    :param schedules: Schedules to index; positions returned by queries
+        are positions in this sequence
+    """
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+        self.size = len(schedules)
+        positions = defaultdict(list)
+        terms_by_position = []
+        for i, sched in enumerate(schedules):
+            acts = sched.activities
+            terms = {a.term for a in acts}
+            terms_by_position.append(terms)
+            for a in acts:
+                positions[("section", a.section)].append(i)
+            for course in {_course(a) for a in acts}:
+                positions[("course", course)].append(i)
+            # Per term (and None for the whole session)
+            for term in list(terms) + [None]:
+                term_acts = [a for a in acts if term is None or a.term == term]
+                if not term_acts:
+                    continue
+                busy = set().union(*(a.days for a in term_acts))
+                for day in DAY_LIST:
+                    if day not in busy:
+                        positions[("free", term, day)].append(i)
+                positions[("start", term,
+                           min(a.start_time for a in term_acts))].append(i)
+                positions[("end", term,
+                           max(a.end_time for a in term_acts))].append(i)
+        # Schedules without classes in a term are free all week in that
+        #  term, and trivially satisfy any start/end time for it
+        all_terms = set().union(*terms_by_position)
+        for i, terms in enumerate(terms_by_position):
+            for term in all_terms - terms:
+                for day in DAY_LIST:
+                    positions[("free", term, day)].append(i)
+                positions[("start", term, None)].append(i)
+                positions[("end", term, None)].append(i)
+        self._bitsets = {key: _bitset(pos, self.size)
+                         for key, pos in positions.iteritems()}
+        self._all = (1 << self.size) - 1
+
+    def query(self, sections=(), courses=(), free_days=(), term=None,
+              start_after=None, end_before=None, exclude_sections=(),
+              exclude_courses=()):
+        """Find schedules matching all of the given criteria
+
+        e.g., schedules containing CPSC 304 T2A with Friday free in term 2:
+        ``index.query(sections=["CPSC 304 T2A"], free_days=["Fri"], term=2)``
+
+        :type  sections: list
+        :param sections: Sections that must all be in the schedule
+        :type  courses: list
+        :param courses: Courses (e.g., "CPSC 304") that must all be in the
+            schedule
+        :type  free_days: list
+        :param free_days: Days (e.g., "Fri") without any classes
+        :type  term: int|None
+        :param term: Term that ``free_days``, ``start_after`` and
+            ``end_before`` apply to; if this is None, they apply to the
+            whole session
+        :type  start_after: str|None
+        :param start_after: No classes start before this time, e.g. "10:00"
+        :type  end_before: str|None
+        :param end_before: No classes end after this time, e.g. "17:00"
+        :type  exclude_sections: list
+        :param exclude_sections: Sections that must not be in the schedule
+        :type  exclude_courses: list
+        :param exclude_courses: Courses that must not be in the schedule
+        :rtype: int
+        :returns: Bitset of positions of matching schedules
+        """
+        bits = self._all
+        for section in sections:
+            bits &= self._bitsets.get(("section", section), 0)
+        for course in courses:
+            bits &= self._bitsets.get(("course", course), 0)
+        for section in exclude_sections:
+            bits &= ~self._bitsets.get(("section", section), 0)
+        for course in exclude_courses:
+            bits &= ~self._bitsets.get(("course", course), 0)
+        for day in free_days:
+            bits &= self._bitsets.get(("free", term, day), 0)
+        if start_after is not None:
+            bits &= self._time_range("start", term,
+                                     lambda t: t >= start_after.zfill(5))
+        if end_before is not None:
+            bits &= self._time_range("end", term,
+                                     lambda t: t <= end_before.zfill(5))
+        return bits
+
+    def positions(self, bits):
+        """Positions of schedules in bitset ``bits`` (in order)
+
+        :rtype: [int, ...]
+        """
+        return [i for i, b in enumerate(reversed(bin(bits)[2:])) if b == '1']
+
+    def find(self, **kwargs):
+        """Like ``query`` but returns the matching schedules
+
+        :rtype: list
+        """
+        return [self.schedules[i] for i in self.positions(self.query(**kwargs))]
+
+    def count(self, bits):
+        """Number of schedules in bitset ``bits``"""
+        return bin(bits).count('1')
+
+    def _time_range(self, kind, term, predicate):
+        """Union of bitsets of ``kind`` ("start"/"end") for times that
+        satisfy ``predicate``
+        """
+        bits = 0
+        for key, bitset in self._bitsets.iteritems():
+            if key[0] == kind and key[1] == term and \
+                    (key[2] is None or predicate(key[2])):
+                bits |= bitset
+        return bits
+
+
+def _course(activity):
+    """e.g., "CPSC 304" for an activity in section "CPSC 304 T2A" """
+    return " ".join(activity.section.split()[:2])
+
+
+def _bitset(positions, size):
+    """Build bitset with ``positions`` set in one go (setting bits one by
+    one is quadratic for large Python ints)
+    """
+    if not positions:
+        return 0
+    bitmap = bytearray((size + 7) // 8)
+    for i in positions:
+        bitmap[i // 8] |= 1 << (i % 8)
+    bitmap.reverse()
+    return int(hexlify(bitmap), 16)
@@ -0,0 +1,86 @@
+"""Branch-and-bound search for the best schedules under an objective"""
+import heapq
+from itertools import count
+
+from timetabler.search import backtrack
+
+
+class Objective(object):
+    """Weighted sum of schedule metrics, to be minimized
+
+    Metrics take a list of activities and must never decrease when
+    activities are added (e.g., ``sort.time_at_school`` and
+    ``sort.days_at_school``); with non-negative weights, the value of the
+    objective for a partial schedule is then a lower bound for every
+    schedule that can be completed from it.
+
+    e.g., for ``terms``:
+    [(partial(sort.time_at_school, commute_hrs=1.75), 1),
+     (sort.days_at_school, 5)]
+
+    :type  terms: list
+    :param terms: List of (metric, weight)
+    """
+
+    def __init__(self, terms):
+        assert all(weight >= 0 for _, weight in terms), \
+            "Weights must be non-negative for bounds to be admissible"
+        self.terms = terms
+
+    def __call__(self, activities):
+        return sum(weight * metric(activities) for metric, weight in self.terms)
+
+    def bound(self, activities):
+        """Lower bound on the objective for any schedule containing
+        ``activities``
+        """
+        return self(activities)
+
+
+def best_schedules(combs_by_course, check_conflicts, objective, k,
+                   accept=None, heuristics=True, stats=None):
+    """Find the ``k`` schedules with the lowest value of ``objective``
+
+    The search is pruned whenever the bound for a partial schedule is no
+    better than the ``k``th best schedule found so far, so the scores are
+    the same as from scoring every schedule, but only a fraction of them
+    are ever visited. Branches that could only tie the ``k``th best are
+    pruned too, so among schedules with the same score, which ones are
+    returned depends on the order of the search (not on the order
+    schedules would be generated in).
+
+    :type  combs_by_course: list
+    :param combs_by_course: List (one item per course) of lists of
+        section combinations (tuples of Activity) for that course
+    :type  objective: Objective
+    :type  accept: callable|None
+    :param accept: If given, only schedules (tuples with one combination
+        per course) for which this returns True are considered
+    :returns: List of (score, schedule), best first
+    """
+    if k < 1:
+        return []
+    # Max-heap (by negated score) of the best k schedules so far; ties are
+    #  broken by order of discovery
+    best = []
+    tiebreak = count()
+
+    # Trying the most promising combinations of each course first finds
+    #  good schedules early, which makes pruning more effective
+    combs_by_course = [sorted(combs, key=objective.bound)
+                       for combs in combs_by_course]
+
+    def prune(activities):
+        return len(best) == k and objective.bound(activities) >= -best[0][0]
+
+    for sched in backtrack(combs_by_course, check_conflicts,
+                           heuristics=heuristics, stats=stats, prune=prune):
+        if accept is not None and not accept(sched):
+            continue
+        score = objective([a for comb in sched for a in comb])
+        item = (-score, -next(tiebreak), sched)
+        if len(best) < k:
+            heapq.heappush(best, item)
+        elif score < -best[0][0]:
+            heapq.heapreplace(best, item)
+    return [(-score, sched) for score, _, sched in sorted(best, reverse=True)]
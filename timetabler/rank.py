@@ -0,0 +1,243 @@
+"""Ranking of schedules by several metrics at once
+
+Unlike chaining the sorts in ``timetabler.sort`` (each of which recomputes
+its key from scratch), a ``Ranker`` computes the full feature vector of a
+schedule once per ranking, from a single pass over its activities.
+Schedules can be ordered lexicographically, by a weighted sum, or filtered
+down to the Pareto frontier. Vectors aren't kept between rankings, so a
+Ranker's memory use doesn't grow with the schedules it has seen.
+"""
+from __future__ import division
+from collections import OrderedDict, defaultdict
+
+from timetabler.util import DAY_LIST, strtime2num, stddev
+from timetabler.results import ScheduleSet, sorted_schedules
+
+
+class Ranker(object):
+    """Computes metrics for schedules and ranks by them
+
+    Built-in metrics (mirroring ``timetabler.sort``):
+
+    * ``time_at_school``: Total weekly hours at school including commute
+    * ``days_at_school``: Number of days with classes
+    * ``latest_daily_morning``: Average daily start time (maximized)
+    * ``even_time_per_day``: Std. deviation of daily time at school
+    * ``even_courses_per_term``: Std. deviation of courses per term
+
+    :type commute_hrs: int or float
+    :param commute_hrs: Time in hours for ONE-WAY commute
+    """
+
+    def __init__(self, commute_hrs=0):
+        self.commute_hrs = commute_hrs
+        # name -> (func(schedule, spans), maximize)
+        self._metrics = OrderedDict()
+        self._register("time_at_school", self._time_at_school)
+        self._register("days_at_school", lambda s, spans: len(spans))
+        self._register("latest_daily_morning", self._latest_daily_morning,
+                       maximize=True)
+        self._register("even_time_per_day", self._even_time_per_day)
+        self._register("even_courses_per_term", self._even_courses_per_term)
+
+    @property
+    def metric_names(self):
+        return list(self._metrics)
+
+    def register(self, name, func, maximize=False):
+        """Register custom metric ``name``
+
+        :type  func: callable
+        :param func: Takes a Schedule and returns a number
+        :type  maximize: bool
+        :param maximize: If this is set, higher values are better
+        """
+        self._register(name, lambda s, spans: func(s), maximize)
+
+    def features(self, schedule):
+        """Values of all metrics for ``schedule``
+
+        :rtype: dict
+        """
+        return {name: -f if maximize else f for (name, (_, maximize)), f
+                in zip(self._metrics.iteritems(), self._vector(schedule))}
+
+    def lexicographic(self, schedules, priority):
+        """Sort ``schedules`` by ``priority``, most important metric first
+
+        This is a single sort equivalent to chaining stable sorts from the
+        least to the most important metric.
+
+        :type  priority: list
+        :param priority: Metric names, most important first
+        """
+        return sorted_schedules(schedules, self.lexicographic_key(priority))
+
+    def weighted(self, schedules, weights):
+        """Sort ``schedules`` by a weighted sum of metrics (maximized
+        metrics count negatively, so lower is always better)
+
+        :type  weights: dict
+        :param weights: {metric name: weight}
+        """
+        return sorted_schedules(schedules, self.weighted_key(weights))
+
+    def pareto(self, schedules, metrics=None):
+        """Filter ``schedules`` down to the ones that are not dominated in
+        ``metrics`` by any other schedule
+
+        A schedule is dominated if another is at least as good in every
+        metric and better in at least one.
+
+        :type  metrics: list|None
+        :param metrics: Metric names; all metrics if this is None
+        :returns: Non-dominated schedules, sorted lexicographically by
+            ``metrics``
+        """
+        metrics = self.metric_names if metrics is None else metrics
+        # Vectors are worked out once per schedule for both the sort and
+        #  the pass below, and dropped when this returns
+        vectors = {}
+        key = self.lexicographic_key(metrics)
+
+        def vector(s):
+            try:
+                return vectors[s.key]
+            except KeyError:
+                v = vectors[s.key] = key(s)
+                return v
+
+        ranked = sorted_schedules(schedules, vector)
+        # After the sort, a schedule can only be dominated by one that
+        #  came before it, so one pass against the frontier so far suffices
+        frontier = []
+        keep = []
+        for s in ranked:
+            v = vector(s)
+            if not any(_dominates(f, v) for f in frontier):
+                if not frontier or frontier[-1] != v:
+                    frontier.append(v)
+                keep.append(True)
+            else:
+                keep.append(False)
+        if isinstance(ranked, ScheduleSet):
+            flags = iter(keep)
+            return ranked.filter(lambda s: next(flags))
+        return [s for s, k in zip(ranked, keep) if k]
+
+    def lexicographic_key(self, priority):
+        """Key function that orders schedules as ``lexicographic`` does
+        (e.g., for ``timetabler.external.ExternalSort``)
+
+        :type  priority: list
+        :param priority: Metric names, most important first
+        :rtype: callable
+        """
+        indices = [self._index(name) for name in priority]
+        return lambda s: _pick(self._vector(s), indices)
+
+    def weighted_key(self, weights):
+        """Key function that orders schedules as ``weighted`` does (e.g.,
+        for ``timetabler.external.ExternalSort``)
+
+        :type  weights: dict
+        :param weights: {metric name: weight}
+        :rtype: callable
+        """
+        weights = [(self._index(name), weight)
+                   for name, weight in weights.iteritems()]
+        return lambda s: _weigh(self._vector(s), weights)
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _register(self, name, func, maximize=False):
+        self._metrics[name] = (func, maximize)
+
+    def _index(self, name):
+        try:
+            return self._metrics.keys().index(name)
+        except ValueError:
+            raise KeyError("No such metric {}".format(name))
+
+    def _vector(self, schedule):
+        """Feature vector (in order of ``self._metrics``) of ``schedule``,
+        negated for maximized metrics so that lower is always better
+        """
+        spans = self._day_spans(schedule.activities)
+        return tuple(
+            -func(schedule, spans) if maximize else func(schedule, spans)
+            for func, maximize in self._metrics.itervalues()
+        )
+
+    @staticmethod
+    def _day_spans(activities):
+        """{day: (earliest start, latest end)} for days with classes"""
+        spans = {}
+        for a in activities:
+            days = [day for day in a.days if day in DAY_LIST]
+            if not days:
+                # e.g., online sections, which have no times either
+                continue
+            start, end = _strtime2num(a.start_time), _strtime2num(a.end_time)
+            for day in days:
+                if day in spans:
+                    s, e = spans[day]
+                    spans[day] = (min(s, start), max(e, end))
+                else:
+                    spans[day] = (start, end)
+        return spans
+
+    @staticmethod
+    def _ordered_spans(spans):
+        """Spans in order of ``DAY_LIST`` (so sums of floats come out the
+        same as in ``timetabler.sort``)
+        """
+        return [spans[day] for day in DAY_LIST if day in spans]
+
+    def _daily_hours(self, spans):
+        return [(end - start) + (2 * self.commute_hrs)
+                for start, end in self._ordered_spans(spans)]
+
+    def _time_at_school(self, schedule, spans):
+        return sum(self._daily_hours(spans))
+
+    def _even_time_per_day(self, schedule, spans):
+        return stddev(self._daily_hours(spans))
+
+    def _latest_daily_morning(self, schedule, spans):
+        return sum(start for start, _ in self._ordered_spans(spans)) / len(spans)
+
+    @staticmethod
+    def _even_courses_per_term(schedule, spans):
+        d = defaultdict(set)
+        for act in schedule.activities:
+            d[act.term].add(tuple(act.section.split()[:2]))
+        return stddev(map(len, d.values()))
+
+
+_times = {}
+
+
+def _strtime2num(s):
+    """Memoized ``strtime2num`` (there are only so many times of day)"""
+    try:
+        return _times[s]
+    except KeyError:
+        t = _times[s] = strtime2num(s)
+        return t
+
+
+def _pick(vector, indices):
+    return tuple(vector[i] for i in indices)
+
+
+def _weigh(vector, weights):
+    return sum(vector[i] * w for i, w in weights)
+
+
+def _dominates(a, b):
+    """Whether vector ``a`` dominates vector ``b`` (lower is better)"""
+    return a != b and all(x <= y for x, y in zip(a, b))
+
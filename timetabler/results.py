@@ -0,0 +1,459 @@
+"""Containers for collecting generated schedules"""
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+from array import array
+
+from timetabler.schedule import Schedule
+from timetabler.util import replace_file
+from timetabler.ssc import course as course_module
+
+
+class ScheduleSet(object):
+    """Compact, array-backed collection of schedules
+
+    Rather than holding a ``Schedule`` (and its list of activities) per
+    result, activities are stored once in a table shared by all schedules
+    and each schedule is a fixed-width row of indices into that table
+    in a single ``array``. ``Schedule`` objects are only created when a
+    row is accessed.
+
+    Activities are identified by (section, term), so equal activities from
+    different Scheduler runs share an entry in the table, and rows are
+    sorted so that each row is a canonical key for its timetable.
+
+    ``sorted`` and ``filter`` return views that share the activity table
+    and index matrix with the set they were created from.
+
+    :type  schedules: iterable
+    :param schedules: Schedules to start with
+    :type  unique: bool
+    :param unique: If this is set, duplicate schedules are not added
+        (e.g., when combining results of overlapping runs); they are found
+        with a hash table of row numbers (an ``array``) rather than a set
+        of keys, so this costs a few bytes per schedule
+    :type  seen: iterable
+    :param seen: Keys (``Schedule.key``) of schedules that are never
+        added, e.g., ones already looked at in an earlier session
+    """
+
+    typecode = 'I'
+    _magic = b"UBCTTSS1"
+
+    def __init__(self, schedules=(), unique=False, seen=()):
+        self.unique = unique
+        self._seen = frozenset(seen)
+        self._activities = []  # Activity table
+        self._activity_index = {}  # (section, term) -> index in table
+        self._width = 0
+        # Row-major matrix of (index + 1) into the activity table; rows
+        #  narrower than ``self._width`` are padded with 0
+        self._matrix = array(self.typecode)
+        self._num_rows = 0
+        # Open-addressing hash table of rows (-1 for empty slots), for
+        #  finding duplicates
+        self._slots = array('i', [-1] * 8) if unique else array('i')
+        self._scores = {}
+        self._read_only = False
+        self._data = None  # mmap of the file a set was loaded from
+        self.fingerprint = None
+        # Rows of ``self._matrix`` (in order) that are part of this set;
+        #  None means all of them, in insertion order
+        self._rows = None
+        self.extend(schedules)
+
+    def add(self, schedule):
+        """Add ``schedule`` to the set
+
+        :type  schedule: Schedule
+        :rtype: bool
+        :returns: Whether ``schedule`` was added (it is not if its key
+            was given as ``seen``, or if ``self.unique`` is set and it is
+            a duplicate)
+        """
+        assert self._rows is None, "Cannot add schedules to a view"
+        assert not self._read_only, "Cannot add schedules to a loaded set"
+        if self._seen and schedule.key in self._seen:
+            return False
+        row = sorted({self._intern(a) for a in schedule.activities})
+        if self.unique:
+            if 2 * (self._num_rows + 1) > len(self._slots):
+                self._rehash(2 * len(self._slots))
+            slot = self._find(row)
+            if self._slots[slot] >= 0:
+                return False
+            self._slots[slot] = self._num_rows
+        if len(row) > self._width:
+            self._widen(len(row))
+        self._matrix.extend(row)
+        self._matrix.extend(0 for _ in xrange(self._width - len(row)))
+        self._num_rows += 1
+        return True
+
+    def extend(self, schedules):
+        """Add all ``schedules`` to the set
+
+        :rtype: int
+        :returns: Number of schedules added
+        """
+        return sum(1 for s in schedules if self.add(s))
+
+    def activities(self, i):
+        """Activities of the ``i``th schedule in the set
+
+        :rtype: [Activity, ...]
+        """
+        row = self._row(i)
+        start = row * self._width
+        return [self._activities[j - 1] for j in
+                self._matrix[start:start + self._width] if j]
+
+    def key(self, i):
+        """Canonical key of the ``i``th schedule in the set (same as
+        ``Schedule.key``)
+
+        :rtype: tuple
+        """
+        return tuple(sorted((a.section, a.term) for a in self.activities(i)))
+
+    def sorted(self, key, reverse=False):
+        """Sort schedules by ``key``
+
+        :type  key: callable
+        :param key: Key function that takes a Schedule
+        :rtype: ScheduleSet
+        :returns: Sorted view of this set
+        """
+        rows = self._row_list()
+        keys = [key(self[i]) for i in xrange(len(rows))]
+        order = sorted(xrange(len(rows)), key=keys.__getitem__,
+                       reverse=reverse)
+        return self._view(rows[i] for i in order)
+
+    def filter(self, func):
+        """Filter schedules with ``func``
+
+        :type  func: callable
+        :param func: Predicate that takes a Schedule
+        :rtype: ScheduleSet
+        :returns: Filtered view of this set
+        """
+        rows = self._row_list()
+        return self._view(row for i, row in enumerate(rows) if func(self[i]))
+
+    def score(self, name, i):
+        """Precomputed score ``name`` of the ``i``th schedule in the set
+
+        Scores are computed when saving a set (see ``save``), so this is
+        only available for sets that were loaded from a file.
+
+        :rtype: float
+        """
+        return self._scores[name][self._row(i)]
+
+    def sorted_by_score(self, name, reverse=False):
+        """Sort schedules by precomputed score ``name`` (this does not need
+        to create any Schedules)
+
+        :rtype: ScheduleSet
+        :returns: Sorted view of this set
+        """
+        rows = self._row_list()
+        scores = self._scores[name]
+        return self._view(sorted(rows, key=scores.__getitem__,
+                                 reverse=reverse))
+
+    def save(self, path, fingerprint, scores=None):
+        """Save set to ``path`` in a binary format that can be memory-mapped
+        by ``load``
+
+        The file consists of a header (with the activity table), followed
+        by the index matrix and one column of doubles per score.
+
+        :type  fingerprint: str
+        :param fingerprint: Fingerprint of the inputs the schedules were
+            generated from (i.e., ``Scheduler.fingerprint``)
+        :type  scores: dict|None
+        :param scores: {name: key function that takes a Schedule}; the
+            scores are computed for every schedule and stored alongside
+        """
+        scores = scores or {}
+        score_names = sorted(scores)
+        activities = [
+            [a.__class__.__name__, a.status, a.section, a.term,
+             " ".join(sorted(a.days)), a.start_time, a.end_time, a.comments,
+             a.is_multi_term, a.course.dept, a.course.number, a.course.title]
+            for a in self._activities
+        ]
+        header = json.dumps(dict(
+            fingerprint=fingerprint,
+            byteorder=sys.byteorder,
+            typecode=self.typecode,
+            itemsize=self._matrix.itemsize,
+            width=self._width,
+            num_rows=len(self),
+            scores=score_names,
+            activities=activities
+        )).encode('utf-8')
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(self._magic)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(b"\0" * self._padding(f.tell()))
+            for row in self._row_list():
+                start = row * self._width
+                self._matrix[start:start + self._width].tofile(f)
+            for name in score_names:
+                array('d', (scores[name](s) for s in self)).tofile(f)
+        # Move into place only when complete so that an interrupted save
+        #  never leaves a corrupt file behind
+        replace_file(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a set saved with ``save``
+
+        The index matrix and scores are memory-mapped rather than read,
+        so this is fast regardless of the size of the set, and only the
+        pages for schedules that are actually accessed are read from disk.
+
+        :rtype: ScheduleSet
+        :raises ValueError: If ``path`` is not a valid saved set (e.g.,
+            if it was only partly written)
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(cls._magic)) != cls._magic:
+                raise ValueError("{} is not a saved ScheduleSet".format(path))
+            size = os.fstat(f.fileno()).st_size
+            header_len = f.read(8)
+            if len(header_len) < 8:
+                raise ValueError("{} is truncated".format(path))
+            header_len, = struct.unpack("<Q", header_len)
+            header = f.read(header_len)
+            if len(header) < header_len:
+                raise ValueError("{} is truncated".format(path))
+            try:
+                header = json.loads(header.decode('utf-8'))
+                compatible = (
+                    header["byteorder"] == sys.byteorder and
+                    array(header["typecode"]).itemsize == header["itemsize"]
+                )
+                offset = len(cls._magic) + 8 + header_len
+                offset += cls._padding(offset)
+                end = offset + header["num_rows"] * (
+                    header["width"] * header["itemsize"] +
+                    len(header["scores"]) * array('d').itemsize)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("{} has a corrupt header".format(path))
+            if not compatible:
+                raise ValueError("{} was saved on an incompatible platform"
+                                 .format(path))
+            if size < end:
+                raise ValueError("{} is truncated".format(path))
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        ss = cls.__new__(cls)
+        ss.unique = False
+        ss._seen = frozenset()
+        ss.fingerprint = header["fingerprint"]
+        ss._activities = []
+        ss._activity_index = {}
+        courses = {}
+        for (cls_name, status, section, term, days, start_time, end_time,
+             comments, is_multi_term, dept, number,
+             title) in header["activities"]:
+            activity = getattr(course_module, cls_name)(
+                status=status, section=section, term=term, days=days,
+                start_time=start_time, end_time=end_time, comments=comments,
+                is_multi_term=is_multi_term
+            )
+            if (dept, number) not in courses:
+                courses[(dept, number)] = course_module.Course(dept, number,
+                                                               title)
+            activity.course = courses[(dept, number)]
+            ss._intern(activity)
+        ss._width = header["width"]
+        ss._num_rows = header["num_rows"]
+        ss._matrix = _MappedArray(data, offset, header["typecode"],
+                                  ss._num_rows * ss._width)
+        offset += ss._num_rows * ss._width * header["itemsize"]
+        ss._scores = {}
+        for name in header["scores"]:
+            ss._scores[name] = _MappedArray(data, offset, 'd', ss._num_rows)
+            offset += ss._num_rows * array('d').itemsize
+        ss._slots = array('i')
+        ss._rows = None
+        ss._read_only = True
+        ss._data = data
+        return ss
+
+    def close(self):
+        """Unmap the file this set was loaded from (so that it can be
+        replaced, e.g., on Windows); the set (and its views) can't be
+        used afterwards
+        """
+        if self._data is not None:
+            self._data.close()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._view(self._row_list()[i])
+        return Schedule((tuple(self.activities(i)),))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __len__(self):
+        if self._rows is None:
+            return self._num_rows
+        return len(self._rows)
+
+    def _intern(self, activity):
+        """Get index (+ 1) of ``activity`` in the activity table, adding
+        it if necessary
+        """
+        act_key = (activity.section, activity.term)
+        try:
+            return self._activity_index[act_key]
+        except KeyError:
+            self._activities.append(activity)
+            index = self._activity_index[act_key] = len(self._activities)
+            return index
+
+    def _widen(self, width):
+        """Re-layout the matrix so that rows are ``width`` wide"""
+        matrix = array(self.typecode)
+        padding = [0] * (width - self._width)
+        for row in xrange(self._num_rows):
+            start = row * self._width
+            matrix.extend(self._matrix[start:start + self._width])
+            matrix.extend(padding)
+        self._matrix = matrix
+        self._width = width
+
+    def _stored_row(self, row):
+        """Indices (+ 1) in row ``row`` of the matrix, without padding"""
+        start = row * self._width
+        return [j for j in self._matrix[start:start + self._width] if j]
+
+    def _find(self, row):
+        """Slot of ``row`` (a sorted list of indices) in the hash table:
+        the slot holding it, or else the empty slot where it would go
+        """
+        mask = len(self._slots) - 1
+        slot = hash(array(self.typecode, row).tostring()) & mask
+        while True:
+            stored = self._slots[slot]
+            if stored < 0 or self._stored_row(stored) == row:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _rehash(self, size):
+        """Rebuild the hash table with ``size`` (a power of 2) slots"""
+        self._slots = array('i', [-1] * size)
+        for row in xrange(self._num_rows):
+            self._slots[self._find(self._stored_row(row))] = row
+
+    def _row(self, i):
+        """Row in the matrix of the ``i``th schedule in the set"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return i if self._rows is None else self._rows[i]
+
+    def _row_list(self):
+        if self._rows is None:
+            return array(self.typecode, xrange(self._num_rows))
+        return self._rows
+
+    @staticmethod
+    def _padding(offset, alignment=8):
+        """Bytes needed after ``offset`` to align it to ``alignment``"""
+        return -offset % alignment
+
+    def _view(self, rows):
+        view = ScheduleSet.__new__(ScheduleSet)
+        view.__dict__.update(self.__dict__)
+        view._rows = array(self.typecode, rows)
+        return view
+
+
+class _MappedArray(object):
+    """Read-only, array-like window of ``length`` items of ``typecode``
+    into ``data`` (e.g., an mmap) starting at ``offset``
+    """
+
+    def __init__(self, data, offset, typecode, length):
+        self._data = data
+        self._offset = offset
+        self.typecode = typecode
+        self.itemsize = array(typecode).itemsize
+        self._length = length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._length)
+            assert step == 1
+            return array(self.typecode, self._data[
+                self._offset + start * self.itemsize:
+                self._offset + stop * self.itemsize
+            ])
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return struct.unpack_from(self.typecode, self._data,
+                                  self._offset + i * self.itemsize)[0]
+
+    def __len__(self):
+        return self._length
+
+
+def sorted_schedules(schedules, key, reverse=False):
+    """Sort ``schedules`` by ``key``
+
+    ScheduleSets are sorted into a (compact) ScheduleSet view rather than
+    a list of Schedules.
+    """
+    if isinstance(schedules, ScheduleSet):
+        return schedules.sorted(key, reverse=reverse)
+    return sorted(schedules, key=key, reverse=reverse)
+
+
+def load_or_generate(path, fingerprint, generate, scores=None):
+    """Load schedules saved at ``path``, or generate (and save) them if
+    there are none or they were generated from different inputs
+
+    :type  fingerprint: str
+    :param fingerprint: Fingerprint of the current inputs (i.e.,
+        ``Scheduler.fingerprint``)
+    :type  generate: callable
+    :param generate: Called without arguments to generate schedules
+        when they cannot be loaded; should return a ScheduleSet
+    :param scores: Scores to precompute when saving (see
+        ``ScheduleSet.save``)
+    :rtype: ScheduleSet
+    """
+    if os.path.exists(path):
+        try:
+            schedules = ScheduleSet.load(path)
+        except ValueError as err:
+            logging.warning(err)
+        else:
+            if schedules.fingerprint == fingerprint:
+                logging.info("Loaded {} schedules from {}.".format(
+                    len(schedules), path))
+                return schedules
+            logging.info("Inputs have changed since {} was saved; "
+                         "regenerating...".format(path))
+            # It is about to be written over
+            schedules.close()
+    schedules = generate()
+    schedules.save(path, fingerprint, scores=scores)
+    return ScheduleSet.load(path)
@@ -1,8 +1,5 @@
 import tempfile
 import os
-from uuid import uuid4
-
-from prettytable import PrettyTable
 
 from timetabler.util import iter_time, DAY_LIST
 
@@ -21,6 +18,36 @@ class Schedule(object):
         """
         self._sched = sched
         self.activities = [act for crs in sched for act in crs]
+        self._key = None
+
+    @property
+    def key(self):
+        """Canonical, hashable identity of this schedule
+
+        This is the sorted tuple of (section, term) pairs in the schedule
+        (multi-term sections have one activity per term), so two schedules
+        with the same key are the same timetable regardless of which
+        Scheduler run they came from or what order their courses are in.
+
+        :rtype: tuple
+        """
+        if self._key is None:
+            self._key = tuple(sorted({(a.section, a.term)
+                                      for a in self.activities}))
+        return self._key
+
+    def __eq__(self, other):
+        if not isinstance(other, Schedule):
+            return NotImplemented
+        return self.key == other.key
+
+    def __ne__(self, other):
+        if not isinstance(other, Schedule):
+            return NotImplemented
+        return self.key != other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
     def activities_for_day(self, day):
         return [a for a in self.activities if day in a.days]
@@ -40,6 +67,10 @@ class Schedule(object):
             return None
 
     def _draw(self, term=1):
+        # Only needed for drawing, so imported here rather than for
+        #  every user of Schedule
+        from prettytable import PrettyTable
+
         t = PrettyTable(["Time"] + DAY_LIST)
         earliest_start_time = min(a.start_time for a in self.activities)
         latest_end_time = max(a.end_time for a in self.activities)
@@ -68,6 +99,7 @@ class Schedule(object):
         assert draw_location in ["browser", "terminal"]
         tables = {term: self._draw(term) for term in terms}
         if draw_location=="browser":
+            from uuid import uuid4
             tempdir = tempfile.gettempdir()
             tempfile_loc = os.path.join(tempdir, "ubc-timetabler_{}.html".format(uuid4().hex))
             with open(tempfile_loc, 'w+') as f:
@@ -1,9 +1,20 @@
 import logging
-from itertools import combinations, ifilter, product
+import random
+from hashlib import md5
+from collections import Counter, defaultdict, OrderedDict
+from itertools import chain, combinations, product, islice
 
 from timetabler.ssc import SSCConnection
-from timetabler.util import check_equal, all_unique
+from timetabler.util import check_equal, all_unique, callable_fingerprint
 from timetabler.schedule import Schedule
+from timetabler.search import (decomposed_search, UniformSampler,
+                               random_solution)
+from timetabler.optimize import best_schedules
+from timetabler.combcache import default_cache
+from timetabler.feasibility import Infeasibility, find_core
+from timetabler.constraints import ConstraintEvaluator
+from timetabler.external import ExternalSort
+from timetabler import shard
 
 
 class NoActivitiesError(Exception):
@@ -15,9 +26,15 @@ class NoActivitiesError(Exception):
         return self.course_name
 
 
+class SamplingError(Exception):
+    """Not enough valid schedules could be sampled"""
+
+
 class Scheduler(object):
     def __init__(self, courses, session="2014W", terms=(1, 2),
-                 refresh=False, duplicates=True, ssc_conn=None):
+                 refresh=False, duplicates=True, ssc_conn=None,
+                 search_heuristics=True, electives=None,
+                 combination_cache=None):
         """Schedule
 
         :type  courses: list|tuple
@@ -29,70 +46,571 @@ class Scheduler(object):
             i.e., [1] for only first term, [1, 2] for whole session etc.
         :param refresh: Invalidate all cached data for relevant courses
         :type ssc_conn: SSCConnection
+        :type  search_heuristics: bool
+        :param search_heuristics: Place courses with the fewest remaining
+            options first and use forward checking when searching; the
+            number of search nodes visited by the last search is in
+            ``self.stats`` either way
+        :type  electives: list|None
+        :param electives: Groups of electives as [(k, [course, ...]), ...];
+            ``k`` courses from each group are taken in addition to
+            ``courses``. All choices of electives are searched together
+            rather than with one Scheduler per choice.
+        :type  combination_cache: timetabler.combcache.CombinationCache
+        :param combination_cache: Cache for valid section combinations of
+            courses; a cache shared by all Schedulers is used by default
         """
+        electives = electives or []
+        self.required = list(courses)
+        self.elective_groups = [(k, list(group)) for k, group in electives]
+        all_courses = list(chain(self.required,
+                                 *[group for _, group in self.elective_groups]))
+        assert all_unique(all_courses), "Courses can only be given once"
         self.ssc_conn = SSCConnection() if ssc_conn is None else ssc_conn
-        self.courses = {c: self.ssc_conn.get_course(c, session, refresh=refresh,
-                                                    duplicates=duplicates)
-                        for c in courses}
+        if hasattr(self.ssc_conn, "get_courses"):
+            # Pages are parsed in parallel when there are many of them
+            courses = self.ssc_conn.get_courses(all_courses, session,
+                                                refresh=refresh,
+                                                duplicates=duplicates)
+        else:
+            courses = [self.ssc_conn.get_course(c, session, refresh=refresh,
+                                                duplicates=duplicates)
+                       for c in all_courses]
+        self.courses = dict(zip(all_courses, courses))
         self.terms = terms
         self.session = session
-        self._constraints = []
+        self._constraints = ConstraintEvaluator()
+        self.search_heuristics = search_heuristics
+        self.combination_cache = default_cache if combination_cache is None \
+            else combination_cache
+        self.stats = Counter()
+        # State from the last call to generate_schedules
+        self.infeasibility = None
+        self._bad_statuses = None
+        self._schedules = None
 
     ##################
     # Public Methods #
     ##################
 
     def generate_schedules(self, bad_statuses=("Full", "Blocked")):
-        """Generate valid schedules"""
+        """Generate valid schedules
+
+        State from this run is kept around so that later status changes
+        can be applied with ``update_statuses`` instead of regenerating
+        everything from scratch.
+
+        If the courses are found to be impossible to take together before
+        searching (see ``check_feasibility``), no search is done and the
+        explanation is logged and kept in ``self.infeasibility``.
+        """
+        self._bad_statuses = bad_statuses
+        self.stats = Counter()
+        self._choices = self._course_choices()
+        self._combs_by_course = {}
+        self._combs_by_section = defaultdict(list)
         schedules_by_course = {}
         for name, course in self.courses.items():
             logging.info("Generating schedules for {} ...".format(name))
             # Courses should have at least one activity
             if not course.activities:
                 raise NoActivitiesError(name)
-            acts = course.activities
-            r = sum(c[1] for c in course.num_section_constraints)
-            combs = combinations(acts, r)
-            # Makes sure:
-            # * num_section_constraints from Course are met
-            # * all activities are in terms that we want (according to self.terms)
-            # * all activities themselves are in the same term (UNLESS they're multiterm)
-            # * no activities are included that are Full/Blocked
-            # * all constraints from the course are satisfied
-            filter_func = lambda combo: all([
-                all(
-                    sum(int(isinstance(act, constraint[0])) for act in combo) == constraint[1]
-                    for constraint in course.num_section_constraints
-                ),
-                all(act.term in self.terms for act in combo),
-                (check_equal([act.term for act in combo]) or
-                 any(act.is_multi_term for act in combo)),
-                all(a.status not in bad_statuses for a in combo),
-                all(c(combo) for c in course.constraints)
-            ])
-            filtered_combs = filter(filter_func, combs)
-            schedules_by_course[name] = filtered_combs
+            combs = self._course_combinations(course)
+            self._combs_by_course[name] = combs
+            for comb in combs:
+                for section in {a.section for a in comb}:
+                    self._combs_by_section[section].append((name, comb))
+            schedules_by_course[name] = [c for c in combs
+                                         if self._status_ok(c)]
             logging.info("Schedules for {} generated.".format(name))
+        self._valid_combs = {name: set(combs) for name, combs
+                             in schedules_by_course.iteritems()}
 
-        # Get all combinations (so all possible schedules); but we still need to check for conflicts
-        all_scheds = self._generate_combinations(schedules_by_course)
-        # Makes sure:
-        # * Schedules don't have recurring courses
-        # * Don't have conflicts
-        filter_func = lambda s: all([
-            # all_unique(a.section for t in s for a in t),  # This seems to be unnecessary
-            not self._check_schedule_conflicts(s)
-        ])
-        # Now we filter away all schedules that have conflicts
-        filtered_all_scheds = ifilter(filter_func, all_scheds)
+        self.infeasibility = self._presolve(schedules_by_course,
+                                           bad_statuses)
+        # Get all conflict-free combinations of the above
+        if self.infeasibility is not None:
+            logging.warning(str(self.infeasibility))
+            all_scheds = []
+        elif self.elective_groups:
+            all_scheds = self._search_electives(schedules_by_course)
+        else:
+            all_scheds = self._search(
+                [schedules_by_course[name] for name in self.required]
+            )
         logging.info("Generating all valid schedules ...")
-        schedules = [Schedule(sched) for sched in filtered_all_scheds]
-        # Now we filter away all the schedules that don't obey constraints
-        filter_func = lambda s: all(c(s) for c in self._constraints)
-        schedules = filter(filter_func, schedules)
-        logging.info("Found {} valid schedules.".format(len(schedules)))
+        self._schedules = OrderedDict()
+        self._scheds_by_section = defaultdict(set)
+        self._add_schedules(all_scheds)
+        logging.info("Found {} valid schedules.".format(len(self._schedules)))
+        if self._constraints:
+            logging.info("Constraints:\n{}".format(self._constraints.report()))
+
+        return self.schedules
+
+    @property
+    def schedules(self):
+        """Valid schedules as of the last ``generate_schedules`` or
+        ``update_statuses`` call
+
+        :rtype: [Schedule, ...]
+        """
+        return list(self._schedules.itervalues())
+
+    def update_statuses(self, statuses):
+        """Apply section status changes to previously generated schedules
+
+        Only schedules containing sections that are now unregisterable are
+        removed, and only combinations involving sections that have just
+        become registerable are searched, so the cost is proportional to
+        the size of the change rather than to the whole problem.
+
+        Course constraints may look at statuses, so the combinations of
+        courses with constraints whose statuses changed are worked out
+        again in full.
+
+        :type  statuses: dict
+        :param statuses: e.g., {"CPSC 304 T2A": "Full"}
+        :rtype: tuple
+        :returns: (added, removed) lists of Schedule
+        """
+        assert self._schedules is not None, \
+            "generate_schedules must be called before update_statuses"
+        self.stats = Counter()
+        freed, blocked = set(), set()
+        changed_courses = set()
+        for section, status in statuses.iteritems():
+            # Activities are looked up in the courses rather than in the
+            #  combinations, as course constraints may have ruled out
+            #  every combination with the section
+            found = [(name, a) for name, course in self.courses.iteritems()
+                     for a in course.activities if a.section == section]
+            if not found:
+                logging.info("{} is not part of this Scheduler; skipping."
+                             .format(section))
+                continue
+            acts = [a for _, a in found]
+            if acts[0].status != status:
+                changed_courses.add(found[0][0])
+            was_bad = acts[0].status in self._bad_statuses
+            for act in acts:
+                act.status = status
+            is_bad = status in self._bad_statuses
+            if is_bad and not was_bad:
+                blocked.add(section)
+            elif was_bad and not is_bad:
+                freed.add(section)
+
+        # Drop every schedule that contains a section that just closed
+        removed = []
+        for section in blocked:
+            for name, comb in self._combs_by_section[section]:
+                self._valid_combs[name].discard(comb)
+            for key in list(self._scheds_by_section.pop(section, ())):
+                removed.append(self._remove_schedule(key))
+
+        new_combs = defaultdict(list)
+        for name in changed_courses:
+            if self.courses[name].constraints:
+                removed.extend(self._recompute_course(name, new_combs))
+
+        # Find combinations that were just opened up
+        for section in freed:
+            for name, comb in self._combs_by_section[section]:
+                if comb not in self._valid_combs[name] and \
+                        self._status_ok(comb):
+                    self._valid_combs[name].add(comb)
+                    new_combs[name].append(comb)
+        # Every new schedule uses at least one new combination; take the
+        # first course (in course order) for which it does so, so that
+        # each new schedule is only generated once
+        candidates = []
+        for choice in self._choices:
+            for i, name in enumerate(choice):
+                if name not in new_combs:
+                    continue
+                lists = []
+                for j, other in enumerate(choice):
+                    valid = self._valid_combs[other]
+                    if j < i:
+                        lists.append([c for c in self._combs_by_course[other]
+                                      if c in valid and
+                                      c not in new_combs.get(other, ())])
+                    elif j == i:
+                        lists.append(new_combs[name])
+                    else:
+                        lists.append([c for c in self._combs_by_course[other]
+                                      if c in valid])
+                candidates.append(self._search(lists))
+        added = self._add_schedules(chain.from_iterable(candidates))
+        logging.info("Status update: {} schedules added, {} removed.".format(
+            len(added), len(removed)))
+        return added, removed
+
+    def iter_schedules(self, bad_statuses=("Full", "Blocked"),
+                       max_kept=100000):
+        """Generate valid schedules one at a time
+
+        Unlike ``generate_schedules``, no schedules are kept around (so
+        ``update_statuses`` can't be used afterwards), and the search only
+        keeps up to ``max_kept`` solutions of each term in memory, so
+        memory use doesn't grow with the number of schedules.
+
+        :type  max_kept: int|None
+        :param max_kept: See ``search.decomposed_search``
+        :rtype: iterator
+        :returns: Iterator over Schedule; the same schedules as
+            ``generate_schedules``, and in the same order unless there
+            are electives and more than ``max_kept`` partial schedules
+            of the required courses
+        """
+        self.stats = Counter()
+        combs_by_course = self._combinations_by_course(bad_statuses)
+        infeasibility = self._presolve(combs_by_course, bad_statuses)
+        if infeasibility is not None:
+            logging.warning(str(infeasibility))
+            return
+        if self.elective_groups:
+            self._choices = self._course_choices()
+            scheds = self._search_electives(combs_by_course,
+                                            max_kept=max_kept)
+        else:
+            scheds = self._search([combs_by_course[name]
+                                   for name in self.required],
+                                  max_kept=max_kept)
+        for sched in scheds:
+            schedule = Schedule(sched)
+            if self._constraints(schedule):
+                yield schedule
+
+    def generate_sorted(self, key, max_memory=64 * 2 ** 20,
+                        bad_statuses=("Full", "Blocked"), directory=None):
+        """Generate valid schedules sorted by ``key``, using at most about
+        ``max_memory`` bytes for them
+
+        Once the ceiling is reached, schedules are written to disk in
+        sorted runs, which are merged when the result is iterated over
+        (see ``timetabler.external``), so any number of schedules can be
+        ranked and paged through.
+
+        :type  key: callable
+        :param key: Key function that takes a Schedule, e.g., from
+            ``Ranker.lexicographic_key``
+        :type  max_memory: int
+        :type  directory: str|None
+        :param directory: Where runs are written (the system's temporary
+            directory by default)
+        :rtype: timetabler.external.ExternalSort
+        :returns: Sorted schedules; ``close`` it (or use it as a context
+            manager) to delete its runs as soon as it's no longer needed
+        """
+        ranked = ExternalSort(key, max_memory=max_memory, directory=directory)
+        try:
+            ranked.extend(self.iter_schedules(bad_statuses))
+        except BaseException:
+            # e.g., KeyboardInterrupt; don't leave runs behind
+            ranked.close()
+            raise
+        logging.info("Found {} valid schedules ({} runs on disk).".format(
+            len(ranked), ranked.runs))
+        return ranked
+
+    def optimize(self, objective, k=10, bad_statuses=("Full", "Blocked")):
+        """Find the ``k`` best schedules under ``objective``
+
+        Rather than generating all schedules and sorting them, this uses a
+        branch-and-bound search that discards partial schedules that can't
+        beat the ``k``th best schedule found so far. The scores are the same
+        as from sorting all of ``generate_schedules`` by ``objective``,
+        but schedules with tied scores may be different ones (see
+        ``optimize.best_schedules``).
+
+        :type  objective: timetabler.optimize.Objective
+        :param objective: Objective to minimize
+        :type  k: int
+        :rtype: [Schedule, ...]
+        :returns: Best ``k`` schedules, best first
+        """
+        self.stats = Counter()
+        accept = None
+        if self._constraints:
+            accept = lambda sched: self._constraints(Schedule(sched))
+        combs_by_course = self._combinations_by_course(bad_statuses)
+        best = []
+        for choice in self._course_choices():
+            best.extend(best_schedules(
+                [combs_by_course[name] for name in choice],
+                self._check_conflicts, objective, k, accept=accept,
+                heuristics=self.search_heuristics, stats=self.stats
+            ))
+        best = sorted(best, key=lambda b: b[0])[:k]
+        logging.info("Found best {} schedules; best score is {}.".format(
+            len(best), best[0][0] if best else None))
+        return [Schedule(sched) for _, sched in best]
+
+    def sample(self, n, seed=None, bad_statuses=("Full", "Blocked"),
+               max_tries=None, max_enumerated=100000, max_counted=10000):
+        """Pick up to ``n`` different valid schedules uniformly at random
+
+        Every term is searched once to count the conflict-free schedules
+        below every choice (of electives, terms and sections), and each
+        sample is then drawn by choosing with probabilities proportional
+        to those counts, so every conflict-free schedule is equally
+        likely, without generating them all. Samples that constraints
+        reject (or that were already drawn) are drawn again. If there are
+        at most ``2 * n`` conflict-free schedules, or draws run out and
+        there are at most ``max_enumerated``, they are all generated and
+        the valid ones are sampled from instead.
+
+        Counting keeps every term's solutions in memory, so if any term
+        has more than ``max_counted`` of them, each sample is instead
+        found by a randomized search that stops at its first schedule;
+        the cost then depends on ``n`` rather than on the size of the
+        search space, and samples are close to (but not exactly) uniform.
+
+        :type  n: int
+        :type  seed: hashable|None
+        :param seed: Seed for the random number generator; the same seed
+            (and inputs) always gives the same samples
+        :type  max_tries: int|None
+        :param max_tries: Number of draws to stop drawing after (by
+            default ``10 * n + 100``)
+        :type  max_enumerated: int
+        :param max_enumerated: Most conflict-free schedules to generate
+            all of once draws run out
+        :type  max_counted: int
+        :param max_counted: Most solutions of a term to keep in memory
+            for counting
+        :rtype: [Schedule, ...]
+        :returns: ``n`` schedules, or all valid schedules if there are
+            fewer than ``n``
+        :raises SamplingError: If fewer than ``n`` valid schedules were
+            drawn in ``max_tries`` draws (e.g., because constraints reject
+            most schedules), and there are too many conflict-free
+            schedules to generate them all
+        """
+        self.stats = Counter()
+        rng = random.Random(seed)
+        max_tries = 10 * n + 100 if max_tries is None else max_tries
+        combs_by_course = self._combinations_by_course(bad_statuses)
+        infeasibility = self._presolve(combs_by_course, bad_statuses)
+        if infeasibility is not None:
+            logging.warning(str(infeasibility))
+            return []
+        choices = self._course_choices()
+        samplers = []
+        for choice in choices:
+            sampler = UniformSampler(
+                [combs_by_course[name] for name in choice],
+                self._check_conflicts, heuristics=self.search_heuristics,
+                stats=self.stats, max_kept=max_counted
+            )
+            if sampler.count is None:
+                logging.info("Too many schedules to count; sampling by "
+                             "randomized search.")
+                return self._sample_by_search(n, rng, choices,
+                                              combs_by_course, max_tries)
+            samplers.append(sampler)
+        weights = [sampler.count for sampler in samplers]
+        total = sum(weights)
+        if total <= 2 * n:
+            return self._sample_all(n, rng, choices, combs_by_course)
+        samples = OrderedDict()
+        tries = 0
+        while len(samples) < n:
+            if tries >= max_tries:
+                if total <= max_enumerated:
+                    logging.info("Found only {} samples in {} draws; "
+                                 "sampling from all schedules.".format(
+                                     len(samples), tries))
+                    return self._sample_all(n, rng, choices,
+                                            combs_by_course)
+                raise SamplingError(
+                    "Found only {} of {} schedules in {} draws (from {} "
+                    "conflict-free schedules, more than max_enumerated); "
+                    "constraints may reject most schedules, or max_tries "
+                    "may be too low".format(len(samples), n, tries, total)
+                )
+            tries += 1
+            sampler = samplers[_weighted_choice(rng, weights)]
+            schedule = Schedule(sampler.draw(rng))
+            if schedule.key not in samples and self._constraints(schedule):
+                samples[schedule.key] = schedule
+        logging.info("Sampled {} schedules in {} draws.".format(
+            len(samples), tries))
+        return list(samples.itervalues())
+
+    def shards(self, n, bad_statuses=("Full", "Blocked")):
+        """Split the search for schedules into ``n`` shards
+
+        Every shard is a self-contained JSON description that can be run
+        with ``timetabler.shard.run_shard`` (on any machine, without
+        access to the SSC); the results are combined with
+        ``merge_shards``. The split only depends on the inputs, so the
+        same inputs always give the same shards.
+
+        :type  n: int
+        :rtype: [str, ...]
+        """
+        combs_by_course = self._combinations_by_course(bad_statuses)
+        choices = self._course_choices()
+        return [shard.describe(combs_by_course, choices, self.terms, i, n)
+                for i in xrange(n)]
+
+    def merge_shards(self, results, k=None):
+        """Combine the results of running every shard from ``shards``
+
+        The constraints of this Scheduler are applied here. For full sets
+        of schedules, the result is the same set of schedules as
+        ``generate_schedules``; for the best schedules (shards run with an
+        objective), the scores are the same as from ``optimize``, as long
+        as no shard is short of schedules that meet the constraints (see
+        ``short_shards``).
+
+        :type  results: list
+        :param results: Results of ``run_shard`` for all shards
+        :type  k: int|None
+        :param k: Number of best schedules to keep when merging the best
+            schedules of each shard
+        :rtype: [Schedule, ...]
+        :raises ValueError: If shards that were run with an objective
+            have to be run again with a larger ``k``
+        """
+        results = sorted(results, key=lambda r: r["shard"])
+        self.stats = Counter()
+        for result in results:
+            self.stats.update(result["stats"])
+
+        if all("best" in r for r in results):
+            short = self.short_shards(results, k)
+            if short:
+                raise ValueError(
+                    "Too few of the best schedules of shards {} meet the "
+                    "constraints; run them again with a larger k".format(
+                        ", ".join(map(str, short))))
+            best = sorted((b for r in results for b in self._accepted_best(r)),
+                          key=lambda b: b[0])[:k]
+            return [schedule for _, schedule in best]
+        decode = self._shard_decoder()
+        schedules = OrderedDict()
+        for result in results:
+            for sched in result["schedules"]:
+                schedule = Schedule(decode(result, sched))
+                if schedule.key not in schedules and \
+                        self._constraints(schedule):
+                    schedules[schedule.key] = schedule
+        logging.info("Merged {} valid schedules from {} shards.".format(
+            len(schedules), len(results)))
+        return list(schedules.itervalues())
+
+    def short_shards(self, results, k=None):
+        """Shards, run with an objective, that found fewer than ``k`` best
+        schedules that meet the constraints of this Scheduler, but that
+        may have more (i.e., they were cut off at their own ``k``)
+
+        Constraints can't be sent to shards, so they are applied to the
+        best schedules of each shard afterwards; shards listed here have
+        to be run again with a larger ``k`` before they can be merged.
+
+        :type  results: list
+        :param results: Results of ``run_shard``
+        :type  k: int|None
+        :param k: Number of best schedules wanted; the ``k`` each shard
+            was run with by default
+        :rtype: [int, ...]
+        """
+        return [r["shard"] for r in results
+                if "best" in r and len(r["best"]) >= r["k"] and
+                len(self._accepted_best(r)) < (r["k"] if k is None else k)]
+
+    def generate_sharded(self, n, processes=None, objective=None, k=10,
+                         bad_statuses=("Full", "Blocked")):
+        """Generate schedules (or the best ``k`` under ``objective``) by
+        running ``n`` shards in local processes
+
+        :type  objective: timetabler.optimize.Objective|None
+        :param objective: Must be picklable (see ``shard.run_local``)
+        :type  k: int
+        :param k: Number of best schedules to find (as for ``optimize``);
+            only used with ``objective``
+        :rtype: [Schedule, ...]
+        """
+        descriptions = self.shards(n, bad_statuses=bad_statuses)
+        results = shard.run_local(descriptions, processes=processes,
+                                  objective=objective, k=k,
+                                  heuristics=self.search_heuristics)
+        if objective is not None:
+            shard_k = k
+            short = self.short_shards(results, k)
+            while short:
+                shard_k *= 2
+                logging.info("Running shards {} again for the best {} "
+                             "schedules.".format(short, shard_k))
+                for result in shard.run_local(
+                        [descriptions[i] for i in short],
+                        processes=processes, objective=objective, k=shard_k,
+                        heuristics=self.search_heuristics):
+                    results[result["shard"]] = result
+                short = self.short_shards(results, k)
+        return self.merge_shards(results, k=k)
+
+    def check_feasibility(self, bad_statuses=("Full", "Blocked")):
+        """Check whether the courses can be taken together at all, without
+        searching for schedules
+
+        This only looks at pairs of courses and at arc consistency (see
+        ``timetabler.feasibility``), so it takes milliseconds; if it finds
+        nothing, there may still be no valid schedules.
+
+        :rtype: Infeasibility|None
+        :returns: Explanation of which courses (and sections) make the
+            courses impossible to take together, or None if no problem
+            was found
+        """
+        return self._presolve(self._combinations_by_course(bad_statuses),
+                              bad_statuses)
+
+    def warm_combinations(self):
+        """Work out the valid section combinations of every course (in
+        ``self.combination_cache``) ahead of time, so that Schedulers
+        created later for the same courses find them in the cache
+        """
+        for course in self.courses.itervalues():
+            self._course_combinations(course)
 
-        return schedules
+    def fingerprint(self, bad_statuses=("Full", "Blocked")):
+        """Fingerprint of all inputs that determine generated schedules
+
+        This covers course data (every activity and its status), course
+        constraints, session, terms, ``bad_statuses`` and the constraints of
+        this Scheduler, so if it is unchanged, ``generate_schedules`` with
+        ``bad_statuses`` would give the same result. Constraints are
+        fingerprinted with ``util.callable_fingerprint``, so changes to
+        functions that they call (rather than to their own code and the
+        data they read) are not noticed.
+
+        :rtype: str
+        """
+        h = md5()
+        h.update(repr((self.session, tuple(self.terms),
+                       tuple(sorted(bad_statuses)), self.required,
+                       self.elective_groups)))
+        for name in sorted(self.courses):
+            course = self.courses[name]
+            h.update(repr(name))
+            for act in course.activities:
+                h.update(repr((
+                    act.__class__.__name__, act.status, act.section,
+                    act.term, sorted(act.days), act.start_time,
+                    act.end_time, act.is_multi_term
+                )))
+            h.update(repr([(cls.__name__, n) for cls, n
+                           in course.num_section_constraints]))
+            for constraint in course.constraints:
+                h.update(callable_fingerprint(constraint))
+        for constraint in self._constraints:
+            h.update(callable_fingerprint(constraint))
+        return h.hexdigest()
 
     def add_constraint(self, constraint):
         """Add constraint ``constraint`` to list of constraints
@@ -102,26 +620,383 @@ class Scheduler(object):
             and returns True or False depending on whether
             a constraint is met
         """
-        self._constraints.append(constraint)
+        self._constraints.add(constraint)
+
+    def constraint_stats(self):
+        """Measured cost and rejection rate of every constraint (see
+        ``timetabler.constraints.ConstraintEvaluator.stats``)
+
+        :rtype: [dict, ...]
+        """
+        return self._constraints.stats()
 
     ###################
     # Private Methods #
     ###################
 
-    def _generate_combinations(self, scheds_by_course):
-        """Generate all possible schedules given ``scheds_by_course``
+    def _sample_by_search(self, n, rng, choices, combs_by_course,
+                          max_tries):
+        """``n`` schedules found by randomized searches (for search spaces
+        too big to count); choices of electives are weighted by their
+        numbers of candidate schedules
+        """
+        weights = [reduce(lambda x, name: x * len(combs_by_course[name]),
+                          choice, 1) for choice in choices]
+        samples = OrderedDict()
+        tries = 0
+        while len(samples) < n and any(weights):
+            if tries >= max_tries:
+                raise SamplingError(
+                    "Found only {} of {} schedules in {} searches; "
+                    "constraints may reject most schedules, or max_tries "
+                    "may be too low".format(len(samples), n, tries)
+                )
+            tries += 1
+            i = _weighted_choice(rng, weights)
+            sched = random_solution(
+                [combs_by_course[name] for name in choices[i]],
+                self._check_conflicts, rng,
+                heuristics=self.search_heuristics, stats=self.stats
+            )
+            if sched is None:
+                # The whole search space for this choice has been searched
+                weights[i] = 0
+                continue
+            schedule = Schedule(sched)
+            if schedule.key not in samples and self._constraints(schedule):
+                samples[schedule.key] = schedule
+        logging.info("Sampled {} schedules in {} searches.".format(
+            len(samples), tries))
+        return list(samples.itervalues())
 
-        :type  scheds_by_course: dict
-        :param scheds_by_course: Dictionary of possible schedules by course
+    def _sample_all(self, n, rng, choices, combs_by_course):
+        """``n`` schedules picked at random from all valid schedules (or
+        all of them if there are fewer)
+        """
+        schedules = (Schedule(sched) for choice in choices
+                     for sched in decomposed_search(
+                         [combs_by_course[name] for name in choice],
+                         self._check_conflicts,
+                         heuristics=self.search_heuristics))
+        valid = [s for s in schedules if self._constraints(s)]
+        samples = rng.sample(valid, min(n, len(valid)))
+        logging.info("Sampled {} of {} schedules.".format(
+            len(samples), len(valid)))
+        return samples
+
+    def _course_combinations(self, course):
+        """Get all combinations of sections of ``course`` that are valid
+        regardless of section status (from ``self.combination_cache`` if
+        they have been worked out before)
+
+        Course constraints are checked after the cache lookup, since they
+        may look at anything about the activities (including statuses).
+
+        :type  course: Course
         :rtype: list
-        :return: Combination of all schedules
         """
-        if not scheds_by_course:
-            return []
+        combs = self.combination_cache.get(course, self.terms,
+                                           self._compute_combinations)
+        if course.constraints:
+            combs = [comb for comb in combs
+                     if all(c(comb) for c in course.constraints)]
+        return combs
+
+    def _compute_combinations(self, course):
+        """Work out ``_course_combinations`` for ``course`` (without
+        checking course constraints)
+        """
+        acts = course.activities
+        r = sum(c[1] for c in course.num_section_constraints)
+        combs = combinations(acts, r)
+        # Makes sure:
+        # * num_section_constraints from Course are met
+        # * all activities are in terms that we want (according to self.terms)
+        # * all activities themselves are in the same term (UNLESS they're multiterm)
+        # Cheapest checks first; checking stops at the first one that fails
+        def filter_func(combo):
+            if not all(
+                sum(int(isinstance(act, constraint[0])) for act in combo) == constraint[1]
+                for constraint in course.num_section_constraints
+            ):
+                return False
+            if not all(act.term in self.terms for act in combo):
+                return False
+            return (check_equal([act.term for act in combo]) or
+                    any(act.is_multi_term for act in combo))
+        return filter(filter_func, combs)
+
+    def _combinations_by_course(self, bad_statuses):
+        """Valid section combinations for each course that don't contain
+        sections with ``bad_statuses``
+
+        :rtype: dict
+        """
+        combs_by_course = {}
+        for name, course in self.courses.items():
+            if not course.activities:
+                raise NoActivitiesError(name)
+            combs_by_course[name] = [
+                c for c in self._course_combinations(course)
+                if all(a.status not in bad_statuses for a in c)
+            ]
+        return combs_by_course
+
+    def _shard_decoder(self):
+        """Function that decodes a schedule of a shard's result (positions
+        in its activity table) into a tuple of combinations
+        """
+        acts = {(a.section, a.term): a for course in self.courses.values()
+                for a in course.activities}
+
+        def decode(result, sched):
+            table = result["activities"]
+            return tuple(tuple(acts[tuple(table[i])] for i in comb)
+                         for comb in sched)
+
+        return decode
+
+    def _accepted_best(self, result):
+        """(score, Schedule) of the best schedules of shard ``result``
+        that meet the constraints, best first
+        """
+        decode = self._shard_decoder()
+        best = [(score, Schedule(decode(result, sched)))
+                for score, sched in result["best"]]
+        return [(score, schedule) for score, schedule in best
+                if self._constraints(schedule)]
+
+    def _course_choices(self):
+        """All sets of courses that can be taken, i.e., required courses
+        plus a choice of ``k`` electives from every elective group
+
+        :rtype: [tuple, ...]
+        """
+        group_choices = [combinations(group, k)
+                         for k, group in self.elective_groups]
+        return [tuple(self.required) + tuple(chain(*choice))
+                for choice in product(*group_choices)]
 
-        schedules = list(product(*scheds_by_course.itervalues()))
-        return schedules
+    def _presolve(self, scheds_by_course, bad_statuses):
+        """Look for a small set of courses that can't be taken together
 
+        This covers the required courses, and every elective group that
+        doesn't have enough courses that fit with the required courses.
+
+        :type  scheds_by_course: dict
+        :param scheds_by_course: Possible schedules for each course
+            (without sections with ``bad_statuses``)
+        :rtype: Infeasibility|None
+        """
+        required = [scheds_by_course[name] for name in self.required]
+        core = find_core(required)
+        if core is not None:
+            names = [self.required[i] for i in core]
+            if len(names) == 1:
+                reasons = [self._explain_course(names[0], scheds_by_course,
+                                                bad_statuses)]
+            else:
+                reasons = ["{} and {} can't be taken together; every "
+                           "combination of their available sections ({}) "
+                           "conflicts".format(", ".join(names[:-1]), names[-1],
+                                              ", ".join(
+                               "{} for {}".format(len(scheds_by_course[n]), n)
+                               for n in names))]
+            return Infeasibility(names, reasons + self._excluded_sections(
+                names, bad_statuses))
+        for k, group in self.elective_groups:
+            unavailable = [name for name in group if find_core(
+                required + [scheds_by_course[name]]) is not None]
+            if len(group) - len(unavailable) < k:
+                return Infeasibility(unavailable, [
+                    "Only {} of these electives fit with the required "
+                    "courses, but {} are needed".format(
+                        len(group) - len(unavailable), k)
+                ] + self._excluded_sections(unavailable, bad_statuses))
+        return None
+
+    def _explain_course(self, name, scheds_by_course, bad_statuses):
+        """Reason that ``name`` has no usable section combinations"""
+        num_combs = len(self._course_combinations(self.courses[name]))
+        if not num_combs:
+            return ("{} has no combination of sections that meets its "
+                    "requirements in terms {}".format(
+                        name, ", ".join(map(str, self.terms))))
+        if not scheds_by_course[name]:
+            return ("Every combination of sections of {} ({} in all) has "
+                    "sections that are {}".format(name, num_combs,
+                                                  "/".join(bad_statuses)))
+        return ("Every available combination of sections of {} ({} in all) "
+                "has sections that conflict with each other".format(
+                    name, len(scheds_by_course[name])))
+
+    def _excluded_sections(self, names, bad_statuses):
+        """Reasons listing sections of ``names`` that were left out
+        because of their status (and might make things possible if they
+        open up)
+        """
+        reasons = []
+        for name in names:
+            excluded = ["{} ({})".format(a.section, a.status)
+                        for a in self.courses[name].activities
+                        if a.status in bad_statuses]
+            if excluded:
+                reasons.append("Sections of {} that were left out: {}"
+                               .format(name, ", ".join(excluded)))
+        return reasons
+
+    def _status_ok(self, combo):
+        """Check that no activities are included in ``combo`` that are
+        Full/Blocked (or whatever the current bad statuses are)
+        """
+        return all(a.status not in self._bad_statuses for a in combo)
+
+    def _add_schedules(self, scheds):
+        """Filter ``scheds`` and add the valid ones to the current schedules
+
+        :type  scheds: iterable
+        :param scheds: Iterable of tuples of conflict-free section
+            combinations (one per course, in the order of one of
+            ``self._choices``)
+        :rtype: [Schedule, ...]
+        :returns: Newly added schedules
+        """
+        added = []
+        for sched in scheds:
+            schedule = Schedule(sched)
+            # Now we filter away all the schedules that don't obey constraints
+            if not self._constraints(schedule):
+                continue
+            self._schedules[sched] = schedule
+            for act in schedule.activities:
+                self._scheds_by_section[act.section].add(sched)
+            added.append(schedule)
+        return added
+
+    def _recompute_course(self, name, new_combs):
+        """Work out the combinations of course ``name`` again (after status
+        changes that its constraints may depend on)
+
+        Schedules with combinations that are no longer valid are removed;
+        combinations that have become valid (and have no sections with bad
+        statuses) are added to ``new_combs``.
+
+        :type  new_combs: defaultdict
+        :rtype: [Schedule, ...]
+        :returns: Removed schedules
+        """
+        old = self._combs_by_course[name]
+        new = self._course_combinations(self.courses[name])
+        old_set, new_set = set(old), set(new)
+        self._combs_by_course[name] = new
+        removed = []
+        for comb in old:
+            if comb in new_set:
+                continue
+            self._valid_combs[name].discard(comb)
+            for section in {a.section for a in comb}:
+                self._combs_by_section[section].remove((name, comb))
+            section = comb[0].section
+            for key in [k for k in self._scheds_by_section.get(section, ())
+                        if comb in k]:
+                removed.append(self._remove_schedule(key))
+        for comb in new:
+            if comb in old_set:
+                continue
+            for section in {a.section for a in comb}:
+                self._combs_by_section[section].append((name, comb))
+            if self._status_ok(comb):
+                self._valid_combs[name].add(comb)
+                new_combs[name].append(comb)
+        return removed
+
+    def _remove_schedule(self, sched):
+        """Remove ``sched`` from the current schedules
+
+        :rtype: Schedule
+        :returns: The removed schedule
+        """
+        schedule = self._schedules.pop(sched)
+        for act in schedule.activities:
+            self._scheds_by_section[act.section].discard(sched)
+        return schedule
+
+    def _search(self, scheds_by_course, max_kept=None):
+        """Generate all conflict-free schedules given ``scheds_by_course``
+
+        Each term is searched separately (activities in different terms
+        can't conflict) and the results are joined on the choices for
+        multi-term courses; see ``timetabler.search``.
+
+        :type  scheds_by_course: list
+        :param scheds_by_course: List of possible schedules for each course
+        :type  max_kept: int|None
+        :param max_kept: See ``search.decomposed_search``
+        :return: Iterator over conflict-free combinations of schedules
+        """
+        return decomposed_search(scheds_by_course, self._check_conflicts,
+                                 heuristics=self.search_heuristics,
+                                 stats=self.stats, max_kept=max_kept)
+
+    def _search_electives(self, scheds_by_course, max_kept=None):
+        """Generate all conflict-free schedules for every choice of
+        electives
+
+        Partial schedules for the required courses are only searched once,
+        and are then used as the options of a single "course" in the search
+        for every choice of electives. Elective combinations that conflict
+        with every required partial schedule are dropped beforehand.
+
+        With ``max_kept``, if there are more than that many required
+        partial schedules, they aren't kept; every choice of courses is
+        searched in full instead.
+
+        :type  scheds_by_course: dict
+        :param scheds_by_course: Possible schedules for each course
+        :type  max_kept: int|None
+        :param max_kept: See ``search.decomposed_search``
+        :return: Iterator over conflict-free combinations of schedules
+            (one per course, in the order of the course choice)
+        """
+        if self.required:
+            partials = self._search([scheds_by_course[name]
+                                     for name in self.required],
+                                    max_kept=max_kept)
+            if max_kept is not None:
+                partials = list(islice(partials, max_kept + 1))
+                if len(partials) > max_kept:
+                    for choice in self._choices:
+                        for sched in self._search([scheds_by_course[name]
+                                                   for name in choice],
+                                                  max_kept=max_kept):
+                            yield sched
+                    return
+        else:
+            partials = [()]
+        # Required partial schedules, flattened into tuples of activities
+        flattened = OrderedDict(
+            (tuple(a for comb in p for a in comb), p) for p in partials
+        )
+        logging.info("Found {} partial schedules for required courses."
+                     .format(len(flattened)))
+        if not flattened:
+            return
+        viable = {}
+        for _, group in self.elective_groups:
+            for name in group:
+                viable[name] = [
+                    comb for comb in scheds_by_course[name]
+                    if any(not any(self._check_conflicts(a, acts) for a in comb)
+                           for acts in flattened)
+                ]
+        num_required = len(self.required)
+        for choice in self._choices:
+            electives = choice[num_required:]
+            if not all(viable[name] for name in electives):
+                continue
+            options = [list(flattened)] + [viable[name] for name in electives]
+            for sched in self._search(options):
+                yield flattened[sched[0]] + sched[1:]
 
     @classmethod
     def _check_conflict(cls, act1, act2):
@@ -155,3 +1030,14 @@ class Scheduler(object):
                 return True
         else:
             return False
+
+
+def _weighted_choice(rng, weights):
+    """Index into ``weights`` (non-negative ints) picked with probability
+    proportional to its weight
+    """
+    r = rng.randrange(sum(weights))
+    for i, weight in enumerate(weights):
+        r -= weight
+        if r < 0:
+            return i
@@ -0,0 +1,492 @@
+"""Search for conflict-free combinations of course sections
+
+Activities can only conflict with activities in the same term, so rather
+than searching the product of all courses' section combinations at once,
+the problem is split into one subproblem per term. The subproblems are
+solved independently and their solutions are then joined on the choices
+of multi-term courses (the only courses that tie terms together).
+"""
+from bisect import bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from itertools import product, islice
+
+
+def decomposed_search(combs_by_course, check_conflicts, heuristics=True,
+                      stats=None, max_kept=None):
+    """Yield all conflict-free schedules from ``combs_by_course``
+
+    :type  combs_by_course: list
+    :param combs_by_course: List (one item per course) of lists of
+        section combinations (tuples of Activity) for that course
+    :type  check_conflicts: callable
+    :param check_conflicts: ``check_conflicts(act, acts)`` is True if
+        ``act`` conflicts with any of ``acts``
+    :param heuristics: Passed on to ``backtrack``
+    :param stats: Passed on to ``backtrack``
+    :type  max_kept: int|None
+    :param max_kept: Solutions of a term subproblem are kept in memory (to
+        be joined with those of the other terms) only if there are at most
+        this many; bigger subproblems are searched again every time their
+        solutions are needed, so memory use doesn't grow with the number
+        of schedules. All solutions are kept if this is None.
+    :returns: Iterator over tuples with one combination per course (in the
+        same order as ``combs_by_course``)
+    """
+    if not combs_by_course:
+        return
+    by_terms = _by_terms(combs_by_course)
+    for course_terms, subproblems in _subproblems(
+            by_terms, check_conflicts, heuristics, stats, max_kept):
+        for sched in _join(subproblems, course_terms, by_terms):
+            yield sched
+
+
+class UniformSampler(object):
+    """Draws conflict-free schedules from ``combs_by_course`` uniformly at
+    random (arguments are as for ``decomposed_search``)
+
+    Term subproblems are solved as in ``decomposed_search``, but rather
+    than joining their solutions into schedules, the number of schedules
+    every join would give is counted, so that each draw can pick a join,
+    solutions within it and combinations for them with probabilities
+    proportional to the number of schedules below each choice. Every
+    schedule is then equally likely, and ``count`` is the exact number of
+    schedules.
+
+    Since counting keeps the solutions of every term subproblem in
+    memory, it stops as soon as any subproblem has more than
+    ``max_kept`` solutions; ``count`` is then None, and nothing can be
+    drawn (``random_solution`` can be used instead).
+    """
+
+    def __init__(self, combs_by_course, check_conflicts, heuristics=True,
+                 stats=None, max_kept=None):
+        self._by_terms = _by_terms(combs_by_course)
+        # Cumulative counts of schedules and (course terms, [(members,
+        #  cumulative weights of solutions, solutions)] for every term,
+        #  combinations of multi-term courses) of every join
+        self._cumulative = []
+        self._joins = []
+        self.count = 0
+        if not combs_by_course:
+            return
+        for course_terms, subproblems in _subproblems(
+                self._by_terms, check_conflicts, heuristics, stats, max_kept):
+            if any(solutions.kept is None for _, _, solutions in subproblems):
+                self.count = None
+                self._cumulative, self._joins = [], []
+                return
+            for count, join in self._count_joins(course_terms, subproblems):
+                self.count += count
+                self._cumulative.append(self.count)
+                self._joins.append(join)
+
+    def draw(self, rng):
+        """A schedule picked uniformly at random
+
+        :type  rng: random.Random
+        :rtype: tuple
+        :returns: Tuple with one combination per course
+        """
+        assert self.count, "There are no schedules to draw"
+        course_terms, terms, multi_combs = self._joins[
+            bisect_right(self._cumulative, rng.randrange(self.count))]
+        candidates = dict(multi_combs)
+        for members, cumulative, solutions in terms:
+            solution = solutions[
+                bisect_right(cumulative, rng.randrange(cumulative[-1]))]
+            for i, projection in zip(members, solution):
+                if i not in candidates:
+                    candidates[i] = self._single_term(course_terms, i,
+                                                      projection)
+        return tuple(
+            rng.choice(candidates[i] if i in candidates
+                       else self._by_terms[i][()][()])
+            for i in xrange(len(course_terms))
+        )
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _single_term(self, course_terms, i, projection):
+        """Combinations of single-term course ``i`` with ``projection``"""
+        return self._by_terms[i][course_terms[i]][(projection,)]
+
+    def _count_joins(self, course_terms, subproblems):
+        """(number of schedules, join) for every join of ``subproblems``
+        that gives any schedules (as in ``_join``)
+        """
+        by_terms = self._by_terms
+        num_courses = len(course_terms)
+        multi_term = [i for i in xrange(num_courses)
+                      if len(course_terms[i]) > 1]
+        grouped = []
+        for term, members, solutions in subproblems:
+            positions = [members.index(i) for i in multi_term
+                         if i in members]
+            groups = OrderedDict()
+            for solution in solutions:
+                # Number of schedules with this solution for the term,
+                #  given the combinations of multi-term courses
+                weight = 1
+                for i, projection in zip(members, solution):
+                    if len(course_terms[i]) == 1:
+                        weight *= len(self._single_term(course_terms, i,
+                                                        projection))
+                groups.setdefault(tuple(solution[p] for p in positions),
+                                  []).append((weight, solution))
+            grouped.append((term, members, groups))
+        # Courses without any activities
+        constant = 1
+        for i in xrange(num_courses):
+            if not course_terms[i]:
+                constant *= len(by_terms[i][()][()])
+
+        for group_keys in product(*[list(groups) for _, _, groups in grouped]):
+            chosen = defaultdict(dict)
+            for (term, members, _), group_key in zip(grouped, group_keys):
+                multi_members = [i for i in multi_term if i in members]
+                for i, projection in zip(multi_members, group_key):
+                    chosen[i][term] = projection
+            multi_combs = {}
+            for i in multi_term:
+                projections = tuple(chosen[i][t] for t in course_terms[i])
+                combs = by_terms[i][course_terms[i]].get(projections)
+                if not combs:
+                    break
+                multi_combs[i] = combs
+            else:
+                count = constant
+                for combs in multi_combs.itervalues():
+                    count *= len(combs)
+                terms = []
+                for (_, members, groups), key in zip(grouped, group_keys):
+                    cumulative = []
+                    total = 0
+                    for weight, _ in groups[key]:
+                        total += weight
+                        cumulative.append(total)
+                    count *= total
+                    terms.append((members, cumulative,
+                                  [solution for _, solution in groups[key]]))
+                if count:
+                    yield count, (course_terms, terms, multi_combs)
+
+
+def backtrack(options, check_conflicts, heuristics=True, stats=None,
+              prune=None):
+    """Yield all conflict-free choices of one option from each of ``options``
+
+    With ``heuristics``, the course with the fewest remaining options is
+    always placed next, and every placement removes the options of the
+    remaining courses that conflict with it (forward checking); as soon as
+    any course has no options left, the search backtracks. Without
+    ``heuristics``, courses are placed in order and each placement is only
+    checked against the ones before it.
+
+    :type  options: list
+    :param options: List (one item per course) of lists of tuples of
+        Activity
+    :type  heuristics: bool
+    :type  stats: collections.Counter|None
+    :param stats: If given, the number of search nodes visited
+        (``"nodes"``), of dead ends hit (``"dead_ends"``) and of subtrees
+        pruned by ``prune`` (``"pruned"``) are added to this
+    :type  prune: callable|None
+    :param prune: Called with the list of activities placed so far after
+        every placement; if it returns True, nothing further is searched
+        from that partial schedule
+    :returns: Iterator over tuples with one option per course
+    """
+    if stats is None:
+        stats = Counter()
+    # Options that conflict with themselves can never be chosen
+    options = [[o for o in opts if not _self_conflicting(o, check_conflicts)]
+               for opts in options]
+    num_courses = len(options)
+    chosen = [None] * num_courses
+    conflicts = {}
+
+    def conflict(i, a, k, b):
+        """Whether option ``a`` of course ``i`` conflicts with option
+        ``b`` of course ``k``
+        """
+        key = (i, a, k, b) if i < k else (k, b, i, a)
+        if key not in conflicts:
+            conflicts[key] = any(check_conflicts(act, options[k][b])
+                                 for act in options[i][a])
+        return conflicts[key]
+
+    def pruned(i, a):
+        """Set option ``a`` for course ``i`` and check it with ``prune``"""
+        chosen[i] = a
+        if prune is None:
+            return False
+        placed = [act for k, b in enumerate(chosen) if b is not None
+                  for act in options[k][b]]
+        if prune(placed):
+            stats["pruned"] += 1
+            chosen[i] = None
+            return True
+        return False
+
+    def place(domains):
+        if not domains:
+            yield tuple(options[i][a] for i, a in enumerate(chosen))
+            return
+        if heuristics:
+            # Fewest remaining options first
+            i = min(domains, key=lambda k: (len(domains[k]), k))
+        else:
+            i = min(domains)
+        rest = {k: dom for k, dom in domains.iteritems() if k != i}
+        for a in domains[i]:
+            stats["nodes"] += 1
+            if heuristics:
+                # Forward checking
+                new_domains = {}
+                for k, dom in rest.iteritems():
+                    new_domains[k] = [b for b in dom if not conflict(i, a, k, b)]
+                    if not new_domains[k]:
+                        stats["dead_ends"] += 1
+                        break
+                else:
+                    if pruned(i, a):
+                        continue
+                    for solution in place(new_domains):
+                        yield solution
+            else:
+                if any(chosen[k] is not None and conflict(i, a, k, chosen[k])
+                       for k in xrange(num_courses)):
+                    stats["dead_ends"] += 1
+                    continue
+                if pruned(i, a):
+                    continue
+                for solution in place(rest):
+                    yield solution
+            chosen[i] = None
+
+    if any(not opts for opts in options):
+        return iter([])
+    return place({i: range(len(opts)) for i, opts in enumerate(options)})
+
+
+def random_solution(options, check_conflicts, rng, heuristics=True,
+                    stats=None):
+    """Find one conflict-free choice of one option from each of
+    ``options`` at random
+
+    This is ``backtrack`` with the options of every course tried in a
+    random order, stopping at the first solution, so it costs about as
+    much as finding one solution (unless there are none, in which case
+    the whole search space is searched). Solutions are close to (but not
+    exactly) uniform.
+
+    :type  rng: random.Random
+    :param heuristics: Passed on to ``backtrack``
+    :param stats: Passed on to ``backtrack``
+    :rtype: tuple|None
+    :returns: Tuple with one option per course, or None if there is no
+        solution
+    """
+    shuffled = []
+    for opts in options:
+        opts = list(opts)
+        rng.shuffle(opts)
+        shuffled.append(opts)
+    return next(backtrack(shuffled, check_conflicts, heuristics=heuristics,
+                          stats=stats), None)
+
+
+def _by_terms(combs_by_course):
+    """For every course, its combinations grouped by the terms they are in
+    (i.e., (1,), (2,) or (1, 2)), and within that, by their projection
+    onto each of those terms
+
+    :rtype: [OrderedDict, ...]
+    """
+    by_terms = []
+    for combs in combs_by_course:
+        groups = OrderedDict()
+        for comb in combs:
+            terms = tuple(sorted({a.term for a in comb}))
+            projections = tuple(_project(comb, t) for t in terms)
+            groups.setdefault(terms, OrderedDict()) \
+                .setdefault(projections, []).append(comb)
+        by_terms.append(groups)
+    return by_terms
+
+
+def _subproblems(by_terms, check_conflicts, heuristics, stats, max_kept):
+    """Solved term subproblems for every assignment of courses to terms
+    that has solutions in every term
+
+    :returns: Iterator over (terms of every course, [(term, courses in
+        the term, solutions), ...])
+    """
+    num_courses = len(by_terms)
+    # Solutions of term subproblems only depend on which courses are in
+    #  the term (and how), so they are shared between term assignments
+    solved = {}
+    # Each course is taken in exactly one set of terms; for every such
+    #  assignment of courses to terms, the terms are independent
+    for course_terms in product(*[list(groups) for groups in by_terms]):
+        all_terms = sorted({t for terms in course_terms for t in terms})
+        subproblems = []
+        for term in all_terms:
+            members = tuple(i for i in xrange(num_courses)
+                            if term in course_terms[i])
+            key = (term, tuple((i, course_terms[i]) for i in members))
+            if key not in solved:
+                options = [
+                    _unique(p[course_terms[i].index(term)] for p in
+                            by_terms[i][course_terms[i]])
+                    for i in members
+                ]
+                solved[key] = _TermSolutions(
+                    lambda options=options: backtrack(
+                        options, check_conflicts, heuristics=heuristics,
+                        stats=stats),
+                    max_kept
+                )
+            if not solved[key]:
+                break
+            subproblems.append((term, members, solved[key]))
+        else:
+            yield course_terms, subproblems
+
+
+def _join(subproblems, course_terms, by_terms):
+    """Join solutions of term subproblems into full schedules
+
+    Solutions are grouped by the projections they chose for multi-term
+    courses; groups from different terms can only be combined if, for
+    every multi-term course, there is a combination with those
+    projections.
+    """
+    num_courses = len(course_terms)
+    multi_term = [i for i in xrange(num_courses) if len(course_terms[i]) > 1]
+    grouped = []
+    for term, members, solutions in subproblems:
+        positions = [members.index(i) for i in multi_term if i in members]
+        # Ordered so that results don't depend on hashes (i.e., addresses)
+        #  of activities
+        groups = OrderedDict()
+        if solutions.kept is not None:
+            for solution in solutions:
+                groups.setdefault(tuple(solution[p] for p in positions),
+                                  []).append(solution)
+        else:
+            for solution in solutions:
+                key = tuple(solution[p] for p in positions)
+                if key not in groups:
+                    groups[key] = _Group(solutions, positions, key)
+        grouped.append((term, members, groups))
+    kept = all(solutions.kept is not None for _, _, solutions in subproblems)
+
+    for group_keys in product(*[list(groups) for _, _, groups in grouped]):
+        # Projections chosen for every multi-term course in every term
+        chosen = defaultdict(dict)
+        for (term, members, _), group_key in zip(grouped, group_keys):
+            multi_members = [i for i in multi_term if i in members]
+            for i, projection in zip(multi_members, group_key):
+                chosen[i][term] = projection
+        multi_combs = {}
+        for i in multi_term:
+            projections = tuple(chosen[i][t] for t in course_terms[i])
+            combs = by_terms[i][course_terms[i]].get(projections)
+            if not combs:
+                break
+            multi_combs[i] = combs
+        else:
+            solution_lists = [groups[key] for (_, _, groups), key
+                              in zip(grouped, group_keys)]
+            for solutions in (product(*solution_lists) if kept
+                              else _product(solution_lists)):
+                # Candidate combinations for every course
+                candidates = [None] * num_courses
+                for i, combs in multi_combs.iteritems():
+                    candidates[i] = combs
+                for (term, members, _), solution in zip(grouped, solutions):
+                    for i, projection in zip(members, solution):
+                        if candidates[i] is None:
+                            candidates[i] = by_terms[i][course_terms[i]][
+                                (projection,)]
+                for i in xrange(num_courses):
+                    # Courses without any activities (in any term)
+                    if candidates[i] is None:
+                        candidates[i] = by_terms[i][()][()]
+                for sched in product(*candidates):
+                    yield sched
+
+
+class _TermSolutions(object):
+    """Solutions of a term subproblem; they are kept (in ``kept``) if
+    there are at most ``max_kept``, and otherwise ``search`` is called
+    again every time they are iterated over
+
+    :type  search: callable
+    :param search: Returns an iterator over the solutions
+    :type  max_kept: int|None
+    """
+
+    def __init__(self, search, max_kept):
+        self.search = search
+        if max_kept is None:
+            self.kept = list(search())
+            self._empty = not self.kept
+        else:
+            head = list(islice(search(), max_kept + 1))
+            self.kept = head if len(head) <= max_kept else None
+            self._empty = not head
+
+    def __iter__(self):
+        return iter(self.kept) if self.kept is not None else self.search()
+
+    def __nonzero__(self):
+        return not self._empty
+
+
+class _Group(object):
+    """Solutions (of a subproblem that isn't kept) whose options at
+    ``positions`` are ``key``
+    """
+
+    def __init__(self, solutions, positions, key):
+        self.solutions = solutions
+        self.positions = positions
+        self.key = key
+
+    def __iter__(self):
+        positions, key = self.positions, self.key
+        return (s for s in self.solutions
+                if tuple(s[p] for p in positions) == key)
+
+
+def _product(iterables):
+    """``itertools.product``, except that every iterable is iterated over
+    again for every combination of the ones before it instead of being
+    copied into a list (so they must be re-iterable)
+    """
+    if not iterables:
+        yield ()
+        return
+    for first in iterables[0]:
+        for rest in _product(iterables[1:]):
+            yield (first,) + rest
+
+
+def _project(comb, term):
+    """Activities of ``comb`` in ``term``"""
+    return tuple(a for a in comb if a.term == term)
+
+
+def _unique(iterable):
+    """Unique items of ``iterable`` in order"""
+    return list(OrderedDict.fromkeys(iterable))
+
+
+def _self_conflicting(option, check_conflicts):
+    return any(check_conflicts(a, option[i + 1:])
+               for i, a in enumerate(option))
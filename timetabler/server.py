@@ -0,0 +1,194 @@
+"""Long-running local scheduling service
+
+Parsed courses are kept in memory (as are valid section combinations, in
+``combcache.default_cache``), so only the first request for a course pays
+for fetching and parsing it. Requests are planned in a pool of worker
+processes, each with its own catalog and cache. The pool is created when
+the server starts, before it has any threads, so forking it is safe.
+
+Requests are POSTed as JSON to ``/schedules``, e.g.::
+
+    {"courses": ["CPSC 304", "CPSC 310"],
+     "electives": [[1, ["CPSC 312", "CPSC 340"]]],
+     "session": "2015W", "terms": [1, 2],
+     "bad_statuses": ["Full", "Blocked"],
+     "constraints": {"earliest_start": 9, "free_days": ["Fri"]},
+     "rank": ["time_at_school", "days_at_school"],
+     "commute_hrs": 1.75, "limit": 20}
+
+Only ``courses`` is required. ``rank`` is a list of metric names (most
+important first) or ``{"weights": {metric: weight}}`` (see
+``timetabler.rank.Ranker``). ``limit`` is the number of schedules to send
+back (``DEFAULT_LIMIT`` by default, and at most ``MAX_LIMIT``); workers
+rank schedules as they are generated and only keep the best ``limit`` (see
+``catalog.plan_best``), so no request has to hold all of its schedules in
+the server. Results are not streamed: the best schedule is only known once
+every schedule has been generated, so nothing is sent until the worker has
+finished planning the request. The response is then one JSON object per
+line: first ``{"count": <number of schedules>}``, then one object per
+schedule, best first. ``GET /status`` describes the catalog and cache of
+each worker.
+
+Run with ``python -m timetabler.server [--port PORT]``.
+"""
+import json
+import logging
+import argparse
+import multiprocessing
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from timetabler.scheduler import NoActivitiesError
+from timetabler.combcache import default_cache
+from timetabler.catalog import Catalog, plan_best
+
+# Number of schedules sent back for requests without a limit
+DEFAULT_LIMIT = 100
+# Largest limit a request may have
+MAX_LIMIT = 1000
+
+
+def _describe(schedule):
+    return dict(
+        sections=sorted({a.section for a in schedule.activities}),
+        activities=[dict(section=a.section, term=a.term,
+                         days=sorted(a.days), start_time=a.start_time,
+                         end_time=a.end_time, status=a.status)
+                    for a in schedule.activities]
+    )
+
+
+def _check_limit(limit):
+    # JSON true and false are bools, which are ints too
+    if isinstance(limit, bool) or not isinstance(limit, (int, long)) or \
+            not 0 <= limit <= MAX_LIMIT:
+        raise ValueError("limit must be a number from 0 to {}".format(
+            MAX_LIMIT))
+
+
+# Catalog of a worker process (set by ``_init_worker``)
+_catalog = None
+
+
+def _init_worker(catalog):
+    global _catalog
+    _catalog = catalog
+
+
+def _serve(request):
+    """Plan ``request`` in a worker process
+
+    :rtype: tuple
+    :returns: (HTTP status code, [JSON object, ...] to send back, status
+        of this worker)
+    """
+    try:
+        count, schedules = plan_best(
+            request, _catalog, request.get("limit", DEFAULT_LIMIT))
+    except (ValueError, KeyError, TypeError, AssertionError,
+            NoActivitiesError) as err:
+        lines = [dict(error=str(err))]
+        code = 400
+    except Exception as err:
+        logging.exception(err)
+        lines = [dict(error=str(err))]
+        code = 500
+    else:
+        lines = [dict(count=count)]
+        lines.extend(_describe(schedule) for schedule in schedules)
+        code = 200
+    status = dict(courses=len(_catalog),
+                  combination_cache=dict(default_cache.stats))
+    return code, lines, (multiprocessing.current_process().name, status)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/status":
+            return self._send_json(404, dict(error="Not found"))
+        self._send_json(200, self.server.status())
+
+    def do_POST(self):
+        if self.path != "/schedules":
+            return self._send_json(404, dict(error="Not found"))
+        try:
+            length = int(self.headers.getheader("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            _check_limit(request.get("limit", DEFAULT_LIMIT))
+        except ValueError as err:
+            return self._send_json(400, dict(error=str(err)))
+        # Blocks until the request has been planned (see module docstring)
+        code, lines, (worker, status) = self.server.pool.apply(
+            _serve, (request,))
+        self.server.worker_status[worker] = status
+        if code != 200:
+            return self._send_json(code, lines[0])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in lines:
+            self._write_line(line)
+
+    def _send_json(self, code, obj):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self._write_line(obj)
+
+    def _write_line(self, obj):
+        self.wfile.write(json.dumps(obj) + "\n")
+        self.wfile.flush()
+
+
+class SchedulingServer(ThreadingMixIn, HTTPServer):
+    """HTTP server with a pool of workers that keep warm catalogs
+
+    :type  address: tuple
+    :param address: (host, port)
+    :type  catalog: Catalog|None
+    :param catalog: Catalog every worker starts with
+    :type  workers: int
+    :param workers: Number of worker processes, i.e., of requests that
+        are worked on at once (further requests wait for one of these to
+        finish)
+    """
+    daemon_threads = True
+
+    def __init__(self, address, catalog=None, workers=4):
+        HTTPServer.__init__(self, address, RequestHandler)
+        self.catalog = Catalog() if catalog is None else catalog
+        # Created before any requests are handled (in threads)
+        self.pool = multiprocessing.Pool(workers, _init_worker,
+                                         (self.catalog,))
+        self.worker_status = {}  # Worker name -> status after its last plan
+
+    def status(self):
+        """Catalog and cache status of every worker that has planned a
+        request
+
+        :rtype: dict
+        """
+        return dict(workers=dict(self.worker_status))
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    server = SchedulingServer((args.host, args.port), workers=args.workers)
+    logging.info("Serving on {}:{}".format(args.host, args.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
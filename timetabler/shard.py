@@ -0,0 +1,204 @@
+"""Splitting schedule generation into independent shards
+
+A Scheduler's search space is described as a self-contained problem
+(every course's valid section combinations, with activities stored once
+in a table) that is serialized to JSON, so shards can be run anywhere
+that has this package, without access to the SSC.
+
+For every choice of courses, the search space is the product of the
+courses' combination lists, so it is split on the options of one course
+(the one with the most options): work is the sequence of (choice,
+option) pairs, and shard ``i`` of ``n`` searches the ``i``th of ``n``
+equal, contiguous ranges of it. The shards are disjoint and together
+cover the whole search space, so merging their results gives the same
+schedules as a single run.
+
+Descriptions hold no code: course constraints and section counts have
+already been applied to the combinations that are described, and the
+Scheduler's own constraints are applied when results are merged. So
+shards can be run in fresh processes (or on other machines) that know
+nothing of the Scheduler.
+
+See ``Scheduler.shards`` and ``Scheduler.merge_shards``.
+"""
+import json
+from collections import Counter
+
+from timetabler.ssc import course as course_module
+from timetabler.search import decomposed_search
+from timetabler.optimize import best_schedules
+from timetabler.util import LazyModule
+
+# Only ``run_local`` uses a pool; shards run elsewhere never need it
+multiprocessing = LazyModule("multiprocessing")
+
+VERSION = 1
+
+
+def describe(combs_by_course, choices, terms, i, n):
+    """Serialize shard ``i`` of ``n`` of a problem
+
+    :type  combs_by_course: dict
+    :param combs_by_course: {course: [combination, ...]}
+    :type  choices: list
+    :param choices: Sets (tuples) of courses to schedule
+    :rtype: str
+    :returns: JSON description of the shard
+    """
+    activities = []
+    index = {}
+    courses = {}
+    for name in sorted(combs_by_course):
+        courses[name] = []
+        for comb in combs_by_course[name]:
+            positions = []
+            for a in comb:
+                key = (a.section, a.term)
+                if key not in index:
+                    index[key] = len(activities)
+                    activities.append([
+                        a.__class__.__name__, a.status, a.section, a.term,
+                        " ".join(sorted(a.days)), a.start_time, a.end_time,
+                        a.is_multi_term
+                    ])
+                positions.append(index[key])
+            courses[name].append(positions)
+    return json.dumps(dict(
+        version=VERSION,
+        shard=i,
+        num_shards=n,
+        terms=list(terms),
+        choices=[list(choice) for choice in choices],
+        courses=courses,
+        activities=activities
+    ), sort_keys=True)
+
+
+def run_shard(description, objective=None, k=None, heuristics=True):
+    """Run the shard described by ``description``
+
+    :type  description: str
+    :param description: From ``describe`` (i.e., ``Scheduler.shards``)
+    :type  objective: timetabler.optimize.Objective|None
+    :param objective: If this is given, only the best ``k`` schedules of
+        the shard under ``objective`` are found (see
+        ``timetabler.optimize.best_schedules``)
+    :type  k: int|None
+    :param k: Required with ``objective``
+    :rtype: dict
+    :returns: JSON-serializable result, with schedules as lists (one per
+        course) of lists of positions in the activity table (which is
+        included as ``"activities"``)
+    """
+    from timetabler.scheduler import Scheduler
+
+    if objective is not None and k is None:
+        raise ValueError("k is required with an objective")
+    problem = json.loads(description)
+    assert problem["version"] == VERSION, "Unsupported shard description"
+    acts = [
+        getattr(course_module, cls_name)(
+            status=status, section=section, term=term, days=days,
+            start_time=start_time, end_time=end_time, comments="",
+            is_multi_term=is_multi_term
+        )
+        for (cls_name, status, section, term, days, start_time, end_time,
+             is_multi_term) in problem["activities"]
+    ]
+    position = {id(a): i for i, a in enumerate(acts)}
+    combs_by_course = {name: [tuple(acts[i] for i in comb) for comb in combs]
+                       for name, combs in problem["courses"].iteritems()}
+
+    def encode(sched):
+        return [[position[id(a)] for a in comb] for comb in sched]
+
+    stats = Counter()
+    schedules = []
+    best = []
+    for choice, lists in work(problem["choices"], combs_by_course,
+                              problem["shard"], problem["num_shards"]):
+        if objective is None:
+            schedules.extend(
+                encode(sched) for sched in decomposed_search(
+                    lists, Scheduler._check_conflicts,
+                    heuristics=heuristics, stats=stats)
+            )
+        else:
+            best.extend(
+                [score, encode(sched)] for score, sched in best_schedules(
+                    lists, Scheduler._check_conflicts, objective, k,
+                    heuristics=heuristics, stats=stats)
+            )
+    result = dict(
+        shard=problem["shard"],
+        stats=dict(stats),
+        # (section, term) of every activity in the table
+        activities=[[section, term] for _, _, section, term, _, _, _, _
+                    in problem["activities"]]
+    )
+    if objective is None:
+        result["schedules"] = schedules
+    else:
+        result["best"] = sorted(best, key=lambda b: b[0])[:k]
+        result["k"] = k
+    return result
+
+
+def work(choices, combs_by_course, i, n):
+    """Searches that make up shard ``i`` of ``n``
+
+    :rtype: iterator
+    :returns: Iterator over (choice, list of combination lists) with the
+        options of one course of the choice cut down to the shard's range
+    """
+    units = []
+    for choice in choices:
+        lists = [combs_by_course[name] for name in choice]
+        pivot = max(xrange(len(lists)), key=lambda j: (len(lists[j]), -j)) \
+            if lists else None
+        units.append((choice, lists, pivot,
+                      len(lists[pivot]) if lists else 1))
+    total = sum(size for _, _, _, size in units)
+    start, stop = i * total // n, (i + 1) * total // n
+    offset = 0
+    for choice, lists, pivot, size in units:
+        lo, hi = max(start - offset, 0), min(stop - offset, size)
+        offset += size
+        if lo >= hi:
+            continue
+        if pivot is not None:
+            lists = list(lists)
+            lists[pivot] = lists[pivot][lo:hi]
+        yield choice, lists
+
+
+def run_local(descriptions, processes=None, objective=None, k=None,
+              heuristics=True):
+    """Run shards in a pool of local processes (a stand-in for running
+    them on separate machines)
+
+    Everything is sent to the workers, so ``objective`` must be picklable
+    (e.g., made of module-level metrics and ``functools.partial``).
+
+    :type  descriptions: list
+    :param descriptions: Shard descriptions
+    :type  processes: int|None
+    :param processes: Number of processes; the number of CPUs by default
+    :rtype: list
+    :returns: Results of ``run_shard`` for every shard (in order)
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_run_local_shard,
+                        [(description, objective, k, heuristics)
+                         for description in descriptions],
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _run_local_shard(args):
+    description, objective, k, heuristics = args
+    return run_shard(description, objective=objective, k=k,
+                     heuristics=heuristics)
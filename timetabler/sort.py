@@ -3,6 +3,7 @@ from __future__ import division
 from collections import defaultdict
 
 from timetabler.util import DAY_LIST, strtime2num, stddev
+from timetabler.results import sorted_schedules
 
 
 def sum_latest_daily_morning(schedules):
@@ -20,7 +21,7 @@ def sum_latest_daily_morning(schedules):
             num_days += 1
         return total/num_days
 
-    return sorted(schedules, key=key, reverse=True)
+    return sorted_schedules(schedules, key=key, reverse=True)
 
 
 def least_time_at_school(schedules, commute_hrs=0):
@@ -29,20 +30,8 @@ def least_time_at_school(schedules, commute_hrs=0):
     :type commute_hrs: int or float
     :param commute_hrs: Time in hours for ONE-WAY commute
     """
-    def key(s):
-        total = 0
-        for day in DAY_LIST:
-            acts = s.activities_for_day(day)
-            if not acts:
-                continue  # It's a free day!
-            earliest_start_time = earliest_start(acts)
-            latest_end_time = latest_end(acts)
-            time_at_school = (latest_end_time - earliest_start_time) + \
-                             (2 * commute_hrs)
-            total += time_at_school
-        return total
-
-    return sorted(schedules, key=key)
+    return sorted_schedules(
+        schedules, key=lambda s: time_at_school(s.activities, commute_hrs))
 
 
 def even_time_per_day(schedules, commute_hrs=0):
@@ -68,7 +57,7 @@ def even_time_per_day(schedules, commute_hrs=0):
             time_at_school_week.append(time_at_school)
         return stddev(time_at_school_week)
 
-    return sorted(schedules, key=key)
+    return sorted_schedules(schedules, key=key)
 
 
 def even_courses_per_term(schedules):
@@ -85,12 +74,47 @@ def even_courses_per_term(schedules):
             d[act.term].add(tuple(act.section.split()[:2]))
         return stddev(map(len, d.values()))
 
-    return sorted(schedules, key=key)
+    return sorted_schedules(schedules, key=key)
 
 
 def free_days(schedules):
     """Optimizes for days off (i.e., no classes on that day)"""
-    return sorted(schedules, key=lambda s: sum(1 for day in DAY_LIST if s.activities_for_day(day)))
+    return sorted_schedules(schedules,
+                            key=lambda s: days_at_school(s.activities))
+
+
+###########
+# Metrics #
+###########
+
+# These take a list of activities rather than a Schedule, and never
+#  decrease when activities are added, so they can also be used as lower
+#  bounds for partial schedules (see ``timetabler.optimize``)
+
+def time_at_school(activities, commute_hrs=0):
+    """Total time in hours spent at school over a week (including daily
+    commute)
+
+    :type commute_hrs: int or float
+    :param commute_hrs: Time in hours for ONE-WAY commute
+    """
+    total = 0
+    for day in DAY_LIST:
+        acts = [a for a in activities if day in a.days]
+        if not acts:
+            continue  # It's a free day!
+        earliest_start_time = earliest_start(acts)
+        latest_end_time = latest_end(acts)
+        time_at_school = (latest_end_time - earliest_start_time) + \
+                         (2 * commute_hrs)
+        total += time_at_school
+    return total
+
+
+def days_at_school(activities):
+    """Number of days of the week with classes (i.e., not days off)"""
+    return sum(1 for day in DAY_LIST
+               if any(day in a.days for a in activities))
 
 
 ###########
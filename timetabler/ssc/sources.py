@@ -0,0 +1,229 @@
+"""Sources of course pages for ``SSCConnection.get_course``
+
+* ``LiveSource``: The SSC itself (through the connection's page cache);
+  this is the default
+* ``DirectorySource``: Pages stored as files in a directory (e.g., the
+  page cache of an ``SSCConnection``, or a pre-warmed copy of it)
+* ``SQLiteSource``: Pages stored in an SQLite database
+* ``RecordReplaySource``: Records pages from another source into a
+  directory or SQLite store once, and then replays them exactly, without
+  any network access; useful for deterministic benchmarks and tests
+
+Sources give pages as the bytes that were received from the SSC along
+with their encoding (``raw_course_page``), and pages are only decoded when
+their text is asked for (``course_page``), so storing and replaying pages
+never changes them.
+
+e.g., ``SSCConnection(source=RecordReplaySource(SQLiteSource("pages.db")))``
+"""
+import os
+import logging
+import threading
+
+from timetabler.util import LazyModule, replace_file
+
+sqlite3 = LazyModule("sqlite3")
+
+# Encoding of pages stored without one
+DEFAULT_ENCODING = "utf-8"
+
+
+class PageNotFoundError(Exception):
+    """Course page is not in a local source"""
+    def __init__(self, page_name):
+        self.page_name = page_name
+
+    def __str__(self):
+        return self.page_name
+
+
+def page_name(dept, course_num, sessyr, sesscd):
+    """Name of the page for the given course, e.g., "cpsc_304_2015_w" """
+    return "_".join(str(x).lower() for x in [dept, course_num, sessyr, sesscd])
+
+
+def decode_page(content, encoding):
+    """Text of a page received as ``content`` in ``encoding`` (decoded as
+    ``requests`` decodes ``Response.text``)
+
+    :rtype: unicode
+    """
+    return content.decode(encoding or DEFAULT_ENCODING, 'replace')
+
+
+class CatalogSource(object):
+    """Source of course pages"""
+
+    def course_page(self, dept, course_num, sessyr, sesscd, refresh=False):
+        """Text of the course page for the given course
+
+        :type  refresh: bool
+        :param refresh: If this is set, sources that cache pages fetch the
+            page again
+        :rtype: unicode
+        :raises PageNotFoundError: If the source doesn't have the page
+        """
+        return decode_page(*self.raw_course_page(dept, course_num, sessyr,
+                                                 sesscd, refresh=refresh))
+
+    def raw_course_page(self, dept, course_num, sessyr, sesscd,
+                        refresh=False):
+        """Course page for the given course as it was received
+
+        :rtype: tuple
+        :returns: (content as bytes, encoding)
+        :raises PageNotFoundError: If the source doesn't have the page
+        """
+        raise NotImplementedError
+
+
+class LiveSource(CatalogSource):
+    """Pages from the SSC
+
+    :type ssc_conn: SSCConnection
+    """
+
+    def __init__(self, ssc_conn):
+        self.ssc_conn = ssc_conn
+
+    def raw_course_page(self, dept, course_num, sessyr, sesscd,
+                        refresh=False):
+        return self.ssc_conn._get_raw_course_page(dept, course_num, sessyr,
+                                                  sesscd, invalidate=refresh)
+
+
+class DirectorySource(CatalogSource):
+    """Pages stored as files (named by ``page_name``) in ``path``, with
+    their encodings in files named like the page plus ``.encoding`` (as in
+    the page cache of an ``SSCConnection``)
+
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def raw_course_page(self, dept, course_num, sessyr, sesscd,
+                        refresh=False):
+        name = page_name(dept, course_num, sessyr, sesscd)
+        page = read_page(os.path.join(self.path, name))
+        if page is None:
+            raise PageNotFoundError(name)
+        return page
+
+    def store(self, name, content, encoding):
+        """Store page ``name`` with contents ``content`` (bytes) in
+        ``encoding``
+        """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        write_page(os.path.join(self.path, name), content, encoding)
+
+
+class SQLiteSource(CatalogSource):
+    """Pages stored in the SQLite database at ``path``
+
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages "
+                             "(name TEXT PRIMARY KEY, body BLOB NOT NULL, "
+                             "encoding TEXT NOT NULL)")
+            self._db.commit()
+
+    def raw_course_page(self, dept, course_num, sessyr, sesscd,
+                        refresh=False):
+        name = page_name(dept, course_num, sessyr, sesscd)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, encoding FROM pages WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            raise PageNotFoundError(name)
+        return bytes(row[0]), str(row[1])
+
+    def store(self, name, content, encoding):
+        """Store page ``name`` with contents ``content`` (bytes) in
+        ``encoding``
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (name, body, encoding) "
+                "VALUES (?, ?, ?)",
+                (name, sqlite3.Binary(content), encoding or DEFAULT_ENCODING)
+            )
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class RecordReplaySource(CatalogSource):
+    """Replays pages from ``store``, recording them from ``source`` first
+    if they aren't there
+
+    Pages are stored exactly as they were received (the raw bytes and
+    their encoding), so replayed pages are the same, byte for byte, as the
+    ones that were recorded.
+
+    :type  store: DirectorySource|SQLiteSource
+    :param store: Where recorded pages are kept
+    :type  source: CatalogSource|None
+    :param source: Source to record pages from (e.g., ``LiveSource``); if
+        this is None, pages that haven't been recorded can't be replayed
+        (and raise ``PageNotFoundError``)
+    """
+
+    def __init__(self, store, source=None):
+        self.store = store
+        self.source = source
+
+    def raw_course_page(self, dept, course_num, sessyr, sesscd,
+                        refresh=False):
+        if not refresh or self.source is None:
+            try:
+                return self.store.raw_course_page(dept, course_num, sessyr,
+                                                  sesscd)
+            except PageNotFoundError:
+                if self.source is None:
+                    raise
+        name = page_name(dept, course_num, sessyr, sesscd)
+        logging.info("Recording page {}...".format(name))
+        content, encoding = self.source.raw_course_page(
+            dept, course_num, sessyr, sesscd, refresh=refresh)
+        self.store.store(name, content, encoding)
+        return content, encoding
+
+
+def read_page(filename):
+    """Page stored at ``filename`` by ``write_page``
+
+    :rtype: tuple|None
+    :returns: (content, encoding), or None if there is no such page
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        content = f.read()
+    encoding = DEFAULT_ENCODING
+    encoding_filename = "{}.encoding".format(filename)
+    if os.path.exists(encoding_filename):
+        with open(encoding_filename, 'rb') as f:
+            encoding = f.read().strip() or DEFAULT_ENCODING
+    return content, encoding
+
+
+def write_page(filename, content, encoding):
+    """Store ``content`` (bytes) and its ``encoding`` at ``filename``"""
+    for name, data in [("{}.encoding".format(filename),
+                        encoding or DEFAULT_ENCODING),
+                       (filename, content)]:
+        tmp_filename = "{}.tmp".format(name)
+        with open(tmp_filename, 'wb') as f:
+            f.write(data)
+        replace_file(tmp_filename, name)
@@ -1,20 +1,34 @@
 import os
 import time
 import logging
-import cookielib
-import urllib2
-import urllib
 import re
+import threading
+from hashlib import md5
 from itertools import chain
 from getpass import getpass
-
-import requests
-from bs4 import BeautifulSoup
-from bs4.element import NavigableString
-import filecache
+from contextlib import contextmanager
 
 from .course import Lecture, Lab, Tutorial, Course, Discussion
-from timetabler.util import chunks
+from .watcher import SectionWatcher
+from .sources import (LiveSource, page_name, decode_page, read_page,
+                      write_page)
+from .traffic import default_scheduler, WORKLIST, CATALOG
+from timetabler.util import chunks, LazyModule, replace_file
+
+# The HTTP/HTML stack is only imported once it is actually used, so that
+#  code that never talks to the SSC (e.g., scheduling from saved courses
+#  or ranking saved results) doesn't pay for importing it
+cookielib = LazyModule("cookielib")
+urllib2 = LazyModule("urllib2")
+urllib = LazyModule("urllib")
+requests = LazyModule("requests")
+bs4 = LazyModule("bs4")
+shelve = LazyModule("shelve")
+anydbm = LazyModule("anydbm")
+fcntl = LazyModule("fcntl")
+msvcrt = LazyModule("msvcrt")
+# Only used when many pages need parsing at once
+multiprocessing = LazyModule("multiprocessing")
 
 
 ## Misc SSC notes
@@ -28,25 +42,174 @@ from timetabler.util import chunks
 # and THEN doing submit=save for courses to add to worklist
 
 
+class NotLoggedInError(Exception):
+    """The SSC didn't give a page as it does to a logged-in user (e.g.,
+    because the session has expired)"""
+
+
+class _ParsedPages(object):
+    """Activities parsed from course pages, kept in a shelve at ``path``
+    keyed by a hash of the page
+
+    Calling this parses a page unless it has been parsed before;
+    ``lookup`` and ``store`` give and keep the activities of pages
+    without parsing them (e.g., for pages parsed in another process).
+
+    Every server and batch worker process shares the shelve, so it is
+    only opened for as long as each lookup or store takes, under a lock on
+    ``<path>.lock`` (shared for lookups and exclusive for stores); a
+    shelve kept open would miss (and, on closing, could overwrite) what
+    other processes store.
+
+    Every page that changes (e.g., as section statuses do while they are
+    watched) is a new entry, so only the ``max_entries`` most recently
+    stored pages are kept.
+
+    :type path: str
+    :type max_entries: int
+    """
+
+    # Key of the order that entries were stored in ({key: stamp}); page
+    #  keys are hex digests, so they can't clash with it
+    _STAMPS = "__stamps__"
+
+    def __init__(self, path, max_entries=2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def __call__(self, page):
+        activities = self.lookup([page])[0]
+        if activities is None:
+            activities = SSCConnection._parse_activities(page)
+            self.store([(page, activities)])
+        return activities
+
+    def lookup(self, pages):
+        """Activities of each of ``pages`` (None for pages that haven't
+        been parsed)
+
+        :rtype: list
+        """
+        keys = [self._key(page) for page in pages]
+        with self._locked(exclusive=False):
+            try:
+                shelf = shelve.open(self.path, "r")
+            except anydbm.error:
+                # Nothing has been stored yet
+                return [None] * len(keys)
+            try:
+                return [shelf.get(key) for key in keys]
+            finally:
+                shelf.close()
+
+    def store(self, parsed):
+        """Keep the activities of pages (dropping the least recently
+        stored pages if there are more than ``max_entries``)
+
+        :type  parsed: list
+        :param parsed: [(page, activities), ...]
+        """
+        with self._locked(exclusive=True):
+            shelf = shelve.open(self.path)
+            try:
+                stamps = shelf.get(self._STAMPS, {})
+                stamp = max(stamps.itervalues()) + 1 if stamps else 0
+                for page, activities in parsed:
+                    key = self._key(page)
+                    shelf[key] = activities
+                    stamps[key] = stamp
+                    stamp += 1
+                if len(stamps) > self.max_entries:
+                    oldest = sorted(stamps, key=stamps.get)
+                    for key in oldest[:len(stamps) - self.max_entries]:
+                        del shelf[key]
+                        del stamps[key]
+                shelf[self._STAMPS] = stamps
+            finally:
+                shelf.close()
+
+    @staticmethod
+    def _key(page):
+        if isinstance(page, unicode):
+            page = page.encode('utf-8')
+        return md5(page).hexdigest()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Hold a shared (or ``exclusive``) lock on the lock file of the
+        shelve
+
+        Windows has no ``fcntl``, so locks there are always exclusive
+        (with ``msvcrt``).
+        """
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            # Closing the file releases the lock
+            with open("{}.lock".format(self.path), "a+") as lock_file:
+                if os.name == "nt":
+                    lock_file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(lock_file.fileno(),
+                                           msvcrt.LK_LOCK, 1)
+                            break
+                        except IOError:
+                            # LK_LOCK gives up after ten tries a second apart;
+                            #  keep waiting
+                            continue
+                    try:
+                        yield
+                    finally:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(),
+                                       msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive
+                                else fcntl.LOCK_SH)
+                    yield
+
+
 class SSCConnection(object):
     """Connection to UBC SSC
 
     :param cache_period: Life of cache before invalidation (number of seconds);
         if this is set to None, cache is never automatically invalidated
+    :param base_url: Root URL of the SSC; can be pointed at a local
+        server for testing
+    :param cas_url: Root URL of the CWL login service (CAS) that the SSC
+        logs in through
+    :type  source: timetabler.ssc.sources.CatalogSource|None
+    :param source: Where ``get_course`` gets course pages from; the SSC
+        (through the page cache) by default
+    :type  request_scheduler: timetabler.ssc.traffic.RequestScheduler|None
+    :param request_scheduler: Scheduler that all requests to the SSC go
+        through; one shared by all connections by default
     """
 
-    def __init__(self, cache_period=3600):
-        self.base_url = "https://courses.students.ubc.ca"
+    def __init__(self, cache_period=3600,
+                 base_url="https://courses.students.ubc.ca", source=None,
+                 request_scheduler=None,
+                 cas_url="https://cas.id.ubc.ca/ubc-cas"):
+        self.base_url = base_url
         self.main_url = "{}/cs/main".format(self.base_url)
+        self.login_url = "{}/cs/secure/login".format(self.base_url)
+        self.cas_url = cas_url
         self.cache_period = cache_period
         self.cache_path = os.path.join(
             os.path.dirname(os.path.realpath(__file__)),
             "__cache__"
         )
-        if not os.path.exists(self.cache_path):
-            os.mkdir(self.cache_path)
         self.cookies = None
         self.worklists = {}
+        # Session that the SSC has us on (as of our last request that
+        #  changed it), so that navigating to it again can be skipped
+        self._session = None
+        self.source = LiveSource(self) if source is None else source
+        self.request_scheduler = default_scheduler \
+            if request_scheduler is None else request_scheduler
 
     ##################
     # Public Methods #
@@ -62,33 +225,83 @@ class SSCConnection(object):
         :type duplicates: bool
         :rtype: Course
         """
-        if isinstance(course, tuple):
-            course_name, course_title = course
-        elif isinstance(course, str):
-            course_name, course_title = course, course
-        else:
-            raise TypeError
-        dept, course_num = course_name.split()
+        dept, course_num, course_title = self._course_name(course)
         sessyr, sesscd = session[:4], session[-1]
-        page = self._get_course_page(dept, course_num, sessyr, sesscd, invalidate=refresh)
+        page = self.source.course_page(dept, course_num, sessyr, sesscd,
+                                       refresh=refresh)
         activities = self._activities_from_page(page)
-
-        lectures = [a for a in activities if isinstance(a, Lecture)]
-        labs = [a for a in activities if isinstance(a, Lab)]
-        tutorials = [a for a in activities if isinstance(a, Tutorial)]
-        discussions = [a for a in activities if isinstance(a, Discussion)]
-
-        course = Course(
-            dept=dept,
-            number=course_num,
-            title=course_title,
-            lectures=lectures,
-            labs=labs,
-            tutorials=tutorials,
-            discussions=discussions,
-            duplicates=duplicates
-        )
-        return course
+        return self._make_course(dept, course_num, course_title, activities,
+                                 duplicates)
+
+    def get_courses(self, courses, session="2014W", refresh=False,
+                    duplicates=True, processes=None, min_parallel=8):
+        """Get course data for all of ``courses``
+
+        Pages are got from ``self.source`` one at a time, but pages that
+        haven't been parsed before are parsed in a pool of processes.
+
+        :type  courses: list
+        :param courses: Courses as for ``get_course``
+        :type  session: str
+        :type  refresh: bool
+        :type  duplicates: bool
+        :type  processes: int|None
+        :param processes: Number of processes to parse pages in (the
+            number of CPUs by default)
+        :type  min_parallel: int
+        :param min_parallel: If fewer pages than this need parsing, they
+            are parsed in this process (starting a pool would take longer)
+        :rtype: [Course, ...]
+        :returns: Courses, in the same order as ``courses``
+        """
+        names = [self._course_name(course) for course in courses]
+        sessyr, sesscd = session[:4], session[-1]
+        pages = [self.source.course_page(dept, course_num, sessyr, sesscd,
+                                         refresh=refresh)
+                 for dept, course_num, _ in names]
+        parsed = self._activities_from_page.lookup(pages)
+        missing = [i for i, activities in enumerate(parsed)
+                   if activities is None]
+        if len(missing) < min_parallel or processes == 1:
+            for i in missing:
+                parsed[i] = self._activities_from_page(pages[i])
+        else:
+            logging.info("Parsing {} pages in parallel...".format(
+                len(missing)))
+            results = _parse_pages([pages[i] for i in missing], processes)
+            self._activities_from_page.store(
+                [(pages[i], activities)
+                 for i, activities in zip(missing, results)])
+            for i, activities in zip(missing, results):
+                parsed[i] = activities
+        return [self._make_course(dept, course_num, course_title, activities,
+                                  duplicates)
+                for (dept, course_num, course_title), activities
+                in zip(names, parsed)]
+
+    def watch_sections(self, sections, callback, session="2014W",
+                       max_polls=None, **kwargs):
+        """Watch ``sections`` for status changes
+
+        Sections of the same course are coalesced into a single request
+        for the course page, and ``callback`` is only called for sections
+        whose status actually changed. See ``SectionWatcher`` for the
+        remaining keyword arguments (polling intervals etc.).
+
+        :type sections: list
+        :param sections: e.g., ["CPSC 304 T2A", "CPSC 304 201"]
+        :type callback: callable
+        :param callback: Called as ``callback(section, old_status, new_status)``
+        :type session: str
+        :type max_polls: int|None
+        :param max_polls: Stop after this many polling rounds; if this is
+            None, watch forever
+        :rtype: SectionWatcher
+        """
+        watcher = SectionWatcher(self, sections, callback, session=session,
+                                 **kwargs)
+        watcher.run(max_polls=max_polls)
+        return watcher
 
     def create_worklist(self, name, session="2015W"):
         """Creates a worklist with ``name`` for ``session``
@@ -101,8 +314,9 @@ class SSCConnection(object):
             raise KeyError("Worklist {} already exists!.".format(name))
 
         # First we navigate to the session so the SSC knows which session to
-        # create the worklist for
-        self._navigate_to_session(session=session)
+        # create the worklist for (unless it's already there)
+        if self._session != session:
+            self._navigate_to_session(session=session)
         # Finally, can make the post request to create the worklist
         params = {
             "attrWorklistName": name,
@@ -111,8 +325,13 @@ class SSCConnection(object):
             "tname": "wlist",
             "attrSelectedWorklist": "-1"
         }
-        self._post(url=self.main_url, params=params)
-        self.cache_worklists(session=session, force=True)
+        resp = self._post(url=self.main_url, params=params)
+        # The response lists the worklists (including the new one), so
+        #  they don't have to be fetched again
+        worklist_map = self._parse_worklists(resp.text)
+        if worklist_map is None or name not in worklist_map:
+            worklist_map = self.get_worklists(session)
+        self.worklists[session] = worklist_map
 
     def delete_worklist(self, name, session="2015W"):
         worklists = self.cache_worklists(session)
@@ -126,7 +345,7 @@ class SSCConnection(object):
             "attrSelectedWorklist": worklist_id
         }
         self._post(self.main_url, params=params)
-        self.cache_worklists(session=session, force=True)
+        del self.worklists[session][name]
 
     def cache_worklists(self, session="2015W", force=False):
         """Cache and return worklists for ``session``
@@ -148,26 +367,18 @@ class SSCConnection(object):
         :rtype: dict
         :returns: e.g., {"fooworklist": "https://courses.students.ubc.ca
             /cs/main?pname=wlist&tname=wlist&attrSelectedWorklist=1000656166"}
+        :raises NotLoggedInError: If the page for ``session`` has no
+            worklists
         """
         # Grab page that has worklists list in it
         resp = self._navigate_to_session(session)
-        text = resp.text
-        soup = BeautifulSoup(text)
-        # Navigate through tree to find list and a create a map of worklist
-        # name to URL
-        worklist_div = soup.find("div", {"class": "worklist-sidebar docs-sidebar"})
-        worklist_map = {}
-        for item in worklist_div.contents[0].contents:
-            if isinstance(item, NavigableString):
-                continue
-            else:
-                item = item.contents[0]
-                name, link = item["title"], item["href"]
-                if name not in ["New Worklist"]:
-                    worklist_map[name] = "{}{}".format(self.base_url, link)
+        worklist_map = self._parse_worklists(resp.text)
+        if worklist_map is None:
+            raise NotLoggedInError(
+                "No worklists on the page for session {}".format(session))
         return worklist_map
 
-    def authorize(self, username=None, password=None):
+    def authorize(self, username=None, password=None, cookie_file=None):
         """Authorize this connection for personal SSC use
 
         If either password or username are not provided, a prompt
@@ -175,12 +386,27 @@ class SSCConnection(object):
 
         :type username: str|None
         :type password: str|None
+        :type  cookie_file: str|None
+        :param cookie_file: If this is set, the session is saved to this
+            file (readable only by the current user) after logging in, and
+            a saved session is reused (after checking with one request
+            that it is still logged in) instead of logging in again
         """
+        if cookie_file is not None and os.path.exists(cookie_file):
+            self.cookies = self._load_cookies(cookie_file)
+            self._session = None
+            if self.cookies and self._session_valid():
+                logging.info("Reusing saved SSC session.")
+                return
+            logging.info("Saved SSC session has expired; logging in...")
         if username is None:
             username = raw_input("Username: ")
         if password is None:
             password = getpass()
         self.cookies = self._auth(username, password)
+        self._session = None
+        if cookie_file is not None:
+            self._save_cookies(cookie_file)
 
     def add_course_to_worklist(self, section, session, worklist):
         """Add provided ``section`` of course to worklist for the given session
@@ -202,6 +428,66 @@ class SSCConnection(object):
     # Private Methods #
     ###################
 
+    def _parse_worklists(self, text):
+        """Name:url map of worklists in the sidebar of SSC page ``text``
+
+        :rtype: dict|None
+        :returns: None if ``text`` has no worklist sidebar
+        """
+        soup = bs4.BeautifulSoup(text)
+        # Navigate through tree to find list and a create a map of worklist
+        # name to URL
+        worklist_div = soup.find("div", {"class": "worklist-sidebar docs-sidebar"})
+        if worklist_div is None:
+            return None
+        worklist_map = {}
+        for item in worklist_div.contents[0].contents:
+            if isinstance(item, bs4.element.NavigableString):
+                continue
+            else:
+                item = item.contents[0]
+                name, link = item["title"], item["href"]
+                if name not in ["New Worklist"]:
+                    worklist_map[name] = "{}{}".format(self.base_url, link)
+        return worklist_map
+
+    @staticmethod
+    def _course_name(course):
+        """(dept, course number, title) of ``course``
+
+        :type  course: tuple|str
+        :param course: e.g., "CPSC 304" or
+            ("CPSC 304", "Introduction to Databases")
+        """
+        if isinstance(course, tuple):
+            course_name, course_title = course
+        elif isinstance(course, str):
+            course_name, course_title = course, course
+        else:
+            raise TypeError
+        dept, course_num = course_name.split()
+        return dept, course_num, course_title
+
+    @staticmethod
+    def _make_course(dept, course_num, course_title, activities, duplicates):
+        """Course made up of ``activities``"""
+        lectures = [a for a in activities if isinstance(a, Lecture)]
+        labs = [a for a in activities if isinstance(a, Lab)]
+        tutorials = [a for a in activities if isinstance(a, Tutorial)]
+        discussions = [a for a in activities if isinstance(a, Discussion)]
+
+        course = Course(
+            dept=dept,
+            number=course_num,
+            title=course_title,
+            lectures=lectures,
+            labs=labs,
+            tutorials=tutorials,
+            discussions=discussions,
+            duplicates=duplicates
+        )
+        return course
+
     def _get(self, *args, **kwargs):
         return self._authreq(requests.get, *args, **kwargs)
 
@@ -216,7 +502,13 @@ class SSCConnection(object):
             ", " if kwargs else "",
             ",".join("{}={}".format(k, v) for k, v in kwargs.items())
         ))
-        return func(*args, cookies=self.cookies, **kwargs)
+        # GETs with a submit (e.g., saving a section to a worklist) change
+        #  state, so they are never coalesced
+        coalesce = func is requests.get and \
+            "submit" not in kwargs.get("params", {})
+        return self.request_scheduler.request(
+            func, *args, cookies=self.cookies, priority=WORKLIST,
+            coalesce=coalesce, client=self, **kwargs)
 
     def _navigate_to_section_page(self, section, session=None, submit=None):
         """Perform a GET on section page with various params
@@ -248,25 +540,30 @@ class SSCConnection(object):
                 sessyr=sessyr,
                 sesscd=sesscd,
             ))
+            self._session = session
         if submit is not None:
             params["submit"] = submit
         return self._get(self.main_url, params=params)
 
     def _navigate_to_worklist(self, session, worklist):
-        self._navigate_to_session(session)
         if session not in self.worklists:
+            # This navigates to the session as well
             self.worklists[session] = self.get_worklists(session)
+        elif self._session != session:
+            self._navigate_to_session(session)
         worklist_url = self.worklists[session][worklist]
         return self._get(worklist_url)
 
     def _navigate_to_session(self, session="2015W"):
         sessyr, sesscd = session[:-1], session[-1]
-        ref_url = "https://courses.students.ubc.ca/cs/main?sessyr={sessyr}" \
-                  "&sesscd={sesscd}".format(
+        ref_url = "{main_url}?sessyr={sessyr}&sesscd={sesscd}".format(
+            main_url=self.main_url,
             sesscd=sesscd,
             sessyr=sessyr
         )
-        return self._get(ref_url)
+        resp = self._get(ref_url)
+        self._session = session
+        return resp
 
     def _auth(self, cwl_user, cwl_pass):
         """Performs SSC auth and returns CookieJar
@@ -291,7 +588,7 @@ class SSCConnection(object):
         urllib2.install_opener(opener)
 
         # Form POST URL
-        postURL = "https://cas.id.ubc.ca/ubc-cas/login/"
+        postURL = "{}/login/".format(self.cas_url)
 
         # First request form data
         formData = {
@@ -310,7 +607,7 @@ class SSCConnection(object):
         req = urllib2.Request(postURL, data)
 
         # Submit request and read data
-        resp = urllib2.urlopen(req)
+        resp = self._login_request(req)
         respRead = resp.read()
 
         # Find the ticket number
@@ -333,25 +630,79 @@ class SSCConnection(object):
         }
 
         # Form POST URL with JSESSION ID
-        postURL2 = "https://cas.id.ubc.ca/ubc-cas/login;jsessionid=" + j.group(
-            1)
+        postURL2 = "{}/login;jsessionid={}".format(self.cas_url, j.group(1))
 
         # Encode form data
         data2 = urllib.urlencode(formData2)
 
         # Submit request
         req2 = urllib2.Request(postURL2, data2)
-        urllib2.urlopen(req2)
+        self._login_request(req2)
 
         # Perform login
-        loginURL = "https://courses.students.ubc.ca/cs/secure/login"
-        urllib2.urlopen(loginURL)
+        self._login_request(self.login_url)
 
         return cj
 
+    def _session_valid(self):
+        """Whether ``self.cookies`` are (still) logged in, going by one
+        request for a page that needs a login (which redirects to the
+        login page if they aren't, and otherwise has the worklists)
+
+        :rtype: bool
+        """
+        try:
+            resp = self._get(self.main_url, allow_redirects=False,
+                             params=dict(pname="wlist", tname="wlist"))
+        except requests.RequestException as err:
+            logging.warning("Could not check SSC session: {}".format(err))
+            return False
+        return (resp.status_code == 200 and
+                self._parse_worklists(resp.text) is not None)
+
+    def _save_cookies(self, filename):
+        """Save ``self.cookies`` (including session cookies) to
+        ``filename``, which only the current user can read
+        """
+        jar = cookielib.LWPCookieJar()
+        for cookie in self.cookies:
+            jar.set_cookie(cookie)
+        tmp_filename = "{}.tmp".format(filename)
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        os.close(os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600))
+        jar.save(tmp_filename, ignore_discard=True)
+        replace_file(tmp_filename, filename)
+
+    @staticmethod
+    def _load_cookies(filename):
+        """Cookies saved with ``_save_cookies`` (expired ones are dropped)
+
+        :rtype: cookielib.CookieJar|None
+        :returns: None if ``filename`` can't be read
+        """
+        jar = cookielib.LWPCookieJar()
+        try:
+            jar.load(filename, ignore_discard=True)
+        except (IOError, cookielib.LoadError) as err:
+            logging.warning("Could not load saved SSC session: {}".format(err))
+            return None
+        return jar
+
+    def _login_request(self, req):
+        """``urllib2.urlopen(req)`` through the request scheduler"""
+        return self.request_scheduler.request(urllib2.urlopen, req,
+                                              priority=WORKLIST)
+
+    # ``_parse_activities``, with results cached (forever)
+    _activities_from_page = _ParsedPages(os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), "__cache__",
+        "parsed_pages"
+    ))
+
     @staticmethod
-    @filecache.filecache(filecache.FOREVER)
-    def _activities_from_page(page):
+    def _parse_activities(page):
         """Get list of ``Activity`` subclasses from data in ``page``
 
         :rtype: [Activity, ...]
@@ -413,7 +764,7 @@ class SSCConnection(object):
                 activities.append(activity)
             return activities
 
-        soup = BeautifulSoup(page)
+        soup = bs4.BeautifulSoup(page)
         t = soup.text
         # Get rid of the top of the page
         t = t.split("Status\nSection")[-1]
@@ -451,13 +802,40 @@ class SSCConnection(object):
         :param invalidate: If this is set, existing cache for the page will be invalidated
         :returns: Text of SSC course page for given course
         """
-        page_name = "_".join(map(lambda x: str(x).lower(), [dept, course_num, sessyr, sesscd]))
+        return decode_page(*self._get_raw_course_page(
+            dept, course_num, sessyr, sesscd, invalidate=invalidate))
+
+    def _get_raw_course_page(self, dept="CPSC", course_num="304", sessyr="2014", sesscd="W", invalidate=False):
+        """Same as ``_get_course_page``, but the page is given as it was
+        received
+
+        :rtype: tuple
+        :returns: (content as bytes, encoding)
+        """
+        page_name = self._course_page_name(dept, course_num, sessyr, sesscd)
         # Attempt to retrieve already cached page
         page = self._retrieve_cached_page(page_name, invalidate=invalidate)
         # If not already cached, retrieve, cache, and return
         if page is None:
             logging.info("Page was not found in cache or was invalidated; retrieving from remote and caching...")
-            r = requests.get(self.main_url, params=dict(
+            r = self._fetch_course_page(dept, course_num, sessyr, sesscd)
+            page = (r.content, _response_encoding(r))
+            self._cache_page(page_name, *page)
+        else:
+            logging.info("Valid existing page was found in cache; retrieving from file...")
+        return page
+
+    def _fetch_course_page(self, dept, course_num, sessyr, sesscd,
+                           headers=None):
+        """Request course page from SSC (bypassing the cache)
+
+        :type  headers: dict|None
+        :param headers: Extra request headers, e.g. for conditional requests
+        :rtype: requests.Response
+        """
+        return self.request_scheduler.request(
+            requests.get, self.main_url, priority=CATALOG, coalesce=True,
+            headers=headers, params=dict(
                 pname="subjarea",
                 tname="subjareas",
                 req="3",
@@ -466,21 +844,20 @@ class SSCConnection(object):
                 sessyr=sessyr,
                 sesscd=sesscd
             ))
-            page_data = r.text
-            self._cache_page(page_name, page_data)
-            return page_data
-        else:
-            logging.info("Valid existing page was found in cache; retrieving from file...")
-            return page
 
-    def _cache_page(self, name, text):
-        """Stores page with name ``name`` and contents ``text`` to the cache folder"""
-        filename = os.path.join(self.cache_path, name)
-        with open(filename, 'w+') as f:
-            f.write(text)
+    @staticmethod
+    def _course_page_name(dept, course_num, sessyr, sesscd):
+        """Name of the cache file for the given course page"""
+        return page_name(dept, course_num, sessyr, sesscd)
+
+    def _cache_page(self, name, content, encoding):
+        """Stores page with name ``name`` and contents ``content`` (bytes, in ``encoding``) to the cache folder"""
+        if not os.path.exists(self.cache_path):
+            os.mkdir(self.cache_path)
+        write_page(os.path.join(self.cache_path, name), content, encoding)
 
     def _retrieve_cached_page(self, name, invalidate=False):
-        """Retrieves page ``name`` from cache"""
+        """Retrieves page ``name`` from cache as (content, encoding)"""
         filename = os.path.join(self.cache_path, name)
         # First case, cache does not already exist
         if not os.path.exists(filename):
@@ -494,5 +871,31 @@ class SSCConnection(object):
             os.remove(filename)
             return None
         # Cache exists, and is valid, so return it
-        with open(filename, 'r') as f:
-            return f.read()
+        return read_page(filename)
+
+
+def _response_encoding(r):
+    """Encoding that ``r.text`` is decoded with"""
+    return r.encoding or r.apparent_encoding
+
+
+def _parse_pages(pages, processes=None):
+    """``SSCConnection._parse_activities`` for each of ``pages``, in a pool
+    of ``processes`` processes
+
+    :rtype: list
+    :returns: Activities of each page, in the same order as ``pages``
+    """
+    if (processes or multiprocessing.cpu_count()) == 1:
+        return map(_parse_page, pages)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_parse_page, pages)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _parse_page(page):
+    # Static methods can't be pickled (to be sent to workers)
+    return SSCConnection._parse_activities(page)
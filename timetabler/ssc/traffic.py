@@ -0,0 +1,218 @@
+"""Coordination of all requests made to the SSC
+
+Every request goes through a ``RequestScheduler``, which:
+
+* Limits the overall request rate with a token bucket, so bulk fetches
+  don't get throttled by the SSC
+* Lets requests through in order of priority (``WORKLIST`` before
+  ``CATALOG``), so time-critical worklist operations don't wait behind a
+  bulk catalog warm
+* Coalesces identical requests that are in flight at the same time into
+  one, whose response is given to all of them
+* Keeps metrics on queueing and latency (``stats`` and ``metrics``)
+
+Requests are made by the threads that ask for them; the scheduler only
+decides when each may start, so it adds no threads of its own. Below the
+rate limit, a request only waits for the scheduler's lock (a few times,
+to queue, take a token and update ``stats``) and for requests with higher
+priority that are queued ahead of it.
+"""
+from __future__ import division
+
+import time
+import heapq
+import logging
+import threading
+from itertools import count
+from collections import Counter
+
+# Priorities (lower goes first)
+WORKLIST = 0
+CATALOG = 1
+
+PRIORITY_NAMES = {WORKLIST: "worklist", CATALOG: "catalog"}
+
+
+class RequestScheduler(object):
+    """Rate-limited, prioritized and coalesced making of requests
+
+    :type  rate: float
+    :param rate: Number of requests per second that may be started on
+        average
+    :type  burst: int
+    :param burst: Number of requests that may be started at once after a
+        quiet period (the size of the token bucket)
+    """
+
+    def __init__(self, rate=4, burst=8):
+        assert rate > 0 and burst >= 1
+        self.rate = rate
+        self.burst = burst
+        self.stats = Counter()
+        self._tokens = burst
+        self._refilled = time.time()
+        self._cond = threading.Condition()
+        self._queue = []  # Heap of (priority, sequence number, ticket)
+        self._sequence = count()
+        self._in_flight = {}  # key -> _Pending
+
+    def request(self, func, *args, **kwargs):
+        """Make the request ``func(*args, **kwargs)`` (e.g.,
+        ``requests.get(url, params=...)``) once the rate limit and requests
+        with higher priority allow it
+
+        :type  func: callable
+        :param priority: ``WORKLIST`` or ``CATALOG`` (the default)
+        :type  coalesce: bool
+        :param coalesce: If this is set, and an identical request (also
+            made with ``coalesce``) is already in flight, its response (or
+            exception) is given instead of making another request; only
+            for requests without side effects
+        :param client: Whose request this is (e.g., an ``SSCConnection``);
+            coalesced requests are only identical if they are made for the
+            same client. Required for coalesced requests with ``cookies``,
+            which are not compared themselves.
+        :returns: Return value of ``func``
+        """
+        priority = kwargs.pop("priority", CATALOG)
+        coalesce = kwargs.pop("coalesce", False)
+        client = kwargs.pop("client", None)
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        start = time.time()
+        if coalesce:
+            key = _request_key(func, args, kwargs, client)
+            with self._cond:
+                pending = self._in_flight.get(key)
+                if pending is None:
+                    pending = self._in_flight[key] = _Pending()
+                    leader = True
+                else:
+                    leader = False
+            if not leader:
+                self._count({"coalesced": 1, name + "_coalesced": 1})
+                return pending.wait()
+        result = error = None
+        try:
+            self._admit(priority)
+            self._count({"requests": 1, name + "_requests": 1,
+                         name + "_wait": time.time() - start})
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                self._count({name + "_latency": time.time() - start})
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            # Even on, e.g., KeyboardInterrupt, so that identical requests
+            #  waiting on this one don't wait forever
+            if coalesce:
+                self._finish(key, result=result, error=error)
+        return result
+
+    def metrics(self):
+        """Summary of ``stats``
+
+        :rtype: dict
+        :returns: {priority name: dict(requests, coalesced, avg_wait,
+            avg_latency)} (times in seconds, from when the request was
+            asked for), plus the number of requests that are ``queued``
+            now and the most that were ever queued (``max_queued``)
+        """
+        with self._cond:
+            metrics = dict(queued=len(self._queue),
+                           max_queued=self.stats["max_queued"])
+            stats = self.stats.copy()
+        for name in PRIORITY_NAMES.itervalues():
+            requests = stats["{}_requests".format(name)]
+            metrics[name] = dict(
+                requests=requests,
+                coalesced=stats["{}_coalesced".format(name)],
+                avg_wait=(stats["{}_wait".format(name)] / requests
+                          if requests else None),
+                avg_latency=(stats["{}_latency".format(name)] / requests
+                             if requests else None)
+            )
+        return metrics
+
+    ###################
+    # Private Methods #
+    ###################
+
+    def _admit(self, priority):
+        """Wait until a request with ``priority`` may start"""
+        ticket = object()
+        with self._cond:
+            heapq.heappush(self._queue,
+                           (priority, next(self._sequence), ticket))
+            self.stats["max_queued"] = max(self.stats["max_queued"],
+                                           len(self._queue))
+            while True:
+                timeout = None
+                if self._queue[0][2] is ticket:
+                    timeout = self._token_wait()
+                    if timeout <= 0:
+                        heapq.heappop(self._queue)
+                        self._tokens -= 1
+                        self._cond.notify_all()
+                        return
+                    self.stats["throttled"] += 1
+                    logging.debug("Rate limit reached; waiting {:.2f}s."
+                                  .format(timeout))
+                self._cond.wait(timeout)
+
+    def _count(self, amounts):
+        with self._cond:
+            self.stats.update(amounts)
+
+    def _token_wait(self):
+        """Refill the token bucket; time until a token is available"""
+        now = time.time()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        return (1 - self._tokens) / self.rate
+
+    def _finish(self, key, result=None, error=None):
+        with self._cond:
+            pending = self._in_flight.pop(key)
+        pending.result, pending.error = result, error
+        pending.done.set()
+
+
+class _Pending(object):
+    """Request in flight that identical requests are waiting on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _request_key(func, args, kwargs, client):
+    """Key for identical requests; requests are only identical if they are
+    made for the same ``client`` (which stands in for their cookies), and
+    everything else is compared by value
+    """
+    if "cookies" in kwargs and client is None:
+        raise ValueError("Coalesced requests with cookies need a client")
+    return (func, client, args, tuple(sorted(
+        (k, _freeze(v)) for k, v in kwargs.iteritems() if k != "cookies"
+    )))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.iteritems()))
+    return value
+
+
+# Shared by all SSCConnections (unless they are given their own), so the
+#  limit applies to all traffic to the SSC from this process
+default_scheduler = RequestScheduler()
@@ -0,0 +1,172 @@
+from __future__ import division
+
+import time
+import logging
+from hashlib import md5
+from collections import defaultdict
+
+from .sources import decode_page
+
+
+class SectionWatcher(object):
+    """Polls the SSC for status changes of a set of sections
+
+    All watched sections of a course are served by a single request for
+    that course's page, and requests are conditional (``If-None-Match``
+    and ``If-Modified-Since``) so unchanged pages are not re-downloaded
+    or re-parsed. Each course is polled on its own interval, which shrinks
+    towards ``min_interval`` when its statuses change and grows towards
+    ``max_interval`` while they don't. A course whose poll fails (e.g.,
+    because the SSC is down) is logged and retried after a delay that
+    grows by ``backoff`` with every failure in a row, so the watcher keeps
+    running through errors.
+
+    :type ssc_conn: SSCConnection
+    :type sections: list
+    :param sections: e.g., ["CPSC 304 T2A", "CPSC 304 201"]
+    :type callback: callable
+    :param callback: Called as ``callback(section, old_status, new_status)``
+        for every section whose status changed; ``new_status`` is None if
+        the section has disappeared from the course page
+    :param interval: Initial polling interval per course (in seconds)
+    :param min_interval: Shortest polling interval per course
+    :param max_interval: Longest polling interval per course
+    :param backoff: Factor by which the interval grows on every poll
+        without changes (and shrinks on every poll with changes)
+    """
+
+    def __init__(self, ssc_conn, sections, callback, session="2014W",
+                 interval=60, min_interval=15, max_interval=600, backoff=1.5):
+        assert min_interval <= interval <= max_interval
+        assert backoff > 1
+        self.ssc_conn = ssc_conn
+        self.callback = callback
+        self.session = session
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        # Coalesce sections by course so that each course page is only
+        #  requested once per poll regardless of how many sections of it
+        #  are watched
+        self._sections_by_course = defaultdict(set)
+        for section in sections:
+            dept, course_num, _ = section.split()
+            self._sections_by_course[(dept, course_num)].add(section)
+        self._courses = {
+            course: dict(interval=interval, next_poll=0, etag=None,
+                         last_modified=None, digest=None, failures=0)
+            for course in self._sections_by_course
+        }
+        self.statuses = {}
+        self.num_requests = 0
+        self.num_parses = 0
+        self.num_errors = 0
+
+    def poll(self, now=None):
+        """Poll every course that is due and fire callbacks for changes
+
+        :param now: Current time; defaults to ``time.time()``
+        :rtype: list
+        :returns: List of (section, old_status, new_status) for changes
+            found in this poll
+        """
+        now = time.time() if now is None else now
+        changes = []
+        for course, state in self._courses.iteritems():
+            if state["next_poll"] > now:
+                continue
+            try:
+                course_changes = self._poll_course(course, state)
+            except Exception as err:
+                self.num_errors += 1
+                state["failures"] += 1
+                delay = min(self.max_interval,
+                            state["interval"] *
+                            self.backoff ** state["failures"])
+                logging.warning("Could not poll {} {} ({}); retrying in "
+                                "{:.0f}s.".format(course[0], course[1], err,
+                                                  delay))
+                state["next_poll"] = now + delay
+                continue
+            state["failures"] = 0
+            if course_changes:
+                state["interval"] = max(self.min_interval,
+                                        state["interval"] / self.backoff)
+            else:
+                state["interval"] = min(self.max_interval,
+                                        state["interval"] * self.backoff)
+            state["next_poll"] = now + state["interval"]
+            changes.extend(course_changes)
+        for change in changes:
+            self.callback(*change)
+        return changes
+
+    def next_poll(self):
+        """Time at which the next course is due for polling"""
+        return min(state["next_poll"] for state in self._courses.itervalues())
+
+    def run(self, max_polls=None, sleep=time.sleep):
+        """Poll continuously, sleeping until the next course is due
+
+        :type max_polls: int|None
+        :param max_polls: Stop after this many polling rounds; if this is
+            None, watch forever
+        """
+        num_polls = 0
+        while max_polls is None or num_polls < max_polls:
+            self.poll()
+            num_polls += 1
+            if max_polls is not None and num_polls >= max_polls:
+                break
+            sleep(max(0, self.next_poll() - time.time()))
+
+    def _poll_course(self, course, state):
+        """Fetch page for ``course`` and diff statuses of watched sections
+
+        :rtype: list
+        """
+        dept, course_num = course
+        sessyr, sesscd = self.session[:4], self.session[-1]
+        headers = {}
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+        r = self.ssc_conn._fetch_course_page(dept, course_num, sessyr, sesscd,
+                                             headers=headers)
+        self.num_requests += 1
+        if r.status_code == 304:
+            logging.info("{} {} not modified.".format(dept, course_num))
+            return []
+        r.raise_for_status()
+        state["etag"] = r.headers.get("ETag")
+        state["last_modified"] = r.headers.get("Last-Modified")
+        # The SSC does not necessarily support conditional requests, so
+        #  also skip parsing if the page itself is unchanged
+        digest = md5(r.content).hexdigest()
+        if digest == state["digest"]:
+            return []
+        state["digest"] = digest
+        # Keep the regular page cache warm while we're at it
+        encoding = r.encoding or r.apparent_encoding
+        self.ssc_conn._cache_page(
+            self.ssc_conn._course_page_name(dept, course_num, sessyr, sesscd),
+            r.content, encoding
+        )
+        page = decode_page(r.content, encoding)
+        self.num_parses += 1
+        statuses = {a.section: a.status for a in
+                    self.ssc_conn._activities_from_page(page)}
+
+        changes = []
+        for section in sorted(self._sections_by_course[course]):
+            new_status = statuses.get(section)
+            if section not in self.statuses:
+                # First time we've seen this section; nothing to compare to
+                self.statuses[section] = new_status
+                continue
+            old_status = self.statuses[section]
+            if old_status != new_status:
+                self.statuses[section] = new_status
+                changes.append((section, old_status, new_status))
+        return changes
@@ -1,5 +1,10 @@
 from __future__ import division
 
+import os
+import types
+import functools
+import importlib
+from hashlib import md5
 from math import sqrt
 
 
@@ -82,6 +87,164 @@ def stddev(lst):
     return sqrt(variance)
 
 
+def callable_fingerprint(func):
+    """Stable identity of ``func`` that survives across runs
+
+    This is based on the name, bytecode, names, constants (including
+    nested code objects), default arguments and closed-over values of
+    ``func`` (rather than ``id`` or ``repr``, which contain memory
+    addresses), so that the same constraint defined in two different runs
+    gets the same fingerprint. Module globals that ``func`` reads count by
+    value if they are plain data (numbers, strings, and containers of
+    them; e.g., ``EARLIEST`` in ``lambda s: earliest_start(s.activities)
+    >= EARLIEST``); other globals, such as functions it calls, only count
+    by name, so changing their code doesn't change the fingerprint.
+
+    :type  func: callable
+    :rtype: str
+    :returns: Hex digest
+    """
+    h = md5()
+    _fingerprint(func, h, set())
+    return h.hexdigest()
+
+
+def _fingerprint(value, h, seen):
+    """Feed a by-value description of ``value`` into hash ``h``
+
+    :type  seen: set
+    :param seen: ids of objects being described (to stop at cycles, e.g.,
+        between a Course and its activities)
+    """
+    if value is None or isinstance(value, (bool, int, long, float, complex,
+                                           str, unicode)):
+        h.update("{}:{!r};".format(type(value).__name__, value))
+        return
+    if isinstance(value, (type, types.ClassType, types.ModuleType,
+                          types.BuiltinFunctionType)):
+        h.update("{}:{}.{};".format(type(value).__name__,
+                                    getattr(value, "__module__", None),
+                                    value.__name__))
+        return
+    if id(value) in seen:
+        h.update("cycle;")
+        return
+    seen.add(id(value))
+    try:
+        if isinstance(value, types.CodeType):
+            h.update("code:{}:{};".format(value.co_name, value.co_argcount))
+            h.update(value.co_code)
+            _fingerprint(value.co_names, h, seen)
+            _fingerprint(value.co_consts, h, seen)
+        elif isinstance(value, types.FunctionType):
+            h.update("function:{}.{};".format(value.__module__,
+                                              value.__name__))
+            _fingerprint(value.__code__, h, seen)
+            _fingerprint(value.__defaults__, h, seen)
+            _fingerprint(tuple(c.cell_contents
+                               for c in (value.__closure__ or ())), h, seen)
+            _fingerprint(tuple(
+                (name, value.__globals__[name])
+                for name in sorted(_global_names(value.__code__))
+                if name in value.__globals__ and
+                _is_data(value.__globals__[name])
+            ), h, seen)
+        elif isinstance(value, types.MethodType):
+            h.update("method;")
+            _fingerprint(value.__func__, h, seen)
+            _fingerprint(value.__self__, h, seen)
+        elif isinstance(value, (tuple, list)):
+            h.update("{}:{};".format(type(value).__name__, len(value)))
+            for item in value:
+                _fingerprint(item, h, seen)
+        elif isinstance(value, (set, frozenset)):
+            h.update("{}:{};".format(type(value).__name__, len(value)))
+            for item in sorted(_digest(item, seen) for item in value):
+                h.update(item)
+        elif isinstance(value, dict):
+            h.update("dict:{};".format(len(value)))
+            for item in sorted(_digest(item, seen)
+                               for item in value.iteritems()):
+                h.update(item)
+        elif isinstance(value, functools.partial):
+            h.update("partial;")
+            _fingerprint((value.func, value.args, value.keywords), h, seen)
+        else:
+            # Any other object (e.g., a callable object) by its type and
+            #  attributes
+            h.update("object:{}.{};".format(type(value).__module__,
+                                            type(value).__name__))
+            _fingerprint(getattr(value, "__dict__", None), h, seen)
+    finally:
+        seen.discard(id(value))
+
+
+def _global_names(code):
+    """Names that ``code`` (or code nested in it) may read as globals"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _is_data(value):
+    """Whether ``value`` is plain data (numbers, strings, and tuples,
+    lists, sets and dicts of them)
+    """
+    if value is None or isinstance(value, (bool, int, long, float, complex,
+                                           str, unicode)):
+        return True
+    if isinstance(value, (tuple, list, set, frozenset)):
+        return all(_is_data(item) for item in value)
+    if isinstance(value, dict):
+        return all(_is_data(k) and _is_data(v)
+                   for k, v in value.iteritems())
+    return False
+
+
+def _digest(value, seen):
+    h = md5()
+    _fingerprint(value, h, seen)
+    return h.hexdigest()
+
+
+class LazyModule(object):
+    """Stand-in for module ``name`` that is only imported when one of its
+    attributes is first used
+
+    This keeps heavy dependencies (e.g., requests and bs4) from being
+    imported by code that never uses them.
+
+    :type  name: str
+    :param name: e.g., "requests"
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return "LazyModule<{}>".format(self._name)
+
+
+def replace_file(src, dst):
+    """Move ``src`` to ``dst``, replacing ``dst`` if it exists
+
+    This is ``os.rename``, except that on Windows (where renaming onto an
+    existing file fails) ``dst`` is removed first, so it is briefly
+    missing there.
+    """
+    if os.name == "nt" and os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+
 def setup_root_logger(log_level='INFO'):
     import logging
     import sys